@@ -1,3 +1,5 @@
+from typing import Any, Dict, List
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -15,6 +17,114 @@ class Settings(BaseSettings):
     MONGO_DB_URL: str = "mongodb://localhost:27017"
     MONGO_DB_NAME: str = "foundlab_db"
 
+    # Compiled definition catalogs (DFC flag tables, Sentinela trigger index, feature configs)
+    CATALOG_VERSION_CHECK_SECONDS: float = 1.0  # How stale a change made by another process may be when read
+
+    # Sentinela reactive worker settings
+    SENTINELA_WORKER_ENABLED: bool = False  # Run the worker inside the API process
+    SENTINELA_WORKER_USE_CHANGE_STREAM: bool = True  # Falls back to polling without a replica set
+    SENTINELA_WORKER_BATCH_SIZE: int = 500
+    SENTINELA_WORKER_CHUNK_SIZE: int = 50
+    SENTINELA_WORKER_MAX_CONCURRENCY: int = 4
+    SENTINELA_WORKER_POLL_INTERVAL_SECONDS: float = 1.0
+    SENTINELA_WORKER_POLL_LAG_SECONDS: float = 5.0  # Polling skips newer scores, whose writes may still be committing
+    SENTINELA_WORKER_RETRY_BASE_SECONDS: float = 1.0  # Backoff after a failure, doubled on each consecutive one
+    SENTINELA_WORKER_RETRY_MAX_SECONDS: float = 60.0
+
+    # Sentinela window trigger counters
+    SENTINELA_WINDOW_MAX_ENTITIES: int = 100_000  # In-memory entities kept before LRU eviction
+    SENTINELA_WINDOW_BUCKETS: int = 60  # Time buckets per sliding window
+    SENTINELA_WINDOW_SNAPSHOT_INTERVAL_SECONDS: float = 5.0
+
+    # Sentinela assessment memoization
+    SENTINELA_ASSESSMENT_CACHE_SIZE: int = 10_000
+
+    # Sentinela trigger simulation
+    SENTINELA_SIMULATION_BATCH_SIZE: int = 1000  # Scores per batch when custom_logic is evaluated in Python
+
+    # Sentinela alert webhooks (alerts are disabled while no URL is configured)
+    ALERT_WEBHOOK_URLS: List[str] = []  # JSON list, e.g. '["https://cases.example.com/hooks/foundlab"]'
+    ALERT_MIN_RISK_LEVEL: str = "CRITICAL"  # Triggered rules at or above this level are alerted
+    ALERT_QUEUE_SIZE: int = 10_000
+    ALERT_BATCH_SIZE: int = 100
+    ALERT_FLUSH_INTERVAL_SECONDS: float = 0.5  # Longest wait to fill a batch
+    ALERT_MAX_RETRIES: int = 5
+    ALERT_BACKOFF_BASE_SECONDS: float = 0.5
+    ALERT_BACKOFF_MAX_SECONDS: float = 30.0
+    ALERT_TIMEOUT_SECONDS: float = 5.0
+    ALERT_MAX_CONNECTIONS: int = 20
+    ALERT_SHUTDOWN_TIMEOUT_SECONDS: float = 10.0  # Time to drain queued alerts on shutdown
+
+    # Sentinela KPI rollups
+    RISK_STATS_REFRESH_INTERVAL_SECONDS: float = 60.0  # Stats older than this are refreshed on read
+    RISK_STATS_ROLLUP_LAG_SECONDS: float = 5.0  # Newer documents wait for the next refresh (writes may be in flight)
+    RISK_STATS_REFRESH_LEASE_SECONDS: float = 300.0  # A refresh that holds a source longer is presumed dead
+
+    # Live feed (SSE / WebSocket)
+    LIVE_FEED_QUEUE_SIZE: int = 256  # Events buffered per subscriber before it is dropped as too slow
+    LIVE_FEED_MAX_SUBSCRIBERS: int = 1000
+    LIVE_FEED_HEARTBEAT_SECONDS: float = 15.0
+
+    # Sherlock providers: adapter kind plus its options (see app/services/sherlock_providers.py)
+    SHERLOCK_PROVIDERS: List[Dict[str, Any]] = [
+        {"name": "Chainalysis", "kind": "mock_chainalysis"},
+        {"name": "TRM Labs", "kind": "mock_trm_labs"},
+    ]
+    SHERLOCK_HTTP2: bool = True
+    SHERLOCK_HTTP_MAX_CONNECTIONS: int = 100  # Shared by all HTTP providers
+    SHERLOCK_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 40
+    SHERLOCK_HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    SHERLOCK_HTTP_CONNECT_TIMEOUT_SECONDS: float = 1.0
+
+    # Local sanctions lists (OFAC/UN-style CSV, JSON or XML drops), screened in memory
+    SANCTIONS_LIST_PATHS: List[str] = []  # JSON list of files; enables the "sanctions_list" provider
+    SANCTIONS_LIST_RELOAD_INTERVAL_SECONDS: float = 60.0  # How often the files are checked for a new version
+    SANCTIONS_BLOOM_ERROR_RATE: float = 0.001
+    SANCTIONS_LIST_SHORT_CIRCUIT_ENTITY_TYPES: List[str] = []  # Clean local result skips remote providers
+    SANCTIONS_NAME_ENTITY_TYPES: List[str] = ["person", "organization"]  # Screened by fuzzy name match
+    SANCTIONS_NAME_MATCH_THRESHOLD: float = 0.88  # Minimum Jaro-Winkler similarity reported as a match
+    SANCTIONS_NAME_MAX_CANDIDATES: int = 50  # Trigram candidates re-ranked per query
+    SANCTIONS_RESCREEN_ENABLED: bool = True  # Re-screen stored entities affected by a new list version
+    SANCTIONS_RESCREEN_WORKERS: int = 8  # Entities re-screened concurrently
+    SANCTIONS_RESCREEN_QUERY_CHUNK: int = 1000  # Identifiers (or removed listed names) per `$in` lookup
+    SANCTIONS_RESCREEN_LEASE_SECONDS: float = 60.0  # Renewed while a job runs; a claim past it is taken over
+    SANCTIONS_RESCREEN_SNAPSHOT_CHUNK: int = 50_000  # Identifiers (or names) per stored snapshot document
+
+    # Sherlock provider fan-out
+    SHERLOCK_PROVIDER_TIMEOUT_SECONDS: float = 3.0  # Providers slower than this are reported as unavailable
+    SHERLOCK_PROVIDER_TIMEOUTS: Dict[str, float] = {}  # Per-provider overrides, e.g. '{"TRM Labs": 5.0}'
+    SHERLOCK_HEDGING_ENABLED: bool = False  # Send a second request once a provider exceeds its p95 latency
+    SHERLOCK_HEDGE_PERCENTILE: float = 95.0
+    SHERLOCK_LATENCY_SAMPLES: int = 200  # Recent latencies kept per provider
+    SHERLOCK_HEDGE_MIN_SAMPLES: int = 20  # No hedging until this many latencies were recorded
+
+    # Sherlock provider circuit breakers and bulkheads
+    SHERLOCK_PROVIDER_MAX_CONCURRENCY: int = 50  # Calls in flight per provider before new ones are rejected
+    SHERLOCK_BREAKER_WINDOW_SIZE: int = 20  # Recent calls the error and slow-call rates are computed over
+    SHERLOCK_BREAKER_MIN_CALLS: int = 10
+    SHERLOCK_BREAKER_FAILURE_RATE: float = 0.5
+    SHERLOCK_BREAKER_SLOW_CALL_SECONDS: float = 2.0
+    SHERLOCK_BREAKER_SLOW_CALL_RATE: float = 0.8
+    SHERLOCK_BREAKER_OPEN_SECONDS: float = 30.0  # Time an open circuit waits before a half-open trial call
+
+    # Sherlock provider quotas (token bucket per provider, served by priority class)
+    SHERLOCK_PROVIDER_RATE_LIMITS: Dict[str, float] = {}  # Requests per second, e.g. '{"Chainalysis": 10}'
+    SHERLOCK_RATE_LIMIT_BURST_SECONDS: float = 1.0  # Bucket size, in seconds of quota
+    SHERLOCK_INTERACTIVE_QUOTA_RESERVE: float = 0.25  # Share of the bucket batch and backfill calls cannot use
+    SHERLOCK_SCHEDULER_MAX_WAIT_SECONDS: Dict[str, float] = {"interactive": 1.0, "batch": 60.0, "backfill": 300.0}
+
+    # Sherlock bulk validation jobs
+    SHERLOCK_BATCH_MAX_ENTITIES: int = 100_000
+    SHERLOCK_BATCH_CHUNK_SIZE: int = 500  # Entities screened and written (insert_many) per step
+    SHERLOCK_BATCH_PROVIDER_CONCURRENCY: int = 8  # Requests in flight per provider for one job
+    SHERLOCK_BATCH_PROGRESS_INTERVAL_SECONDS: float = 0.5
+    SHERLOCK_BATCH_LEASE_SECONDS: float = 60.0  # Renewed while a job runs; pending/running jobs past it are marked failed
+
+    # Sherlock provider result cache
+    SHERLOCK_CACHE_TTL_SECONDS: float = 3600.0  # Successful provider results
+    SHERLOCK_CACHE_NEGATIVE_TTL_SECONDS: float = 30.0  # Pending, failed and unavailable results
+    SHERLOCK_CACHE_MAX_ENTRIES: int = 50_000
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
@@ -8,22 +8,53 @@ from app.database import close_mongo_connection, connect_to_mongo
 from app.routers import (
     dfc_router,
     gas_monitor_router,
+    live_router,
     nft_router,
     risk_router,
     score_router,
     sherlock_router,
 	cryptopix_analyzer_router
 )
+from app.services.alert_dispatcher import alert_dispatcher
+from app.services.risk_service import SentinelaService
+from app.services.sentinela_worker import SentinelaWorker
+from app.services.sherlock_providers import close_provider_http_client
+from app.utils.sanctions_index import sanctions_index_store
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     Context manager for application lifespan events.
-    Handles startup (DB connection) and shutdown (DB disconnection).
+    Handles startup (DB connection, local sanctions lists and their re-screening, failing the
+    batch jobs a previous process left unfinished, alert dispatcher, optional in-process
+    Sentinela worker) and shutdown (including draining queued alerts, closing the pooled
+    Sherlock provider client and a final snapshot of the Sentinela window counters).
     """
     await connect_to_mongo()
+    sanctions_index_store.add_listener(sherlock_router.rescreen_on_list_change)
+    try:
+        await sanctions_index_store.reload()
+    except Exception as e:
+        print(f"Failed to load sanctions lists: {e}")
+    sanctions_index_store.start()
+    try:
+        await sherlock_router.sherlock_batch_service.fail_orphaned_jobs()
+    except Exception as e:
+        print(f"Failed to check for interrupted Sherlock batch jobs: {e}")
+    alert_dispatcher.start()
+    sentinela_worker = None
+    if settings.SENTINELA_WORKER_ENABLED:
+        sentinela_worker = SentinelaWorker()
+        sentinela_worker.start()
     yield
+    if sentinela_worker:
+        await sentinela_worker.stop()
+    await alert_dispatcher.stop()
+    await sanctions_index_store.stop()
+    sanctions_index_store.remove_listener(sherlock_router.rescreen_on_list_change)
+    await close_provider_http_client()
+    await SentinelaService().snapshot_window_counters(force=True)
     await close_mongo_connection()
 
 
@@ -44,3 +75,4 @@ app.include_router(nft_router.router, prefix="/nft", tags=["SigilMesh"])
 app.include_router(risk_router.router, prefix="/sentinela", tags=["Sentinela"])
 app.include_router(gas_monitor_router.router, prefix="/gasmonitor", tags=["GasMonitor"])
 app.include_router(cryptopix_analyzer_router.router, prefix="/cryptopix", tags=["CryptoPixAnalyzer"])
+app.include_router(live_router.router, prefix="/live", tags=["Live"])
@@ -53,6 +53,10 @@ class FlagDefinition(MongoBaseModel):
     rules: List[Rule] = Field(default_factory=list, description="List of rules to evaluate for this flag.")
     weight: float = Field(0.0, description="Numerical weight for scoring purposes.")
     category: Optional[str] = Field(None, description="Optional categorization for the flag (e.g., compliance, fraud).")
+    category_scores: Optional[Dict[str, float]] = Field(
+        None,
+        description="For `category` flags: lookup table mapping each categorical value to a score between 0 and 1.",
+    )
 
     model_config = {
         "json_schema_extra": {
@@ -77,6 +81,16 @@ class FlagDefinition(MongoBaseModel):
                     ],
                     "weight": 0.7,
                     "category": "fraud",
+                },
+                {
+                    "name": "counterparty_exchange_tier",
+                    "description": "Reputation of the counterparty exchange tier.",
+                    "type": "category",
+                    "default_value": None,
+                    "rules": [{"field": "exchange_tier", "condition": "in", "value": ["tier1", "tier2", "unregulated"]}],
+                    "weight": 0.4,
+                    "category": "counterparty",
+                    "category_scores": {"tier1": 1.0, "tier2": 0.7, "unregulated": 0.1},
                 }
             ]
         }
@@ -91,6 +105,7 @@ class DynamicFlagCreate(BaseModel):
     rules: List[Rule] = []
     weight: float = 0.0
     category: Optional[str] = None
+    category_scores: Optional[Dict[str, float]] = None
 
     model_config = {
         "json_schema_extra": {
@@ -106,6 +121,7 @@ class DynamicFlagUpdate(BaseModel):
     rules: Optional[List[Rule]] = None
     weight: Optional[float] = None
     category: Optional[str] = None
+    category_scores: Optional[Dict[str, float]] = None
 
 
 class FlagEvaluationResult(BaseModel):
@@ -0,0 +1,23 @@
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel, Field
+
+from app.models.risk import RiskLevel
+
+
+class LiveEventType(str, Enum):
+    RISK_ASSESSMENT = "risk_assessment"
+    GAS_ANOMALY = "gas_anomaly"
+    CRYPTOPIX_DECISION = "cryptopix_decision"
+
+
+class LiveEvent(BaseModel):
+    """An event pushed to live feed subscribers as soon as it is produced."""
+
+    type: LiveEventType
+    entity_id: str = Field(description="Entity (or CryptoPix transaction) the event is about.")
+    risk_level: Optional[RiskLevel] = Field(None, description="Risk level, for events that carry one.")
+    data: Dict[str, Any] = Field(description="The produced result (assessment, anomaly or CryptoPix decision).")
+    emitted_at: datetime = Field(default_factory=datetime.utcnow)
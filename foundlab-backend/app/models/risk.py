@@ -2,9 +2,11 @@ from datetime import datetime
 from enum import Enum
 from typing import Dict, List, Optional, Literal, Any
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator, model_validator
 
 from app.models.base import MongoBaseModel
+from app.models.score import RollupGranularity
+from app.utils.risk_expression import ExpressionError, compile_custom_logic
 
 
 class RiskLevel(str, Enum):
@@ -14,17 +16,53 @@ class RiskLevel(str, Enum):
     CRITICAL = "CRITICAL"
 
 
+TriggerType = Literal["score_threshold", "flag_presence", "custom_logic", "window"]
+
+
+class WindowEvent(str, Enum):
+    ASSESSMENT_LEVEL = "assessment_level"  # An assessment at or above `min_risk_level`
+    SCORE_BELOW = "score_below"  # A score strictly below `score_threshold`
+
+
+class WindowTriggerParams(BaseModel):
+    """Parameters of a `window` trigger: fires when an entity accumulates `min_count` events within `window_seconds`."""
+
+    event: WindowEvent = Field(description="Which event is counted for the entity.")
+    window_seconds: int = Field(gt=0, le=30 * 24 * 3600, description="Length of the sliding window, up to 30 days.")
+    min_count: int = Field(ge=1, description="Number of events within the window that fires the trigger.")
+    min_risk_level: Optional[RiskLevel] = Field(
+        None, description="For `assessment_level`: assessments at or above this level are counted."
+    )
+    score_threshold: Optional[float] = Field(
+        None, ge=0.0, le=1.0, description="For `score_below`: scores strictly below this threshold are counted."
+    )
+
+    @model_validator(mode="after")
+    def _check_event_params(self) -> "WindowTriggerParams":
+        if self.event == WindowEvent.ASSESSMENT_LEVEL and self.min_risk_level is None:
+            raise ValueError("'assessment_level' window triggers require 'min_risk_level'.")
+        if self.event == WindowEvent.SCORE_BELOW and self.score_threshold is None:
+            raise ValueError("'score_below' window triggers require 'score_threshold'.")
+        return self
+
+
 class RiskTrigger(MongoBaseModel):
     """Defines a specific risk trigger rule."""
 
     name: str = Field(description="Unique name for the risk trigger (e.g., 'HighScoreBelowThreshold').")
     description: str = Field(description="Description of what this trigger monitors.")
-    trigger_type: Literal["score_threshold", "flag_presence", "custom_logic"] = Field(
+    trigger_type: TriggerType = Field(
         description="Type of condition that activates this trigger."
     )
     score_threshold: Optional[float] = Field(None, description="Score threshold (e.g., if score < 0.3 for 'HIGH' risk).")
     flag_name: Optional[str] = Field(None, description="Name of a DFC flag that triggers this risk.")
-    custom_logic_params: Optional[Dict[str, Any]] = Field(None, description="Parameters for custom logic evaluation.")
+    custom_logic_params: Optional[Dict[str, Any]] = Field(
+        None,
+        description="Parameters for custom logic evaluation: an `expression` over `score`, `flags` and `context`.",
+    )
+    window_params: Optional[WindowTriggerParams] = Field(
+        None, description="Sliding-window parameters for `window` triggers."
+    )
     risk_level: RiskLevel = Field(description="Level of risk associated with this trigger.")
     is_active: bool = Field(True, description="Whether this trigger is currently active.")
 
@@ -51,9 +89,24 @@ class RiskTrigger(MongoBaseModel):
                     "name": "suspicious_combo_risk",
                     "description": "Triggers for specific combined conditions (e.g., low score AND specific metadata).",
                     "trigger_type": "custom_logic",
-                    "custom_logic_params": {"min_transaction_count": 5, "max_score": 0.3},
+                    "custom_logic_params": {
+                        "expression": "score <= 0.3 and ctx('user_daily_transactions', 0) >= 5 and has_flag('new_device')"
+                    },
                     "risk_level": "HIGH",
                     "is_active": True,
+                },
+                {
+                    "name": "repeated_high_risk",
+                    "description": "Triggers on the third HIGH (or worse) assessment of an entity within 24h.",
+                    "trigger_type": "window",
+                    "window_params": {
+                        "event": "assessment_level",
+                        "min_risk_level": "HIGH",
+                        "window_seconds": 86400,
+                        "min_count": 3,
+                    },
+                    "risk_level": "CRITICAL",
+                    "is_active": True,
                 }
             ]
         }
@@ -104,18 +157,77 @@ class RiskAssessmentResult(MongoBaseModel):
         default_factory=list, description="List of specific risk triggers that were activated."
     )
     summary_message: str = Field(description="A concise summary of the risk assessment.")
+    trigger_set_version: Optional[str] = Field(
+        None, description="Version (hash) of the active trigger set the assessment was evaluated against."
+    )
+    context_hash: Optional[str] = Field(None, description="Hash of the additional_context used in the assessment.")
+
+
+class RiskAlert(BaseModel):
+    """A triggered rule delivered to the alert webhooks."""
+
+    entity_id: str
+    score_id: str
+    assessment_id: Optional[str] = Field(None, description="ID of the stored assessment that fired the rule.")
+    overall_risk_level: RiskLevel
+    trigger: RiskTriggerDetail
+
+
+class RiskAssessmentBatchInput(BaseModel):
+    """Input for assessing many scores in one request."""
+
+    assessments: List[RiskAssessmentInput] = Field(
+        min_length=1, max_length=1000, description="Assessments to perform (each one entity_id/score_id pair)."
+    )
+
+
+class RiskAssessmentBatchError(BaseModel):
+    """An assessment of a batch that could not be performed."""
+
+    entity_id: str
+    score_id: str
+    status_code: int = Field(description="HTTP status the equivalent single assessment would have returned.")
+    detail: str
+
+
+class RiskAssessmentBatchResult(BaseModel):
+    """Result of a batch risk assessment."""
+
+    assessments: List[RiskAssessmentResult] = Field(default_factory=list, description="Stored assessment results.")
+    errors: List[RiskAssessmentBatchError] = Field(
+        default_factory=list, description="Inputs that could not be assessed (unknown score, entity mismatch)."
+    )
+
+
+def _validate_custom_logic_params(custom_logic_params: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Parses and validates the custom_logic expression once, when the trigger is written."""
+    if custom_logic_params:
+        try:
+            compile_custom_logic(custom_logic_params)
+        except ExpressionError as e:
+            raise ValueError(str(e)) from e
+    return custom_logic_params
 
 
 class CreateRiskTrigger(BaseModel):
     name: str
     description: str
-    trigger_type: Literal["score_threshold", "flag_presence", "custom_logic"]
+    trigger_type: TriggerType
     score_threshold: Optional[float] = None
     flag_name: Optional[str] = None
     custom_logic_params: Optional[Dict[str, Any]] = None
+    window_params: Optional[WindowTriggerParams] = None
     risk_level: RiskLevel
     is_active: bool = True
 
+    _check_custom_logic_params = field_validator("custom_logic_params")(_validate_custom_logic_params)
+
+    @model_validator(mode="after")
+    def _check_window_params(self) -> "CreateRiskTrigger":
+        if self.trigger_type == "window" and self.window_params is None:
+            raise ValueError("'window' triggers require 'window_params'.")
+        return self
+
     model_config = {
         "json_schema_extra": {
             "examples": RiskTrigger.model_config["json_schema_extra"]["examples"]
@@ -125,9 +237,90 @@ class CreateRiskTrigger(BaseModel):
 
 class UpdateRiskTrigger(BaseModel):
     description: Optional[str] = None
-    trigger_type: Optional[Literal["score_threshold", "flag_presence", "custom_logic"]] = None
+    trigger_type: Optional[TriggerType] = None
     score_threshold: Optional[float] = None
     flag_name: Optional[str] = None
     custom_logic_params: Optional[Dict[str, Any]] = None
+    window_params: Optional[WindowTriggerParams] = None
     risk_level: Optional[RiskLevel] = None
     is_active: Optional[bool] = None
+
+    _check_custom_logic_params = field_validator("custom_logic_params")(_validate_custom_logic_params)
+
+
+class TriggerSimulationLevelBucket(BaseModel):
+    """Matched scores grouped by the highest level they had already been assessed at."""
+
+    previous_level: RiskLevel = Field(description="Highest stored assessment level of the score (LOW if never assessed).")
+    scores: int
+    entities: int
+
+
+class TriggerSimulationPeriodBucket(BaseModel):
+    """Matched scores within one time bucket."""
+
+    period: str = Field(description="Day (`YYYY-MM-DD`) or ISO week (`YYYY-Www`) the scores were calculated in.")
+    scores: int
+    escalated_scores: int = Field(description="Matched scores whose stored level is below the trigger's level.")
+
+
+class TriggerSimulationResult(BaseModel):
+    """Backtest of a draft trigger over stored scores."""
+
+    trigger_name: str
+    risk_level: RiskLevel
+    granularity: RollupGranularity
+    evaluated_in: Literal["database", "python"] = Field(
+        description="`database` when the condition was pushed down into the aggregation pipeline."
+    )
+    scores_matched: int
+    entities_matched: int
+    entities_escalated: int = Field(description="Entities with at least one matched score the trigger would escalate.")
+    by_previous_level: List[TriggerSimulationLevelBucket] = Field(default_factory=list)
+    by_period: List[TriggerSimulationPeriodBucket] = Field(default_factory=list)
+
+
+class StatsGranularity(str, Enum):
+    """Time bucket size of the precomputed Sentinela KPI rollups."""
+
+    HOUR = "hour"
+    DAY = "day"
+
+
+class RiskLevelPeriodCounts(BaseModel):
+    """Assessments per overall risk level within one time bucket."""
+
+    period: str = Field(description="Hour (`YYYY-MM-DDTHH:00`) or day (`YYYY-MM-DD`), in UTC.")
+    counts: Dict[RiskLevel, int] = Field(default_factory=dict)
+
+
+class TriggerFireCount(BaseModel):
+    trigger_name: str
+    count: int
+
+
+class CryptoPixActionStat(BaseModel):
+    action: str = Field(description="Suggested action of the CryptoPix analysis (e.g., APPROVE, REJECT).")
+    count: int
+    ratio: float = Field(description="Share of all CryptoPix analyses in the range.")
+
+
+class RiskStatsResult(BaseModel):
+    """Sentinela KPIs read from the `risk_stats` rollups."""
+
+    granularity: StatsGranularity
+    since: datetime
+    until: datetime
+    assessments_by_level: List[RiskLevelPeriodCounts] = Field(default_factory=list)
+    top_triggers: List[TriggerFireCount] = Field(default_factory=list)
+    cryptopix_actions: List[CryptoPixActionStat] = Field(default_factory=list)
+    refreshed_at: Optional[datetime] = Field(None, description="When the rollups were last brought up to date.")
+
+
+class RiskStatsRefreshResult(BaseModel):
+    """Outcome of one incremental rollup run."""
+
+    refreshed_at: datetime
+    rolled_up: Dict[str, int] = Field(
+        default_factory=dict, description="Source documents folded into the rollups, per source collection."
+    )
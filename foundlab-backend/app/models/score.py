@@ -1,6 +1,8 @@
+from datetime import datetime
+from enum import Enum
 from typing import Any, Dict, List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator, model_validator
 
 from app.models.base import MongoBaseModel
 
@@ -31,6 +33,16 @@ class ScoreInput(BaseModel):
     flags: List[FlagWithValue] = Field(default_factory=list, description="List of DFC flags with their values to consider.")
     metadata: Dict[str, Any] = Field(default_factory=dict, description="Additional metadata (e.g., transaction_volume, account_age) to incorporate into scoring.")
 
+    @field_validator("flags")
+    @classmethod
+    def _check_unique_flag_names(cls, flags: List[FlagWithValue]) -> List[FlagWithValue]:
+        # The entity's stored flag vector (used by single-flag deltas) is keyed by name.
+        seen = set()
+        duplicates = sorted({f.name for f in flags if f.name in seen or seen.add(f.name)})
+        if duplicates:
+            raise ValueError(f"Duplicate flag names: {', '.join(duplicates)}.")
+        return flags
+
     model_config = {
         "json_schema_extra": {
             "examples": [
@@ -52,6 +64,32 @@ class ScoreInput(BaseModel):
     }
 
 
+class ScoreBatchInput(BaseModel):
+    """Input for calculating many scores in one request."""
+
+    scores: List[ScoreInput] = Field(min_length=1, max_length=1000, description="Scores to calculate, in order.")
+
+
+class FlagDeltaInput(BaseModel):
+    """A single flag change to apply on top of an entity's current flag vector."""
+
+    name: str = Field(description="Name of the flag to add, change or remove.")
+    value: Optional[Any] = Field(None, description="New value of the flag. Required when the flag is new to the entity.")
+    weight: Optional[float] = Field(None, description="New weight of the flag. Keeps the current weight (or 0.0 for new flags) when omitted.")
+    is_active: Optional[bool] = Field(None, description="New activity state. Keeps the current state (or True for new flags) when omitted.")
+    remove: bool = Field(False, description="Remove the flag from the entity's flag vector instead of updating it.")
+
+    model_config = {
+        "json_schema_extra": {
+            "examples": [
+                {"name": "is_kyc_verified", "value": True},
+                {"name": "fraud_risk_score", "value": 0.2, "weight": 0.5},
+                {"name": "sanctioned_country_origin", "remove": True}
+            ]
+        }
+    }
+
+
 class ScoreResult(MongoBaseModel):
     """Result model for a ScoreLab score calculation."""
 
@@ -63,4 +101,114 @@ class ScoreResult(MongoBaseModel):
     algorithm_version: str = Field(description="Version of the scoring algorithm used.")
     flags_used: List[FlagWithValue] = Field(description="The flags and their values that contributed to this score.")
     metadata_used: Dict[str, Any] = Field(description="The metadata that contributed to this score.")
+    features_used: List[FlagWithValue] = Field(
+        default_factory=list, description="Weighted features extracted from metadata by the active feature transform config."
+    )
+    feature_config_version: Optional[int] = Field(None, description="Version of the feature transform config applied, if any.")
     summary: str = Field(description="A brief summary or interpretation of the score.")
+
+
+class RollupGranularity(str, Enum):
+    """Time bucket size for per-entity score rollups."""
+
+    DAILY = "daily"
+    WEEKLY = "weekly"
+
+
+class ScoreRollup(BaseModel):
+    """Aggregated P(x) statistics for one entity over one time bucket."""
+
+    entity_id: str = Field(description="The unique identifier of the entity.")
+    granularity: RollupGranularity = Field(description="Size of the time bucket (daily or weekly).")
+    period_start: datetime = Field(description="UTC start of the bucket (midnight for daily, Monday midnight for weekly).")
+    count: int = Field(description="Number of scores calculated in this bucket.")
+    min_score: float = Field(description="Lowest P(x) in this bucket.")
+    max_score: float = Field(description="Highest P(x) in this bucket.")
+    mean_score: float = Field(description="Mean P(x) in this bucket.")
+    last_score: float = Field(description="Most recent P(x) in this bucket.")
+    last_score_id: Optional[str] = Field(None, description="ID of the most recent score in this bucket.")
+    last_scored_at: datetime = Field(description="When the most recent score in this bucket was calculated.")
+
+
+class FeatureTransformType(str, Enum):
+    """Declarative transforms that turn a metadata field into a normalized [0, 1] scoring input."""
+
+    LOG = "log"  # log1p(x) / log1p(scale)
+    CLIP = "clip"  # (clamp(x, min_value, max_value) - min_value) / (max_value - min_value)
+    BUCKET = "bucket"  # bucket_scores[i] where i is the bucket of x among bucket_edges
+    RATIO = "ratio"  # source / denominator, optionally rescaled with min_value/max_value
+
+
+class FeatureTransform(BaseModel):
+    """A single metadata-to-feature transform feeding P(x)."""
+
+    name: str = Field(description="Name of the produced feature (reported alongside flags in the score).")
+    transform: FeatureTransformType = Field(description="Transform to apply.")
+    source: str = Field(description="Metadata field read by the transform.")
+    weight: float = Field(0.0, description="Weight of the produced feature in the P(x) weighted average.")
+    default: Optional[float] = Field(None, description="Value used when the source is missing or non-numeric. The feature is skipped if unset.")
+    scale: Optional[float] = Field(None, gt=0, description="`log`: value of `source` that maps to 1.0.")
+    min_value: Optional[float] = Field(None, description="`clip`/`ratio`: value that maps to 0.0.")
+    max_value: Optional[float] = Field(None, description="`clip`/`ratio`: value that maps to 1.0.")
+    bucket_edges: Optional[List[float]] = Field(None, description="`bucket`: ascending bucket boundaries.")
+    bucket_scores: Optional[List[float]] = Field(None, description="`bucket`: score per bucket, one more than `bucket_edges`.")
+    denominator: Optional[str] = Field(None, description="`ratio`: metadata field used as the denominator.")
+
+    @model_validator(mode="after")
+    def _check_parameters(self) -> "FeatureTransform":
+        match self.transform:
+            case FeatureTransformType.LOG:
+                if self.scale is None:
+                    raise ValueError("'log' transforms require 'scale'.")
+            case FeatureTransformType.CLIP:
+                if self.min_value is None or self.max_value is None or self.min_value >= self.max_value:
+                    raise ValueError("'clip' transforms require 'min_value' < 'max_value'.")
+            case FeatureTransformType.BUCKET:
+                if not self.bucket_edges or self.bucket_edges != sorted(self.bucket_edges):
+                    raise ValueError("'bucket' transforms require ascending 'bucket_edges'.")
+                if not self.bucket_scores or len(self.bucket_scores) != len(self.bucket_edges) + 1:
+                    raise ValueError("'bucket_scores' must have exactly one more entry than 'bucket_edges'.")
+            case FeatureTransformType.RATIO:
+                if not self.denominator:
+                    raise ValueError("'ratio' transforms require 'denominator'.")
+                if (self.min_value is None) != (self.max_value is None) or (
+                    self.min_value is not None and self.min_value >= self.max_value
+                ):
+                    raise ValueError("'ratio' rescaling requires both 'min_value' < 'max_value' or neither.")
+        return self
+
+
+class FeatureTransformConfigInput(BaseModel):
+    """Input for publishing a new version of the metadata feature transform config."""
+
+    transforms: List[FeatureTransform] = Field(default_factory=list, description="Transforms to apply, in order.")
+
+    @model_validator(mode="after")
+    def _check_unique_names(self) -> "FeatureTransformConfigInput":
+        names = [t.name for t in self.transforms]
+        if len(names) != len(set(names)):
+            raise ValueError("Feature transform names must be unique.")
+        return self
+
+    model_config = {
+        "json_schema_extra": {
+            "examples": [
+                {
+                    "transforms": [
+                        {"name": "account_age", "transform": "log", "source": "account_age_days", "scale": 3650, "weight": 0.3},
+                        {"name": "volume_tier", "transform": "bucket", "source": "total_volume_usd",
+                         "bucket_edges": [1000, 100000], "bucket_scores": [0.3, 0.6, 0.9], "weight": 0.2},
+                        {"name": "tx_velocity", "transform": "clip", "source": "transaction_count_last_30_days",
+                         "min_value": 0, "max_value": 100, "weight": 0.1}
+                    ]
+                }
+            ]
+        }
+    }
+
+
+class FeatureTransformConfig(MongoBaseModel):
+    """A stored, versioned feature transform config. Only the latest version is active."""
+
+    version: int = Field(description="Monotonically increasing config version.")
+    transforms: List[FeatureTransform] = Field(default_factory=list, description="Transforms applied by this version.")
@@ -16,6 +16,14 @@ class ProviderStatus(str, Enum):
     UNAVAILABLE = "unavailable"
 
 
+class RequestPriority(str, Enum):
+    """Scheduling class of a provider call; higher classes are served first from a provider's quota."""
+
+    INTERACTIVE = "interactive"
+    BATCH = "batch"
+    BACKFILL = "backfill"
+
+
 class SanctionStatus(str, Enum):
     """Overall sanction status based on provider checks."""
 
@@ -33,6 +41,7 @@ class ComplianceFlag(BaseModel):
     category: str = Field(description="Category of the flag (e.g., 'sanctions', 'AML', 'fraud').")
     value: str = Field(description="Value or specific detail of the flag.")
     severity: float = Field(ge=0.0, le=1.0, description="Severity of the flag (0.0 to 1.0, 1.0 being most severe).")
+    listed_name: Optional[str] = Field(None, description="Normalized listed name a watchlist name match refers to.")
 
     model_config = {
         "json_schema_extra": {
@@ -56,7 +65,13 @@ class ExternalProviderResult(BaseModel):
     raw_response: Optional[Dict] = Field(
         None, description="Original raw response from the provider for detailed debugging/auditing."
     )
+    raw_response_ref: Optional[str] = Field(
+        None, description="SHA-256 of the raw response, stored compressed in `sherlock_raw_responses`."
+    )
     message: Optional[str] = Field(None, description="Any specific message from the provider.")
+    cache_age_seconds: Optional[float] = Field(
+        None, description="Age of the cached provider result that was reused; None if the provider was queried."
+    )
 
 
 class SherlockValidationInput(BaseModel):
@@ -80,6 +95,9 @@ class SherlockValidationResult(MongoBaseModel):
 
     entity_id: str = Field(description="The unique identifier for the entity that was validated.")
     entity_type: str = Field(description="The type of entity validated.")
+    entity_key: Optional[str] = Field(
+        None, description="`entity_id` normalized like sanctions list identifiers (case, spaces and punctuation dropped)."
+    )
     overall_sanction_status: SanctionStatus = Field(description="Overall determination of sanction/blacklist status.")
     overall_risk_score: float = Field(
         ge=0.0,
@@ -93,3 +111,104 @@ class SherlockValidationResult(MongoBaseModel):
     suggested_action: Optional[str] = Field(
         None, description="Suggested action based on the validation (e.g., 'proceed', 'review_manual', 'block')."
     )
+    batch_job_id: Optional[str] = Field(None, description="Bulk validation job that produced this result, if any.")
+    rescreen_job_id: Optional[str] = Field(
+        None, description="Sanctions list re-screening job that produced this result, if any."
+    )
+    verdict_hash: Optional[str] = Field(
+        None, description="Hash of the sanction status, risk score, flags and provider statuses."
+    )
+    last_checked_at: Optional[datetime] = Field(
+        None, description="Latest validation that reached this same verdict (see `check_count`)."
+    )
+    check_count: int = Field(1, description="Validations that reached this verdict in a row.")
+
+
+class SanctionsListStatus(BaseModel):
+    """Currently loaded version of the local sanctions lists."""
+
+    paths: List[str] = Field(description="Configured list files (SANCTIONS_LIST_PATHS).")
+    loaded: bool = Field(description="Whether an index is loaded.")
+    version: Optional[str] = Field(None, description="Signature of the list files the index was built from.")
+    identifiers: int = Field(0, description="Distinct normalized identifiers in the index.")
+    loaded_at: Optional[datetime] = None
+    reloaded: Optional[bool] = Field(None, description="Whether a reload request swapped in a new version.")
+    rescreen_job_id: Optional[str] = Field(None, description="Latest re-screening job started by a list change.")
+
+
+class PriorityQueueMetrics(BaseModel):
+    """Quota scheduler counters of one priority class of a provider."""
+
+    priority: RequestPriority
+    queue_depth: int = Field(description="Calls currently waiting for a quota token.")
+    granted: int = Field(description="Calls let through since startup.")
+    rejected: int = Field(description="Calls that gave up after waiting their class's maximum wait.")
+    avg_wait_seconds: float = Field(description="Mean time granted calls waited for a token.")
+    max_wait_seconds: float
+
+
+class ProviderSchedulerMetrics(BaseModel):
+    """Quota and queue state of one Sherlock provider."""
+
+    provider_name: str
+    rate_limit_per_second: Optional[float] = Field(None, description="Configured quota; None means unlimited.")
+    burst: Optional[float] = None
+    tokens_available: Optional[float] = None
+    requests_last_minute: int = Field(description="Calls granted in the last 60 seconds (quota used).")
+    quota_utilization: Optional[float] = Field(
+        None, description="`requests_last_minute` over the quota of one minute."
+    )
+    queues: List[PriorityQueueMetrics]
+
+
+class SherlockBatchJobStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class SherlockBatchValidationInput(BaseModel):
+    """Entities to validate in one bulk job; duplicates are validated once."""
+
+    entities: List[SherlockValidationInput] = Field(min_length=1)
+    priority: RequestPriority = Field(
+        RequestPriority.BATCH, description="Provider quota class of the job (`batch` or `backfill`)."
+    )
+
+
+class SherlockBatchJob(MongoBaseModel):
+    """Progress of a bulk validation job; `id` is the job ID."""
+
+    status: SherlockBatchJobStatus = SherlockBatchJobStatus.PENDING
+    priority: RequestPriority = RequestPriority.BATCH
+    total_entities: int = Field(description="Entities submitted, including duplicates.")
+    unique_entities: int = Field(description="Distinct (entity_id, entity_type) pairs to validate.")
+    processed: int = Field(0, description="Distinct entities validated and stored so far.")
+    provider_calls: int = Field(0, description="Provider requests made (a batch request counts once).")
+    cache_hits: int = Field(0, description="Provider results served from the Sherlock cache.")
+    status_counts: Dict[str, int] = Field(default_factory=dict, description="Stored results per overall sanction status.")
+    error: Optional[str] = None
+    completed_at: Optional[datetime] = None
+    lease_until: Optional[datetime] = Field(
+        None, description="Renewed by the process running the job; past it, the job is marked failed."
+    )
+
+
+class SherlockRescreenJob(MongoBaseModel):
+    """
+    Re-screening of the stored entities affected by a sanctions list change; `id` is the job ID.
+    Only entities whose verdict changed get a new result.
+    """
+
+    status: SherlockBatchJobStatus = SherlockBatchJobStatus.PENDING
+    previous_version: str = Field(description="List version the entities were screened against.")
+    list_version: str = Field(description="New list version.")
+    changed_identifiers: int = Field(0, description="Identifiers added, removed or re-listed between the versions.")
+    removed_names: int = Field(0, description="Listed names no longer present.")
+    candidates: int = Field(0, description="Stored entities matching the diff, queued for re-screening.")
+    processed: int = Field(0, description="Candidates re-screened so far.")
+    changed: int = Field(0, description="Candidates whose sanction status or action changed (new result stored).")
+    failed: int = Field(0, description="Candidates that could not be re-screened.")
+    error: Optional[str] = None
+    completed_at: Optional[datetime] = None
@@ -0,0 +1,107 @@
+import asyncio
+from typing import AsyncIterator, List, Optional
+
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+
+from app.config import settings
+from app.models.live import LiveEventType
+from app.models.risk import RiskLevel
+from app.services.live_feed import Subscription, live_hub
+
+router = APIRouter()
+
+
+async def event_stream(subscription: Subscription, heartbeat_seconds: float) -> AsyncIterator[str]:
+    """
+    Formats a subscription as Server-Sent Events, with a comment line as heartbeat while idle.
+    The subscription is released when the client disconnects or the hub drops it.
+    """
+    try:
+        while True:
+            try:
+                event = await subscription.get(timeout=heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if event is None:
+                yield f"event: closed\ndata: {subscription.closed_reason}\n\n"
+                return
+            yield f"event: {event.type.value}\ndata: {event.model_dump_json()}\n\n"
+    finally:
+        live_hub.unsubscribe(subscription)
+
+
+def _subscribe(
+    entity_ids: Optional[List[str]], min_risk_level: Optional[RiskLevel], types: Optional[List[LiveEventType]]
+) -> Subscription:
+    subscription = Subscription(entity_ids=entity_ids, min_risk_level=min_risk_level, types=types)
+    if not live_hub.subscribe(subscription):
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Live feed is at capacity.")
+    return subscription
+
+
+@router.get(
+    "/events",
+    summary="Stream live risk assessments, gas anomalies and CryptoPix decisions (Server-Sent Events)",
+    response_class=StreamingResponse,
+)
+async def stream_live_events(
+    entity_id: Optional[List[str]] = Query(None, description="Only events for these entities"),
+    min_risk_level: Optional[RiskLevel] = Query(None, description="Only events at or above this risk level"),
+    types: Optional[List[LiveEventType]] = Query(None, description="Only these event types"),
+):
+    """
+    Pushes events as they are produced instead of having dashboards poll per entity.
+    Clients that fall more than `LIVE_FEED_QUEUE_SIZE` events behind receive a final
+    `closed` event and are disconnected.
+    """
+    subscription = _subscribe(entity_id, min_risk_level, types)
+    return StreamingResponse(
+        event_stream(subscription, settings.LIVE_FEED_HEARTBEAT_SECONDS),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _wait_for_disconnect(websocket: WebSocket) -> None:
+    """Consumes (and ignores) client messages until the client goes away."""
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+
+
+@router.websocket("/ws")
+async def live_events_websocket(
+    websocket: WebSocket,
+    entity_id: Optional[List[str]] = Query(None),
+    min_risk_level: Optional[RiskLevel] = Query(None),
+    types: Optional[List[LiveEventType]] = Query(None),
+):
+    """WebSocket variant of `/live/events`: each event is sent as one JSON text message."""
+    subscription = Subscription(entity_ids=entity_id, min_risk_level=min_risk_level, types=types)
+    if not live_hub.subscribe(subscription):
+        await websocket.close(code=1013, reason="Live feed is at capacity.")
+        return
+
+    await websocket.accept()
+    disconnected = asyncio.create_task(_wait_for_disconnect(websocket))
+    try:
+        while True:
+            next_event = asyncio.ensure_future(subscription.get())
+            await asyncio.wait({next_event, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_event.done():
+                next_event.cancel()
+                return
+            event = next_event.result()
+            if event is None:
+                await websocket.close(code=1008, reason=subscription.closed_reason)
+                return
+            await websocket.send_text(event.model_dump_json())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        disconnected.cancel()
+        live_hub.unsubscribe(subscription)
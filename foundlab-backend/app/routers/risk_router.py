@@ -1,18 +1,28 @@
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException, Path, status, Body
+from fastapi import APIRouter, HTTPException, Path, Query, status, Body
 
 from app.models.risk import (
     CreateRiskTrigger,
+    RiskAssessmentBatchInput,
+    RiskAssessmentBatchResult,
     RiskAssessmentInput,
     RiskAssessmentResult,
+    RiskStatsRefreshResult,
+    RiskStatsResult,
     RiskTrigger,
+    StatsGranularity,
+    TriggerSimulationResult,
     UpdateRiskTrigger,
 )
+from app.models.score import RollupGranularity
 from app.services.risk_service import SentinelaService
+from app.services.risk_stats_service import RiskStatsService
 
 router = APIRouter()
 sentinela_service = SentinelaService()
+risk_stats_service = RiskStatsService()
 
 
 @router.post(
@@ -33,12 +43,41 @@ async def create_risk_trigger(trigger_data: CreateRiskTrigger):
                 status_code=status.HTTP_409_CONFLICT, detail=f"Trigger '{trigger_data.name}' already exists."
             )
         return new_trigger
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to create risk trigger: {e}"
         )
 
 
+@router.post(
+    "/triggers/simulate",
+    response_model=TriggerSimulationResult,
+    summary="Backtest a draft risk trigger over stored scores",
+)
+async def simulate_risk_trigger(
+    trigger_data: CreateRiskTrigger,
+    since: Optional[datetime] = Query(None, description="Only scores calculated at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only scores calculated before this time"),
+    granularity: RollupGranularity = Query(RollupGranularity.DAILY, description="Bucket size of the time histogram"),
+):
+    """
+    Reports how many stored scores and entities a draft trigger would have fired on, which
+    level they had been assessed at, and how many it would have escalated, per day or week.
+    Nothing is stored. Threshold and flag conditions are counted inside MongoDB;
+    `custom_logic` expressions are evaluated in batches. `window` triggers cannot be simulated.
+    """
+    try:
+        return await sentinela_service.simulate_trigger(trigger_data, since, until, granularity)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to simulate risk trigger: {e}"
+        )
+
+
 @router.get(
     "/triggers",
     response_model=List[RiskTrigger],
@@ -138,3 +177,69 @@ async def assess_risk(assessment_input: RiskAssessmentInput):
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to assess risk: {e}"
         )
+
+
+@router.post(
+    "/assess/batch",
+    response_model=RiskAssessmentBatchResult,
+    status_code=status.HTTP_200_OK,
+    summary="Assess risk for many scores in one request",
+    response_description="Stored assessments plus any inputs that could not be assessed.",
+)
+async def assess_risk_batch(batch_input: RiskAssessmentBatchInput):
+    """
+    Performs risk assessments for many entity/score pairs at once.
+
+    All referenced scores are fetched with a single query, evaluated against the cached
+    trigger set, and the resulting assessments are stored with a single bulk insert.
+    Unknown scores or scores belonging to another entity are reported in `errors`
+    instead of failing the whole batch.
+    """
+    try:
+        return await sentinela_service.assess_batch(batch_input.assessments)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to assess risk batch: {e}"
+        )
+
+
+@router.get(
+    "/stats",
+    response_model=RiskStatsResult,
+    summary="Retrieve precomputed Sentinela KPIs",
+)
+async def get_risk_stats(
+    granularity: StatsGranularity = Query(StatsGranularity.HOUR, description="Bucket size of the level histogram"),
+    since: Optional[datetime] = Query(None, description="Start of the range (default: 48 hours or 30 days ago)"),
+    until: Optional[datetime] = Query(None, description="End of the range (default: now)"),
+    top_triggers: int = Query(10, ge=1, le=100, description="Number of most fired triggers to return"),
+):
+    """
+    Returns assessments per risk level per hour or day, the most fired triggers and the
+    CryptoPix action ratios for the range. Only the `risk_stats` rollups are read, so the
+    cost does not grow with the assessment history.
+    """
+    try:
+        return await risk_stats_service.get_stats(granularity, since, until, top_triggers)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to retrieve risk stats: {e}"
+        )
+
+
+@router.post(
+    "/stats/refresh",
+    response_model=RiskStatsRefreshResult,
+    summary="Fold new assessments and CryptoPix analyses into the KPI rollups",
+)
+async def refresh_risk_stats():
+    """
+    Incrementally aggregates the documents inserted since the last refresh and `$merge`s
+    them into `risk_stats`. Reads refresh stale rollups on their own; this forces it.
+    """
+    try:
+        return await risk_stats_service.refresh()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to refresh risk stats: {e}"
+        )
@@ -1,8 +1,17 @@
 from typing import List
 
-from fastapi import APIRouter, HTTPException, Path, status
+from fastapi import APIRouter, Body, HTTPException, Path, Query, status
 
-from app.models.score import ScoreInput, ScoreResult
+from app.models.score import (
+    FeatureTransformConfig,
+    FeatureTransformConfigInput,
+    FlagDeltaInput,
+    RollupGranularity,
+    ScoreBatchInput,
+    ScoreInput,
+    ScoreResult,
+    ScoreRollup,
+)
 from app.services.score_service import ScoreLabService
 
 router = APIRouter()
@@ -35,6 +44,65 @@ async def calculate_score(score_input: ScoreInput):
         )
 
 
+@router.post(
+    "/batch",
+    response_model=List[ScoreResult],
+    status_code=status.HTTP_201_CREATED,
+    summary="Calculate reputation scores for many entities",
+    response_description="The calculated scores, in input order.",
+)
+async def calculate_scores_batch(batch_input: ScoreBatchInput):
+    """
+    Calculates and stores `P(x)` for up to 1000 entities in one request, each exactly as
+    `POST /scores` would. Metadata features are extracted for the whole batch at once.
+    """
+    try:
+        return await score_service.calculate_scores_batch(batch_input.scores)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to calculate score batch: {e}"
+        )
+
+
+@router.post(
+    "/features/config",
+    response_model=FeatureTransformConfig,
+    status_code=status.HTTP_201_CREATED,
+    summary="Publish a new version of the metadata feature transform config",
+)
+async def publish_feature_config(config_input: FeatureTransformConfigInput):
+    """
+    Publishes a new version of the declarative metadata transforms (log scaling, bucketing,
+    clipping, ratios) that ScoreLab applies to `metadata` on every score calculation.
+
+    Each transform produces a weighted input to `P(x)`. The new version becomes active
+    immediately and is compiled once into a single feature-extraction function.
+    """
+    try:
+        return await score_service.publish_feature_config(config_input)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to publish feature config: {e}"
+        )
+
+
+@router.get(
+    "/features/config",
+    response_model=FeatureTransformConfig,
+    summary="Retrieve the active metadata feature transform config",
+)
+async def get_active_feature_config():
+    """
+    Retrieves the latest published feature transform config, which is the one applied to new scores.
+    """
+    config = await score_service.get_active_feature_config()
+    if not config:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No feature transform config published.")
+    return config
+
+
 @router.get(
     "/{score_id}",
     response_model=ScoreResult,
@@ -64,3 +132,56 @@ async def get_scores_by_entity(entity_id: str = Path(..., description="ID of the
     """
     scores = await score_service.get_scores_by_entity_id(entity_id)
     return scores
+
+
+@router.get(
+    "/entity/{entity_id}/rollups",
+    response_model=List[ScoreRollup],
+    summary="Retrieve daily or weekly score rollups for a specific entity",
+    response_description="A list of rollup buckets (min, max, mean, last, count) for the entity.",
+)
+async def get_score_rollups_by_entity(
+    entity_id: str = Path(..., description="ID of the entity to retrieve rollups for"),
+    granularity: RollupGranularity = Query(RollupGranularity.DAILY, description="Bucket size of the rollup series"),
+    limit: int = Query(30, ge=1, le=366, description="Maximum number of buckets to return"),
+):
+    """
+    Retrieves the P(x) trend for an entity as pre-aggregated daily or weekly buckets,
+    ordered by most recent first.
+
+    Rollups are maintained incrementally on every score calculation, so this endpoint
+    reads a handful of small documents instead of the entity's full score history.
+    """
+    rollups = await score_service.get_score_rollups(entity_id, granularity, limit)
+    return rollups
+
+
+@router.patch(
+    "/entity/{entity_id}/flags",
+    response_model=ScoreResult,
+    summary="Apply a single flag change and recalculate the entity's score",
+    response_description="The new reputation score after applying the flag change.",
+)
+async def apply_flag_delta(
+    entity_id: str = Path(..., description="ID of the entity whose flag changed"),
+    delta: FlagDeltaInput = Body(..., description="The flag change to apply"),
+):
+    """
+    Applies one flag change (add, update or remove) to the entity's last known flag vector
+    and emits a new `ScoreResult`, without re-sending the full flag list.
+
+    ScoreLab keeps the running sums of the weighted-average formula per entity, so the
+    new `P(x)` is derived in constant time from the changed flag's old and new contribution.
+    The entity must have been scored at least once through `POST /scores`.
+    """
+    try:
+        result = await score_service.apply_flag_delta(entity_id, delta)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to apply flag change: {e}"
+        )
+    if not result:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No score state found for entity.")
+    return result
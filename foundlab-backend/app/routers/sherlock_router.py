@@ -1,12 +1,32 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException, Path, status
+from fastapi import APIRouter, HTTPException, Path, Query, status
+from fastapi.responses import StreamingResponse
 
-from app.models.sherlock import SherlockValidationInput, SherlockValidationResult
+from app.models.sherlock import (
+    ProviderSchedulerMetrics,
+    SanctionsListStatus,
+    SherlockBatchJob,
+    SherlockRescreenJob,
+    SherlockBatchValidationInput,
+    SherlockValidationInput,
+    SherlockValidationResult,
+)
+from app.services.sherlock_batch_service import SherlockBatchService
+from app.services.sherlock_rescreen_service import SherlockRescreenService
 from app.services.sherlock_service import SherlockService
+from app.utils.provider_scheduler import provider_schedulers
+from app.utils.sanctions_index import SanctionsIndex, sanctions_index_store
 
 router = APIRouter()
 sherlock_service = SherlockService()
+sherlock_batch_service = SherlockBatchService()
+sherlock_rescreen_service = SherlockRescreenService()
+
+
+async def rescreen_on_list_change(previous: Optional[SanctionsIndex], current: SanctionsIndex) -> None:
+    """`SanctionsIndexStore` listener registered at startup; starts a re-screening job for the list diff."""
+    await sherlock_rescreen_service.on_sanctions_reload(previous, current)
 
 
 @router.post(
@@ -26,6 +46,9 @@ async def validate_entity_reputation(validation_input: SherlockValidationInput):
     **Current Implementation Notes:**
     *   Currently, external provider calls are mocked. In a production environment,
         this service would integrate with actual APIs from Chainalysis, TRM Labs, etc.
+    *   Providers are queried concurrently, each under its own timeout
+        (`SHERLOCK_PROVIDER_TIMEOUT_SECONDS`); a provider that does not answer in time is
+        reported as `unavailable` and the entity is left for manual review.
     *   The aggregation logic is simplified for demonstration. Real aggregation would
         involve complex weighting, conflict resolution, and detailed flag processing.
     """
@@ -38,6 +61,135 @@ async def validate_entity_reputation(validation_input: SherlockValidationInput):
         )
 
 
+@router.post(
+    "/validate/batch",
+    response_model=SherlockBatchJob,
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Start a bulk reputational validation job",
+)
+async def validate_entities_batch(batch_input: SherlockBatchValidationInput):
+    """
+    Validates up to `SHERLOCK_BATCH_MAX_ENTITIES` entities in the background and returns
+    the job right away. Duplicate entities are validated once, cached provider results are
+    reused, and providers with a batch API receive batch requests. Follow the job with
+    `GET /sherlock/validate/batch/{job_id}` or its `/events` stream.
+    """
+    try:
+        return await sherlock_batch_service.create_job(batch_input)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to start batch validation: {e}"
+        )
+
+
+@router.get(
+    "/validate/batch/{job_id}",
+    response_model=SherlockBatchJob,
+    summary="Retrieve the progress of a bulk validation job",
+)
+async def get_batch_job(job_id: str = Path(..., description="ID of the batch job")):
+    return await sherlock_batch_service.get_job(job_id)
+
+
+@router.get(
+    "/validate/batch/{job_id}/events",
+    response_class=StreamingResponse,
+    summary="Stream the progress of a bulk validation job (Server-Sent Events)",
+)
+async def stream_batch_job_progress(job_id: str = Path(..., description="ID of the batch job")):
+    """Emits a `progress` event whenever the job advances and a final `completed` or `failed` event."""
+    await sherlock_batch_service.get_job(job_id)
+    return StreamingResponse(
+        sherlock_batch_service.progress_events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get(
+    "/validate/batch/{job_id}/results",
+    response_model=List[SherlockValidationResult],
+    summary="Retrieve the results stored by a bulk validation job",
+)
+async def get_batch_job_results(
+    job_id: str = Path(..., description="ID of the batch job"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    include_raw: bool = Query(False, description="Include the raw provider responses"),
+):
+    return await sherlock_batch_service.get_job_results(job_id, skip, limit, include_raw)
+
+
+def _sanctions_status(reloaded: Optional[bool] = None) -> SanctionsListStatus:
+    index = sanctions_index_store.current
+    return SanctionsListStatus(
+        paths=sanctions_index_store.paths,
+        loaded=index is not None,
+        version=index.version if index else None,
+        identifiers=len(index) if index else 0,
+        loaded_at=index.loaded_at if index else None,
+        reloaded=reloaded,
+        rescreen_job_id=sherlock_rescreen_service.last_job_id,
+    )
+
+
+@router.get(
+    "/sanctions/status",
+    response_model=SanctionsListStatus,
+    summary="Show the loaded version of the local sanctions lists",
+)
+async def get_sanctions_status():
+    return _sanctions_status()
+
+
+@router.post(
+    "/sanctions/reload",
+    response_model=SanctionsListStatus,
+    summary="Reload the local sanctions lists now",
+)
+async def reload_sanctions_lists(
+    force: bool = Query(False, description="Rebuild the index even if the list files did not change")
+):
+    """
+    Rebuilds the in-memory index if a new list version was dropped (the files are also
+    checked every `SANCTIONS_LIST_RELOAD_INTERVAL_SECONDS`). Lookups keep using the
+    previous version until the new one is complete. A new version starts a re-screening
+    job for the stored entities the list diff affects (`rescreen_job_id`).
+    """
+    try:
+        reloaded = await sanctions_index_store.reload(force=force)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to reload sanctions lists: {e}"
+        )
+    return _sanctions_status(reloaded)
+
+
+@router.get(
+    "/rescreen/{job_id}",
+    response_model=SherlockRescreenJob,
+    summary="Retrieve the progress of a sanctions list re-screening job",
+)
+async def get_rescreen_job(job_id: str = Path(..., description="ID of the re-screening job")):
+    return await sherlock_rescreen_service.get_job(job_id)
+
+
+@router.get(
+    "/scheduler/metrics",
+    response_model=List[ProviderSchedulerMetrics],
+    summary="Show provider quota usage and scheduler queues",
+)
+async def get_scheduler_metrics():
+    """
+    Per provider: the token bucket (`SHERLOCK_PROVIDER_RATE_LIMITS`), quota used in the last
+    minute, and the depth, grants, rejections and wait times of the interactive, batch and
+    backfill queues.
+    """
+    return provider_schedulers.metrics()
+
+
 @router.get(
     "/{entity_id}",
     response_model=List[SherlockValidationResult],
@@ -45,11 +197,13 @@ async def validate_entity_reputation(validation_input: SherlockValidationInput):
     response_description="A list of historical validation results for the entity.",
 )
 async def get_validation_results_by_entity(
-    entity_id: str = Path(..., description="ID of the entity to retrieve validation results for")
+    entity_id: str = Path(..., description="ID of the entity to retrieve validation results for"),
+    include_raw: bool = Query(False, description="Include the raw provider responses"),
 ):
     """
     Retrieves all historical reputational validation results associated with a specific entity ID.
-    Results are ordered by most recent first.
+    Results are ordered by most recent first. Raw provider responses are only loaded (from
+    `sherlock_raw_responses`) when `include_raw=true`.
     """
-    results = await sherlock_service.get_validation_results_by_entity_id(entity_id)
+    results = await sherlock_service.get_validation_results_by_entity_id(entity_id, include_raw)
     return results
@@ -0,0 +1,197 @@
+import asyncio
+import random
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import httpx
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from app.config import settings
+from app.database import get_collection
+from app.models.risk import RiskAlert, RiskAssessmentResult, RiskLevel
+from app.utils.trigger_index import RISK_LEVEL_ORDER
+
+
+class AlertDispatcher:
+    """
+    Delivers Sentinela alerts to the configured HTTP webhooks in the background.
+
+    `enqueue` only puts alerts on bounded in-memory queues, so assessments never wait on
+    a webhook. Each webhook has its own queue and background consumer, so a webhook that
+    is down or retrying does not hold up delivery to the others. A consumer groups queued
+    alerts into batches (up to `batch_size`, or whatever arrived within
+    `flush_interval_seconds`) and POSTs each batch as `{"alerts": [...]}` over one pooled
+    `httpx.AsyncClient`. Transport errors, 429 and 5xx responses are retried with jittered
+    exponential backoff; batches still undelivered after `max_retries` (or rejected with
+    another 4xx) are written to `alert_dead_letters`.
+    """
+
+    def __init__(
+        self,
+        webhook_urls: Optional[List[str]] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        min_risk_level: RiskLevel = RiskLevel(settings.ALERT_MIN_RISK_LEVEL),
+        queue_size: int = settings.ALERT_QUEUE_SIZE,
+        batch_size: int = settings.ALERT_BATCH_SIZE,
+        flush_interval_seconds: float = settings.ALERT_FLUSH_INTERVAL_SECONDS,
+        max_retries: int = settings.ALERT_MAX_RETRIES,
+        backoff_base_seconds: float = settings.ALERT_BACKOFF_BASE_SECONDS,
+        backoff_max_seconds: float = settings.ALERT_BACKOFF_MAX_SECONDS,
+    ):
+        self.webhook_urls = list(settings.ALERT_WEBHOOK_URLS if webhook_urls is None else webhook_urls)
+        self.min_risk_level = min_risk_level
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.dropped_count = 0
+        self._client = client
+        self._owns_client = client is None
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._tasks)
+
+    def _get_dead_letters_collection(self) -> AsyncIOMotorCollection:
+        return get_collection("alert_dead_letters")
+
+    def enqueue_assessment(self, assessment: RiskAssessmentResult) -> None:
+        """Queues an alert for every rule of `assessment` at or above `min_risk_level`; never blocks."""
+        if not self._tasks:
+            return
+        min_order = RISK_LEVEL_ORDER[self.min_risk_level]
+        self.enqueue(
+            RiskAlert(
+                entity_id=assessment.entity_id,
+                score_id=assessment.score_id,
+                assessment_id=assessment.id,
+                overall_risk_level=assessment.overall_risk_level,
+                trigger=rule,
+            )
+            for rule in assessment.triggered_rules
+            if RISK_LEVEL_ORDER[rule.risk_level] >= min_order
+        )
+
+    def enqueue(self, alerts: Iterable[RiskAlert]) -> None:
+        """Queues alerts for every webhook; alerts that do not fit in a webhook's queue are dropped and counted."""
+        if not self._tasks:
+            return
+        for alert in alerts:
+            for url, queue in self._queues.items():
+                try:
+                    queue.put_nowait(alert)
+                except asyncio.QueueFull:
+                    self.dropped_count += 1
+                    print(
+                        f"Alert queue for {url} full; dropped alert for {alert.entity_id} ({alert.trigger.trigger_name})."
+                    )
+
+    def start(self) -> None:
+        """Starts the dispatcher on the running event loop; a no-op while no webhook is configured."""
+        if self._tasks or not self.webhook_urls:
+            return
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=settings.ALERT_TIMEOUT_SECONDS,
+                limits=httpx.Limits(
+                    max_connections=settings.ALERT_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.ALERT_MAX_CONNECTIONS,
+                ),
+            )
+        for url in dict.fromkeys(self.webhook_urls):
+            self._queues[url] = asyncio.Queue(maxsize=self.queue_size)
+            self._tasks[url] = asyncio.create_task(self._run(url))
+
+    async def stop(self, timeout_seconds: float = settings.ALERT_SHUTDOWN_TIMEOUT_SECONDS) -> None:
+        """Drains the queued alerts (up to `timeout_seconds`), then stops the dispatcher."""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self._queues.values())), timeout_seconds)
+        except asyncio.TimeoutError:
+            for url, queue in self._queues.items():
+                if queue.qsize():
+                    print(f"Alert dispatcher stopped with {queue.qsize()} undelivered alerts for {url}.")
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+        self._queues.clear()
+        if self._owns_client and self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _next_batch(self, queue: asyncio.Queue) -> List[RiskAlert]:
+        loop = asyncio.get_running_loop()
+        batch = [await queue.get()]
+        deadline = loop.time() + self.flush_interval_seconds
+        while len(batch) < self.batch_size:
+            if not queue.empty():
+                batch.append(queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self, url: str) -> None:
+        """Consumer of one webhook's queue."""
+        queue = self._queues[url]
+        while True:
+            batch = await self._next_batch(queue)
+            try:
+                await self._deliver_to(url, {"alerts": [alert.model_dump(mode="json") for alert in batch]})
+            except Exception as e:
+                print(f"Alert dispatcher failed to deliver a batch of {len(batch)} alerts to {url}: {e}")
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    def _backoff_seconds(self, attempt: int) -> float:
+        delay = min(self.backoff_max_seconds, self.backoff_base_seconds * 2**attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _deliver_to(self, url: str, payload: Dict[str, Any]) -> bool:
+        error = ""
+        attempts = 0
+        for attempt in range(self.max_retries + 1):
+            attempts += 1
+            try:
+                response = await self._client.post(url, json=payload)
+                if response.status_code < 400:
+                    return True
+                error = f"HTTP {response.status_code}: {response.text[:200]}"
+                if response.status_code < 500 and response.status_code != 429:
+                    break
+            except httpx.HTTPError as e:
+                error = f"{type(e).__name__}: {e}"
+            if attempt < self.max_retries:
+                await asyncio.sleep(self._backoff_seconds(attempt))
+
+        await self._dead_letter(url, payload, error, attempts)
+        return False
+
+    async def _dead_letter(self, url: str, payload: Dict[str, Any], error: str, attempts: int) -> None:
+        try:
+            await self._get_dead_letters_collection().insert_one(
+                {
+                    "webhook_url": url,
+                    "alerts": payload["alerts"],
+                    "error": error,
+                    "attempts": attempts,
+                    "created_at": datetime.utcnow(),
+                }
+            )
+        except Exception as e:
+            print(f"Failed to dead-letter {len(payload['alerts'])} alerts for {url}: {e}")
+
+
+alert_dispatcher = AlertDispatcher()
@@ -4,12 +4,14 @@ from motor.motor_asyncio import AsyncIOMotorCollection
 
 from app.database import get_collection
 from app.models.cryptopix import CryptoPixTransactionInput, CryptoPixAnalysisResult
+from app.models.live import LiveEvent, LiveEventType
 from app.models.score import ScoreInput, FlagWithValue
 from app.models.sherlock import SherlockValidationInput, SanctionStatus
-from app.models.risk import RiskLevel, RiskAssessmentInput
+from app.models.risk import RiskLevel
 from app.services.dfc_service import DFCService
 from app.services.score_service import ScoreLabService
 from app.services.sherlock_service import SherlockService
+from app.services.live_feed import live_hub
 from app.services.risk_service import SentinelaService
 
 class CryptoPixAnalyzerService:
@@ -66,10 +68,9 @@ class CryptoPixAnalyzerService:
         )
         score_result = await self.score_service.calculate_score(score_input)
 
-        # 4. Sentinela: Assess overall risk 
-        risk_assessment_input = RiskAssessmentInput(
-            entity_id=input_data.transaction_id,
-            score_id=str(score_result.id),
+        # 4. Sentinela: Assess overall risk directly from the in-memory score
+        sentinela_result = await self.sentinela_service.assess_score_result(
+            score_result,
             additional_context={
                 "sherlock_overall_sanction_status": sherlock_result.overall_sanction_status.value,
                 "sherlock_overall_risk_score": sherlock_result.overall_risk_score,
@@ -78,12 +79,7 @@ class CryptoPixAnalyzerService:
                 "original_ip_address": input_data.ip_address,
                 **input_data.crypto_details.model_dump(exclude_unset=True),
                 **input_data.pix_details.model_dump(exclude_unset=True),
-            }
-        )
-        sentinela_result = await self.sentinela_service.assess_entity_risk(
-            risk_assessment_input.entity_id,
-            risk_assessment_input.score_id,
-            risk_assessment_input.additional_context
+            },
         )
 
         # 5. Determine Suggested Action and Final Message 
@@ -135,5 +131,13 @@ class CryptoPixAnalyzerService:
         # Save to DB
         collection = self._get_collection()
         await collection.insert_one(final_result.model_dump(by_alias=True, exclude_none=True))
+        live_hub.publish(
+            LiveEvent(
+                type=LiveEventType.CRYPTOPIX_DECISION,
+                entity_id=final_result.transaction_id,
+                risk_level=overall_risk_level,
+                data=final_result.model_dump(mode="json"),
+            )
+        )
 
         return final_result
@@ -9,8 +9,11 @@ from app.models.dfc import (
     FlagApplyResponse,
     FlagDefinition,
     FlagEvaluationResult,
+    FlagType,
     RuleCondition,
 )
+from app.utils.catalog_versions import catalog_versions
+from app.utils.category_scores import CategoryScoreTables, category_score_tables
 
 
 class DFCService:
@@ -27,6 +30,7 @@ class DFCService:
         if await collection.find_one({"name": flag_data["name"]}):
             return None
         insert_result = await collection.insert_one(flag_data)
+        await catalog_versions.bump(CategoryScoreTables.CATALOG)
         new_flag = await collection.find_one({"_id": insert_result.inserted_id})
         return FlagDefinition(**new_flag)
 
@@ -48,12 +52,15 @@ class DFCService:
         update_result = await collection.update_one({"name": name}, {"$set": update_data})
         if update_result.modified_count == 0:
             return None
+        await catalog_versions.bump(CategoryScoreTables.CATALOG)
         updated_flag = await collection.find_one({"name": name})
         return FlagDefinition(**updated_flag) if updated_flag else None
 
     async def delete_flag_definition(self, name: str) -> int:
         collection = self._get_collection()
         delete_result = await collection.delete_one({"name": name})
+        if delete_result.deleted_count:
+            await catalog_versions.bump(CategoryScoreTables.CATALOG)
         return delete_result.deleted_count
 
     def _evaluate_rule(self, rule: dict, metadata: Dict[str, Any]) -> bool:
@@ -85,7 +92,12 @@ class DFCService:
                 return False
 
     async def apply_flags_to_entity(self, entity_id: str, metadata: Dict[str, Any]) -> FlagApplyResponse:
+        ruleset_version = await catalog_versions.current(CategoryScoreTables.CATALOG)
         all_flags_definitions = await self.get_all_flag_definitions()
+        if category_score_tables.is_stale(ruleset_version):
+            category_score_tables.compile(
+                (flag_def.model_dump() for flag_def in all_flags_definitions), ruleset_version
+            )
         evaluated_results: List[FlagEvaluationResult] = []
         active_flags_summary: Dict[str, Any] = {}
 
@@ -98,7 +110,12 @@ class DFCService:
                 if self._evaluate_rule(rule.model_dump(), metadata):
                     is_active = True
                     reason = f"Rule '{rule.field} {rule.condition} {rule.value}' matched."
-                    flag_value = True if flag_def.type == "boolean" else metadata.get(rule["field"], flag_def.default_value)
+                    flag_value = True if flag_def.type == "boolean" else metadata.get(rule.field, flag_def.default_value)
+                    if flag_def.type == FlagType.CATEGORY and category_score_tables.has_table(flag_def.name):
+                        category_score = category_score_tables.lookup(flag_def.name, flag_value)
+                        if category_score is not None:
+                            reason += f" Category '{flag_value}' mapped to score {category_score}."
+                            flag_value = category_score
                     break
 
             if not flag_def.rules and flag_def.default_value is not None:
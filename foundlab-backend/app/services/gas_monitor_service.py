@@ -6,12 +6,14 @@ from fastapi import HTTPException, status
 from motor.motor_asyncio import AsyncIOMotorCollection
 
 from app.database import get_collection
+from app.models.live import LiveEvent, LiveEventType
 from app.models.gas_monitor import (
     GasPatternAnomaly,
     GasConsumptionRecord,
     GasMonitorAnalysisResult,
     IngestGasConsumptionInput,
 )
+from app.services.live_feed import live_hub
 
 
 class GasMonitorService:
@@ -82,6 +84,9 @@ class GasMonitorService:
                     transactions_involved=[record.transaction_hash],
                 )
                 anomalies.append(anom)
+                live_hub.publish(
+                    LiveEvent(type=LiveEventType.GAS_ANOMALY, entity_id=entity_id, data=anom.model_dump(mode="json"))
+                )
 
         if anomalies:
             summary += f"Detected {len(anomalies)} potential anomalies."
@@ -0,0 +1,105 @@
+import asyncio
+from typing import Collection, Optional, Set
+
+from app.config import settings
+from app.models.live import LiveEvent, LiveEventType
+from app.models.risk import RiskLevel
+from app.utils.trigger_index import RISK_LEVEL_ORDER
+
+
+class Subscription:
+    """
+    One live feed client: its filters and a bounded queue of pending events.
+    A subscription whose queue fills up is closed by the hub instead of buffering more.
+    """
+
+    def __init__(
+        self,
+        entity_ids: Optional[Collection[str]] = None,
+        min_risk_level: Optional[RiskLevel] = None,
+        types: Optional[Collection[LiveEventType]] = None,
+        queue_size: int = settings.LIVE_FEED_QUEUE_SIZE,
+    ):
+        self.entity_ids = frozenset(entity_ids) if entity_ids else None
+        self.min_order = RISK_LEVEL_ORDER[min_risk_level] if min_risk_level else None
+        self.types = frozenset(types) if types else None
+        self.closed_reason: Optional[str] = None
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    def matches(self, event: LiveEvent) -> bool:
+        """Entity and type filters apply to every event; `min_risk_level` only to events that carry a level."""
+        if self.entity_ids is not None and event.entity_id not in self.entity_ids:
+            return False
+        if self.types is not None and event.type not in self.types:
+            return False
+        if self.min_order is not None and event.risk_level is not None:
+            return RISK_LEVEL_ORDER[event.risk_level] >= self.min_order
+        return True
+
+    def offer(self, event: LiveEvent) -> bool:
+        """Queues the event without waiting; returns False if the subscriber is too far behind."""
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def close(self, reason: str) -> None:
+        """Discards pending events and wakes the consumer, which then sees the end of the feed."""
+        if self.closed_reason is not None:
+            return
+        self.closed_reason = reason
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[LiveEvent]:
+        """
+        Waits for the next event. Returns None once the subscription is closed, and raises
+        `asyncio.TimeoutError` if nothing arrives within `timeout`.
+        """
+        if self.closed_reason is not None and self._queue.empty():
+            return None
+        return await asyncio.wait_for(self._queue.get(), timeout)
+
+
+class BroadcastHub:
+    """
+    In-process fan-out of live events to SSE and WebSocket subscribers.
+
+    `publish` never blocks the producer: each matching subscriber gets the event on its own
+    bounded queue, and a subscriber whose queue is full is dropped rather than letting its
+    backlog grow. Only events produced in this process are seen; a worker running as a
+    separate process publishes to its own hub.
+    """
+
+    def __init__(self, max_subscribers: int = settings.LIVE_FEED_MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self._subscribers: Set[Subscription] = set()
+        self.dropped_count = 0
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, subscription: Subscription) -> bool:
+        """Registers a subscription; returns False when the hub is at capacity."""
+        if len(self._subscribers) >= self.max_subscribers:
+            return False
+        self._subscribers.add(subscription)
+        return True
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+        subscription.close("unsubscribed")
+
+    def publish(self, event: LiveEvent) -> None:
+        if not self._subscribers:
+            return
+        for subscription in list(self._subscribers):
+            if subscription.matches(event) and not subscription.offer(event):
+                self._subscribers.discard(subscription)
+                subscription.close("slow consumer")
+                self.dropped_count += 1
+
+
+live_hub = BroadcastHub()
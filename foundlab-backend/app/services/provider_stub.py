@@ -0,0 +1,114 @@
+import argparse
+import asyncio
+import random
+from typing import List, Optional
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+
+from app.models.sherlock import SherlockValidationInput
+from app.services.sherlock_providers import PROVIDER_ADAPTERS
+
+
+class StubProfile(BaseModel):
+    """Latency and failure behaviour of the stub provider."""
+
+    latency_ms: float = Field(50.0, ge=0.0, description="Mean response latency.")
+    latency_jitter_ms: float = Field(0.0, ge=0.0, description="Standard deviation of the latency.")
+    error_rate: float = Field(0.0, ge=0.0, le=1.0, description="Share of requests answered with `error_status`.")
+    error_status: int = Field(503, ge=400, le=599)
+    timeout_rate: float = Field(0.0, ge=0.0, le=1.0, description="Share of requests that hang for `hang_seconds`.")
+    hang_seconds: float = Field(30.0, ge=0.0)
+
+
+class StubBatchRequest(BaseModel):
+    entities: List[SherlockValidationInput]
+
+
+def create_stub_provider_app(
+    profile: Optional[StubProfile] = None, kind: str = "mock_chainalysis", seed: Optional[int] = None
+) -> FastAPI:
+    """
+    A local provider speaking the `HTTPProviderAdapter` protocol (`POST /screen` and
+    `POST /screen/batch`), answering like the `kind` mock adapter after the profile's
+    latency (paid once per request), or with errors and hangs at the profile's rates. `PUT /profile` changes the profile of a running stub, and
+    `GET /stats` reports how many requests it served.
+    """
+    adapter = PROVIDER_ADAPTERS[kind](name="stub")
+    rng = random.Random(seed)
+    stub = FastAPI(title=f"Sherlock stub provider ({kind})")
+    stub.state.profile = profile or StubProfile()
+    stub.state.requests = 0
+    stub.state.in_flight = 0
+    stub.state.max_in_flight = 0
+
+    async def answer(entities: List[SherlockValidationInput]):
+        """Applies the profile once per request, then screens every entity like the mock adapter."""
+        current: StubProfile = stub.state.profile
+        stub.state.requests += 1
+        stub.state.in_flight += 1
+        stub.state.max_in_flight = max(stub.state.max_in_flight, stub.state.in_flight)
+        try:
+            if rng.random() < current.timeout_rate:
+                await asyncio.sleep(current.hang_seconds)
+            await asyncio.sleep(max(0.0, rng.gauss(current.latency_ms, current.latency_jitter_ms)) / 1000)
+            if rng.random() < current.error_rate:
+                return JSONResponse(status_code=current.error_status, content={"detail": "Stub provider error."})
+            return [
+                (await adapter.check(entity.entity_id, entity.entity_type)).model_dump(
+                    mode="json", exclude={"provider_name", "raw_response", "cache_age_seconds"}
+                )
+                for entity in entities
+            ]
+        finally:
+            stub.state.in_flight -= 1
+
+    @stub.post("/screen")
+    async def screen(validation_input: SherlockValidationInput):
+        results = await answer([validation_input])
+        return results if isinstance(results, JSONResponse) else results[0]
+
+    @stub.post("/screen/batch")
+    async def screen_batch(batch: StubBatchRequest):
+        results = await answer(batch.entities)
+        return results if isinstance(results, JSONResponse) else {"results": results}
+
+    @stub.put("/profile", response_model=StubProfile)
+    async def update_profile(new_profile: StubProfile):
+        stub.state.profile = new_profile
+        return new_profile
+
+    @stub.get("/stats")
+    async def stats():
+        return {"requests": stub.state.requests, "max_in_flight": stub.state.max_in_flight}
+
+    return stub
+
+
+def main() -> None:
+    """Runs a stub provider, e.g. `python -m app.services.provider_stub --port 9001 --latency-ms 80 --error-rate 0.05`."""
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local Sherlock stub provider for tests and benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--kind", default="mock_chainalysis", choices=[kind for kind, adapter in PROVIDER_ADAPTERS.items() if kind != "http" and not adapter.local])
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    profile = StubProfile(
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        timeout_rate=args.timeout_rate,
+    )
+    uvicorn.run(create_stub_provider_app(profile, kind=args.kind, seed=args.seed), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
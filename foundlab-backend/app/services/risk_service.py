@@ -1,22 +1,92 @@
+import time
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
 from fastapi import HTTPException, status
 from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING, ReplaceOne
+from pymongo.errors import BulkWriteError
 
+from app.config import settings
 from app.database import get_collection
 from app.models.risk import (
+    CreateRiskTrigger,
+    RiskAssessmentBatchError,
+    RiskAssessmentBatchResult,
+    RiskAssessmentInput,
     RiskAssessmentResult,
     RiskLevel,
     RiskTrigger,
     RiskTriggerDetail,
+    TriggerSimulationLevelBucket,
+    TriggerSimulationPeriodBucket,
+    TriggerSimulationResult,
 )
+from app.models.score import RollupGranularity, ScoreResult
+from app.models.live import LiveEvent, LiveEventType
+from app.services.alert_dispatcher import alert_dispatcher
+from app.services.live_feed import live_hub
+from app.utils.assessment_cache import AssessmentKey, assessment_cache, context_hash
+from app.utils.catalog_versions import CatalogVersions, catalog_versions
+from app.utils.risk_expression import compile_custom_logic
+from app.utils.trigger_index import RISK_LEVEL_ORDER, TriggerIndex, TriggerIndexCache, trigger_index_cache
+from app.utils.window_counters import window_counter_store
+
+
+DUPLICATE_KEY_ERROR = 11000
+
+# `$dateToString` formats of the simulation time buckets.
+PERIOD_FORMATS = {RollupGranularity.DAILY: "%Y-%m-%d", RollupGranularity.WEEKLY: "%G-W%V"}
+LEVELS_BY_ORDER = {order: level for level, order in RISK_LEVEL_ORDER.items()}
+
+
+def _period_key(created_at: Optional[datetime], granularity: RollupGranularity) -> str:
+    if created_at is None:
+        return "unknown"
+    if granularity == RollupGranularity.WEEKLY:
+        year, week, _ = created_at.isocalendar()
+        return f"{year}-W{week:02d}"
+    return created_at.strftime("%Y-%m-%d")
+
+
+class _SimulationTally:
+    """Accumulates simulation histograms in Python, for conditions that cannot be pushed down."""
+
+    def __init__(self, trigger_rank: int, granularity: RollupGranularity):
+        self.trigger_rank = trigger_rank
+        self.granularity = granularity
+        self.scores_by_rank: Dict[int, int] = {}
+        self.entities_by_rank: Dict[int, Set[str]] = {}
+        self.periods: Dict[str, List[int]] = {}
+        self.entities: Set[str] = set()
+        self.escalated_entities: Set[str] = set()
+
+    def add(self, entity_id: str, created_at: Optional[datetime], previous_rank: int) -> None:
+        escalated = previous_rank < self.trigger_rank
+        self.scores_by_rank[previous_rank] = self.scores_by_rank.get(previous_rank, 0) + 1
+        self.entities_by_rank.setdefault(previous_rank, set()).add(entity_id)
+        period = self.periods.setdefault(_period_key(created_at, self.granularity), [0, 0])
+        period[0] += 1
+        period[1] += int(escalated)
+        self.entities.add(entity_id)
+        if escalated:
+            self.escalated_entities.add(entity_id)
 
 
 class SentinelaService:
-    def __init__(self):
+    def __init__(
+        self,
+        trigger_cache: Optional[TriggerIndexCache] = None,
+        versions: Optional[CatalogVersions] = None,
+    ):
+        self.trigger_cache = trigger_cache if trigger_cache is not None else trigger_index_cache
+        self.catalog_versions = versions if versions is not None else catalog_versions
         self.risk_triggers_collection: Optional[AsyncIOMotorCollection] = None
         self.risk_assessments_collection: Optional[AsyncIOMotorCollection] = None
+        self.window_counters_collection: Optional[AsyncIOMotorCollection] = None
+        self.score_service = None
+        self._window_indexes_ready = False
+        self._assessment_indexes_ready = False
 
     def _get_triggers_collection(self) -> AsyncIOMotorCollection:
         if self.risk_triggers_collection is None:
@@ -28,6 +98,21 @@ class SentinelaService:
             self.risk_assessments_collection = get_collection("risk_assessments")
         return self.risk_assessments_collection
 
+    def _get_window_counters_collection(self) -> AsyncIOMotorCollection:
+        if self.window_counters_collection is None:
+            self.window_counters_collection = get_collection("risk_window_counters")
+        return self.window_counters_collection
+
+    def _get_scores_collection(self) -> AsyncIOMotorCollection:
+        return get_collection("scores")
+
+    def _get_score_service(self):
+        if self.score_service is None:
+            from app.services.score_service import ScoreLabService
+
+            self.score_service = ScoreLabService()
+        return self.score_service
+
     async def create_risk_trigger(self, trigger_data: Dict[str, Any]) -> Optional[RiskTrigger]:
         collection = self._get_triggers_collection()
         if await collection.find_one({"name": trigger_data["name"]}):
@@ -38,6 +123,7 @@ class SentinelaService:
         trigger_data["updated_at"] = now
 
         insert_result = await collection.insert_one(trigger_data)
+        await self.catalog_versions.bump(TriggerIndexCache.CATALOG)
         new_trigger = await collection.find_one({"_id": insert_result.inserted_id})
         return RiskTrigger(**new_trigger)
 
@@ -58,6 +144,8 @@ class SentinelaService:
         update_data["updated_at"] = datetime.utcnow()
         collection = self._get_triggers_collection()
         update_result = await collection.update_one({"name": name}, {"$set": update_data})
+        if update_result.modified_count:
+            await self.catalog_versions.bump(TriggerIndexCache.CATALOG)
         if update_result.modified_count == 0:
             if await collection.find_one({"name": name}):
                 return RiskTrigger(**(await collection.find_one({"name": name})))
@@ -68,8 +156,62 @@ class SentinelaService:
     async def delete_risk_trigger(self, name: str) -> int:
         collection = self._get_triggers_collection()
         delete_result = await collection.delete_one({"name": name})
+        if delete_result.deleted_count:
+            await self.catalog_versions.bump(TriggerIndexCache.CATALOG)
         return delete_result.deleted_count
 
+    async def get_trigger_index(self) -> TriggerIndex:
+        """
+        Returns the in-memory index of active triggers, rebuilding it from Mongo only
+        when the stored trigger catalog version changed since it was last built.
+        """
+        catalog_version = await self.catalog_versions.current(TriggerIndexCache.CATALOG)
+        if self.trigger_cache.is_stale(catalog_version):
+            return self.trigger_cache.load(await self.get_all_risk_triggers(), catalog_version)
+        return self.trigger_cache.index
+
+    async def _load_window_counters(self, trigger_index: TriggerIndex, entity_ids: Iterable[str]) -> None:
+        """Loads the snapshot of every entity whose window counters are not in memory, with one `$in` query."""
+        if not trigger_index.has_window_triggers:
+            return
+        missing = window_counter_store.missing(entity_ids)
+        if not missing:
+            return
+        snapshots = {}
+        async for document in self._get_window_counters_collection().find({"_id": {"$in": missing}}):
+            snapshots[document["_id"]] = document
+        for entity_id in missing:
+            window_counter_store.restore(entity_id, snapshots.get(entity_id))
+
+    async def snapshot_window_counters(self, force: bool = False) -> int:
+        """
+        Writes the window counters changed since the last snapshot to `risk_window_counters`,
+        at most once per `SENTINELA_WINDOW_SNAPSHOT_INTERVAL_SECONDS` unless `force` is set.
+        Snapshots expire through a TTL index once every counted event has left its window.
+        """
+        if not window_counter_store.dirty_count:
+            return 0
+        now = time.monotonic()
+        if not force and now - window_counter_store.last_snapshot_at < settings.SENTINELA_WINDOW_SNAPSHOT_INTERVAL_SECONDS:
+            return 0
+        window_counter_store.last_snapshot_at = now
+
+        documents = window_counter_store.take_snapshot()
+        if not documents:
+            return 0
+        collection = self._get_window_counters_collection()
+        try:
+            if not self._window_indexes_ready:
+                await collection.create_index("expires_at", expireAfterSeconds=0)
+                self._window_indexes_ready = True
+            await collection.bulk_write(
+                [ReplaceOne({"_id": document["_id"]}, document, upsert=True) for document in documents], ordered=False
+            )
+        except Exception:
+            window_counter_store.requeue(documents)
+            raise
+        return len(documents)
+
     async def get_latest_risk_assessment_for_entity(self, entity_id: str) -> Optional[RiskAssessmentResult]:
         assessment_collection = self._get_assessments_collection()
         latest_assessment = await assessment_collection.find_one(
@@ -77,13 +219,163 @@ class SentinelaService:
         )
         return RiskAssessmentResult(**latest_assessment) if latest_assessment else None
 
+    def _build_assessment(
+        self,
+        score_result: ScoreResult,
+        trigger_index: TriggerIndex,
+        additional_context: Optional[Dict[str, Any]] = None,
+    ) -> RiskAssessmentResult:
+        """Evaluates a score against the trigger index; in-memory only, nothing is stored."""
+        entity_id = score_result.entity_id
+        triggered_rules: List[RiskTriggerDetail] = trigger_index.evaluate(
+            score_result, additional_context, window_counter_store
+        )
+
+        current_highest_level = RiskLevel.LOW
+        for triggered_rule in triggered_rules:
+            if RISK_LEVEL_ORDER[triggered_rule.risk_level] > RISK_LEVEL_ORDER[current_highest_level]:
+                current_highest_level = triggered_rule.risk_level
+
+        summary_message = f"Risk assessment for {entity_id}: Overall {current_highest_level.value}."
+        if triggered_rules:
+            summary_message += f" ({len(triggered_rules)} rules triggered)."
+
+        return RiskAssessmentResult(
+            entity_id=entity_id,
+            score_id=str(score_result.id),
+            overall_risk_level=current_highest_level,
+            triggered_rules=triggered_rules,
+            summary_message=summary_message,
+            trigger_set_version=trigger_index.version,
+            context_hash=context_hash(additional_context),
+        )
+
+    async def _ensure_assessment_indexes(self) -> None:
+        if self._assessment_indexes_ready:
+            return
+        await self._get_assessments_collection().create_index(
+            [("score_id", ASCENDING), ("trigger_set_version", ASCENDING), ("context_hash", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"trigger_set_version": {"$exists": True}},
+        )
+        # The partial index cannot serve queries without a `trigger_set_version` predicate,
+        # such as the `score_id $in` lookups for already-assessed scores.
+        await self._get_assessments_collection().create_index("score_id")
+        self._assessment_indexes_ready = True
+
+    async def _assess(
+        self, items: List[Tuple[ScoreResult, Optional[Dict[str, Any]]]]
+    ) -> List[RiskAssessmentResult]:
+        """
+        Assesses `(score, additional_context)` pairs against one trigger index snapshot.
+        A pair already assessed under the current trigger set version is answered from the
+        memo (or from the stored document) instead of being evaluated and written again, so it
+        is not counted by window triggers a second time.
+        """
+        trigger_index = await self.get_trigger_index()
+        keys = [(str(score_result.id), trigger_index.version, context_hash(context)) for score_result, context in items]
+
+        results: Dict[AssessmentKey, RiskAssessmentResult] = {}
+        pending: Dict[AssessmentKey, Tuple[ScoreResult, Optional[Dict[str, Any]]]] = {}
+        for key, item in zip(keys, items):
+            if key in results or key in pending:
+                continue
+            cached = assessment_cache.get(key)
+            if cached is not None:
+                results[key] = cached
+            else:
+                pending[key] = item
+
+        if pending:
+            await self._load_window_counters(trigger_index, [score_result.entity_id for score_result, _ in pending.values()])
+            assessments = {
+                key: self._build_assessment(score_result, trigger_index, context)
+                for key, (score_result, context) in pending.items()
+            }
+            inserted = await self._store_assessments(assessments)
+            await self.snapshot_window_counters()
+            for key, assessment in assessments.items():
+                assessment_cache.put(key, assessment)
+                if key in inserted:
+                    alert_dispatcher.enqueue_assessment(assessment)
+                    live_hub.publish(
+                        LiveEvent(
+                            type=LiveEventType.RISK_ASSESSMENT,
+                            entity_id=assessment.entity_id,
+                            risk_level=assessment.overall_risk_level,
+                            data=assessment.model_dump(mode="json", by_alias=True),
+                        )
+                    )
+            results.update(assessments)
+
+        return [results[key] for key in keys]
+
+    async def _store_assessments(self, assessments: Dict[AssessmentKey, RiskAssessmentResult]) -> Set[AssessmentKey]:
+        """
+        Writes new assessments with one unordered `insert_many` and returns the keys inserted.
+        Keys another process stored first violate the unique index; those entries are replaced
+        by the stored assessments.
+        """
+        await self._ensure_assessment_indexes()
+        collection = self._get_assessments_collection()
+        keys = list(assessments)
+        documents = [assessments[key].model_dump(by_alias=True, exclude={"id"}) for key in keys]
+
+        duplicate_indexes: Set[int] = set()
+        try:
+            await collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            write_errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != DUPLICATE_KEY_ERROR for error in write_errors):
+                raise
+            duplicate_indexes = {error["index"] for error in write_errors}
+
+        inserted: Set[AssessmentKey] = set()
+        for index, (key, document) in enumerate(zip(keys, documents)):
+            if index not in duplicate_indexes:
+                assessments[key].id = str(document["_id"])
+                inserted.add(key)
+
+        if duplicate_indexes:
+            duplicate_keys = [keys[index] for index in duplicate_indexes]
+            query = {
+                "$or": [
+                    {"score_id": score_id, "trigger_set_version": version, "context_hash": context}
+                    for score_id, version, context in duplicate_keys
+                ]
+            }
+            async for stored in collection.find(query):
+                key = (stored["score_id"], stored["trigger_set_version"], stored["context_hash"])
+                assessments[key] = RiskAssessmentResult(**stored)
+        return inserted
+
+    async def assess_score_result(
+        self, score_result: ScoreResult, additional_context: Optional[Dict[str, Any]] = None
+    ) -> RiskAssessmentResult:
+        """
+        Assesses an already-loaded `ScoreResult` (e.g., one just calculated in-process)
+        and stores the assessment, without re-reading the score or the stored document.
+        """
+        return (await self._assess([(score_result, additional_context)]))[0]
+
+    async def assess_score_results(
+        self, score_results: List[ScoreResult], additional_context: Optional[Dict[str, Any]] = None
+    ) -> List[RiskAssessmentResult]:
+        """Assesses many already-loaded scores against one trigger index snapshot and stores them with one `insert_many`."""
+        return await self._assess([(score_result, additional_context) for score_result in score_results])
+
+    async def get_assessed_score_ids(self, score_ids: List[str]) -> Set[str]:
+        """Returns which of `score_ids` already have at least one stored assessment."""
+        if not score_ids:
+            return set()
+        await self._ensure_assessment_indexes()
+        assessed = await self._get_assessments_collection().distinct("score_id", {"score_id": {"$in": score_ids}})
+        return set(assessed)
+
     async def assess_entity_risk(
         self, entity_id: str, score_id: str, additional_context: Optional[Dict[str, Any]] = None
     ) -> RiskAssessmentResult:
-        from app.services.score_service import ScoreLabService
-
-        score_service = ScoreLabService()
-        score_result = await score_service.get_score_by_id(score_id)
+        score_result = await self._get_score_service().get_score_by_id(score_id)
         if not score_result:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Score with ID {score_id} not found.")
 
@@ -93,77 +385,221 @@ class SentinelaService:
                 detail=f"Score ID {score_id} does not belong to entity {entity_id}.",
             )
 
-        active_triggers = await self.get_all_risk_triggers()
-        triggered_rules: List[RiskTriggerDetail] = []
+        return await self.assess_score_result(score_result, additional_context)
 
-        risk_level_order = {
-            RiskLevel.LOW: 0,
-            RiskLevel.MEDIUM: 1,
-            RiskLevel.HIGH: 2,
-            RiskLevel.CRITICAL: 3,
-        }
-        current_highest_level = RiskLevel.LOW
+    async def assess_batch(self, assessment_inputs: List[RiskAssessmentInput]) -> RiskAssessmentBatchResult:
+        """
+        Assesses many scores at once: one `$in` query loads every referenced score, all of them
+        are evaluated against the cached trigger index, and the assessments are written with
+        one `insert_many`. Inputs that would fail individually are reported in `errors`.
+        """
+        scores = await self._get_score_service().get_scores_by_ids([item.score_id for item in assessment_inputs])
+        valid_items: List[Tuple[ScoreResult, Optional[Dict[str, Any]]]] = []
+        errors: List[RiskAssessmentBatchError] = []
 
-        for trigger in active_triggers:
-            is_triggered = False
-            reason = ""
-
-            match trigger.trigger_type:
-                case "score_threshold":
-                    if trigger.score_threshold is not None and score_result.probability_score < trigger.score_threshold:
-                        is_triggered = True
-                        reason = (
-                            f"Score ({score_result.probability_score:.4f}) is below "
-                            f"threshold ({trigger.score_threshold:.4f})."
-                        )
-                case "flag_presence":
-                    if trigger.flag_name:
-                        matched_flag = next(
-                            (f for f in score_result.flags_used if f.name == trigger.flag_name and f.is_active), None
-                        )
-                        if matched_flag:
-                            is_triggered = True
-                            reason = f"Flag '{trigger.flag_name}' is active with value '{matched_flag.value}'."
-                case "custom_logic":
-                    if trigger.custom_logic_params:
-                        max_score_param = trigger.custom_logic_params.get("max_score", 1.0)
-                        min_recent_volume_param = trigger.custom_logic_params.get("min_recent_volume", 0.0)
-                        current_recent_volume = (
-                            additional_context.get("recent_transaction_volume_usd", 0.0) if additional_context else 0.0
-                        )
+        for item in assessment_inputs:
+            score_result = scores.get(item.score_id)
+            if not score_result:
+                errors.append(
+                    RiskAssessmentBatchError(
+                        entity_id=item.entity_id,
+                        score_id=item.score_id,
+                        status_code=status.HTTP_404_NOT_FOUND,
+                        detail=f"Score with ID {item.score_id} not found.",
+                    )
+                )
+            elif score_result.entity_id != item.entity_id:
+                errors.append(
+                    RiskAssessmentBatchError(
+                        entity_id=item.entity_id,
+                        score_id=item.score_id,
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"Score ID {item.score_id} does not belong to entity {item.entity_id}.",
+                    )
+                )
+            else:
+                valid_items.append((score_result, item.additional_context))
+
+        assessments = await self._assess(valid_items) if valid_items else []
+        return RiskAssessmentBatchResult(assessments=assessments, errors=errors)
+
+    async def simulate_trigger(
+        self,
+        draft: CreateRiskTrigger,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        granularity: RollupGranularity = RollupGranularity.DAILY,
+    ) -> TriggerSimulationResult:
+        """
+        Backtests a draft trigger over the stored scores, without storing anything.
 
-                        if (
-                            score_result.probability_score <= max_score_param
-                            and current_recent_volume >= min_recent_volume_param
-                        ):
-                            is_triggered = True
-                            reason = (
-                                f"Custom logic: Score ({score_result.probability_score:.4f}) <= {max_score_param} "
-                                f"and recent volume ({current_recent_volume}) >= {min_recent_volume_param}."
-                            )
-
-            if is_triggered:
-                triggered_rules.append(
-                    RiskTriggerDetail(
-                        trigger_name=trigger.name, risk_level=trigger.risk_level, reason=reason
+        `score_threshold` and `flag_presence` conditions become a `$match` stage, and the
+        stored assessment levels are joined with `$lookup`, so counting and bucketing run
+        inside MongoDB. `custom_logic` expressions are evaluated in Python over batches of
+        scores (historical scores have no `additional_context`, so `ctx()` sees defaults).
+        """
+        query: Dict[str, Any] = {}
+        if since or until:
+            query["created_at"] = {key: value for key, value in (("$gte", since), ("$lt", until)) if value}
+
+        match draft.trigger_type:
+            case "score_threshold":
+                if draft.score_threshold is None:
+                    raise HTTPException(
+                        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                        detail="'score_threshold' triggers require 'score_threshold'.",
+                    )
+                query["probability_score"] = {"$lt": draft.score_threshold}
+            case "flag_presence":
+                if not draft.flag_name:
+                    raise HTTPException(
+                        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                        detail="'flag_presence' triggers require 'flag_name'.",
                     )
+                query["flags_used"] = {"$elemMatch": {"name": draft.flag_name, "is_active": True}}
+            case "custom_logic":
+                if not draft.custom_logic_params:
+                    raise HTTPException(
+                        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                        detail="'custom_logic' triggers require 'custom_logic_params'.",
+                    )
+                return await self._simulate_in_python(draft, query, granularity)
+            case _:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail=f"'{draft.trigger_type}' triggers depend on event order and cannot be simulated.",
                 )
-                if risk_level_order[trigger.risk_level] > risk_level_order[current_highest_level]:
-                    current_highest_level = trigger.risk_level
 
-        summary_message = f"Risk assessment for {entity_id}: Overall {current_highest_level.value}."
-        if triggered_rules:
-            summary_message += f" ({len(triggered_rules)} rules triggered)."
+        return await self._simulate_in_database(draft, query, granularity)
 
-        assessment_data = RiskAssessmentResult(
-            entity_id=entity_id,
-            score_id=score_id,
-            overall_risk_level=current_highest_level,
-            triggered_rules=triggered_rules,
-            summary_message=summary_message,
-        ).model_dump(by_alias=True)
+    async def _simulate_in_database(
+        self, draft: CreateRiskTrigger, query: Dict[str, Any], granularity: RollupGranularity
+    ) -> TriggerSimulationResult:
+        await self._ensure_assessment_indexes()
+        trigger_rank = RISK_LEVEL_ORDER[draft.risk_level]
+        # Highest stored level of each score, as its rank; never-assessed scores count as LOW.
+        previous_rank = {
+            "$switch": {
+                "branches": [
+                    {"case": {"$in": [level.value, "$assessments.overall_risk_level"]}, "then": order}
+                    for level, order in sorted(RISK_LEVEL_ORDER.items(), key=lambda item: -item[1])
+                ],
+                "default": 0,
+            }
+        }
+        pipeline = [
+            {"$match": query},
+            {"$project": {"entity_id": 1, "created_at": 1, "score_id": {"$toString": "$_id"}}},
+            {
+                "$lookup": {
+                    "from": "risk_assessments",
+                    "localField": "score_id",
+                    "foreignField": "score_id",
+                    "as": "assessments",
+                }
+            },
+            {
+                "$project": {
+                    "entity_id": 1,
+                    "previous_rank": previous_rank,
+                    "period": {"$dateToString": {"format": PERIOD_FORMATS[granularity], "date": "$created_at"}},
+                }
+            },
+            {"$addFields": {"escalated": {"$cond": [{"$lt": ["$previous_rank", trigger_rank]}, 1, 0]}}},
+            {
+                "$facet": {
+                    "by_level": [
+                        {"$group": {"_id": {"rank": "$previous_rank", "entity_id": "$entity_id"}, "scores": {"$sum": 1}}},
+                        {"$group": {"_id": "$_id.rank", "scores": {"$sum": "$scores"}, "entities": {"$sum": 1}}},
+                    ],
+                    "by_period": [
+                        {"$group": {"_id": "$period", "scores": {"$sum": 1}, "escalated_scores": {"$sum": "$escalated"}}},
+                    ],
+                    "by_entity": [
+                        {"$group": {"_id": "$entity_id", "escalated": {"$max": "$escalated"}}},
+                        {"$group": {"_id": None, "entities": {"$sum": 1}, "escalated": {"$sum": "$escalated"}}},
+                    ],
+                }
+            },
+        ]
+        facets = (await self._get_scores_collection().aggregate(pipeline).to_list(length=1))[0]
+        totals = facets["by_entity"][0] if facets["by_entity"] else {"entities": 0, "escalated": 0}
 
-        assessment_collection = self._get_assessments_collection()
-        insert_result = await assessment_collection.insert_one(assessment_data)
-        new_assessment = await assessment_collection.find_one({"_id": insert_result.inserted_id})
-        return RiskAssessmentResult(**new_assessment)
+        return TriggerSimulationResult(
+            trigger_name=draft.name,
+            risk_level=draft.risk_level,
+            granularity=granularity,
+            evaluated_in="database",
+            scores_matched=sum(bucket["scores"] for bucket in facets["by_level"]),
+            entities_matched=totals["entities"],
+            entities_escalated=totals["escalated"],
+            by_previous_level=[
+                TriggerSimulationLevelBucket(
+                    previous_level=LEVELS_BY_ORDER[bucket["_id"]], scores=bucket["scores"], entities=bucket["entities"]
+                )
+                for bucket in sorted(facets["by_level"], key=lambda bucket: bucket["_id"])
+            ],
+            by_period=[
+                TriggerSimulationPeriodBucket(
+                    period=bucket["_id"] or "unknown",
+                    scores=bucket["scores"],
+                    escalated_scores=bucket["escalated_scores"],
+                )
+                for bucket in sorted(facets["by_period"], key=lambda bucket: bucket["_id"] or "")
+            ],
+        )
+
+    async def _simulate_in_python(
+        self, draft: CreateRiskTrigger, query: Dict[str, Any], granularity: RollupGranularity
+    ) -> TriggerSimulationResult:
+        expression = compile_custom_logic(draft.custom_logic_params)
+        tally = _SimulationTally(RISK_LEVEL_ORDER[draft.risk_level], granularity)
+        projection = {"entity_id": 1, "created_at": 1, "probability_score": 1, "flags_used": 1}
+        cursor = self._get_scores_collection().find(query, projection).batch_size(settings.SENTINELA_SIMULATION_BATCH_SIZE)
+
+        batch: List[Dict[str, Any]] = []
+        async for score_doc in cursor:
+            flags: Dict[str, Any] = {}
+            for flag in score_doc.get("flags_used", []):
+                if flag.get("is_active", True):
+                    flags.setdefault(flag["name"], flag.get("value"))
+            if expression.evaluate(score_doc["probability_score"], flags, {}):
+                batch.append(score_doc)
+            if len(batch) >= settings.SENTINELA_SIMULATION_BATCH_SIZE:
+                await self._tally_simulation_batch(tally, batch)
+                batch = []
+        await self._tally_simulation_batch(tally, batch)
+
+        return TriggerSimulationResult(
+            trigger_name=draft.name,
+            risk_level=draft.risk_level,
+            granularity=granularity,
+            evaluated_in="python",
+            scores_matched=sum(tally.scores_by_rank.values()),
+            entities_matched=len(tally.entities),
+            entities_escalated=len(tally.escalated_entities),
+            by_previous_level=[
+                TriggerSimulationLevelBucket(
+                    previous_level=LEVELS_BY_ORDER[rank], scores=scores, entities=len(tally.entities_by_rank[rank])
+                )
+                for rank, scores in sorted(tally.scores_by_rank.items())
+            ],
+            by_period=[
+                TriggerSimulationPeriodBucket(period=period, scores=counts[0], escalated_scores=counts[1])
+                for period, counts in sorted(tally.periods.items())
+            ],
+        )
+
+    async def _tally_simulation_batch(self, tally: _SimulationTally, score_docs: List[Dict[str, Any]]) -> None:
+        """Joins a batch of matched scores with their stored assessment levels (one `$in` query) and tallies them."""
+        if not score_docs:
+            return
+        previous_ranks: Dict[str, int] = {}
+        cursor = self._get_assessments_collection().find(
+            {"score_id": {"$in": [str(doc["_id"]) for doc in score_docs]}}, {"score_id": 1, "overall_risk_level": 1}
+        )
+        async for assessment in cursor:
+            rank = RISK_LEVEL_ORDER[RiskLevel(assessment["overall_risk_level"])]
+            previous_ranks[assessment["score_id"]] = max(rank, previous_ranks.get(assessment["score_id"], 0))
+        for doc in score_docs:
+            tally.add(doc["entity_id"], doc.get("created_at"), previous_ranks.get(str(doc["_id"]), 0))
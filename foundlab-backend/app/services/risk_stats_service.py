@@ -0,0 +1,292 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.config import settings
+from app.database import get_collection
+from app.models.risk import (
+    CryptoPixActionStat,
+    RiskLevelPeriodCounts,
+    RiskStatsRefreshResult,
+    RiskStatsResult,
+    StatsGranularity,
+    TriggerFireCount,
+)
+
+# `$dateToString` / `strftime` formats of the rollup periods (UTC).
+PERIOD_FORMATS = {StatsGranularity.HOUR: "%Y-%m-%dT%H:00", StatsGranularity.DAY: "%Y-%m-%d"}
+DEFAULT_RANGES = {StatsGranularity.HOUR: timedelta(hours=48), StatsGranularity.DAY: timedelta(days=30)}
+
+# metric -> (source collection, timestamp field, grouped key, array unwound before grouping)
+ROLLUPS = {
+    "assessment_levels": ("risk_assessments", "$created_at", "$overall_risk_level", None),
+    "trigger_fires": ("risk_assessments", "$created_at", "$triggered_rules.trigger_name", "$triggered_rules"),
+    "cryptopix_actions": ("cryptopix_analysis", "$analysis_timestamp", "$suggested_action", None),
+}
+# source collection -> timestamp field its refreshes advance on
+SOURCE_TIMESTAMPS = {source: timestamp_field[1:] for source, timestamp_field, _, _ in ROLLUPS.values()}
+
+# (timestamp, _id) of a source document; refreshes roll up the documents between two marks.
+Mark = Tuple[datetime, Any]
+
+
+def _mark_range(timestamp_field: str, lower: Optional[Mark], upper: Mark) -> Dict[str, Any]:
+    """Filter of the documents after `lower` (from the start if None) up to and including `upper`."""
+    conditions = [
+        {"$or": [{timestamp_field: {"$lt": upper[0]}}, {timestamp_field: upper[0], "_id": {"$lte": upper[1]}}]}
+    ]
+    if lower is not None:
+        conditions.append(
+            {"$or": [{timestamp_field: {"$gt": lower[0]}}, {timestamp_field: lower[0], "_id": {"$gt": lower[1]}}]}
+        )
+    return {"$and": conditions}
+
+
+def _rollup_pipeline(
+    metric: str,
+    timestamp_field: str,
+    key: str,
+    unwind: Optional[str],
+    granularity: StatsGranularity,
+    match: Dict[str, Any],
+) -> List[Dict[str, Any]]:
+    """
+    Counts new source documents per (period, key) and folds the counts into `risk_stats`
+    with `$merge`, adding to the existing bucket documents.
+    """
+    pipeline: List[Dict[str, Any]] = [{"$match": match}]
+    if unwind:
+        pipeline.append({"$unwind": unwind})
+    pipeline += [
+        {
+            "$group": {
+                "_id": {
+                    "period": {"$dateToString": {"format": PERIOD_FORMATS[granularity], "date": timestamp_field}},
+                    "key": key,
+                },
+                "count": {"$sum": 1},
+            }
+        },
+        {
+            "$project": {
+                "_id": {"$concat": [f"{metric}|{granularity.value}|", "$_id.period", "|", "$_id.key"]},
+                "metric": {"$literal": metric},
+                "granularity": {"$literal": granularity.value},
+                "period": "$_id.period",
+                "key": "$_id.key",
+                "count": 1,
+            }
+        },
+        {
+            "$merge": {
+                "into": "risk_stats",
+                "on": "_id",
+                "whenMatched": [{"$set": {"count": {"$add": ["$count", "$$new.count"]}}}],
+                "whenNotMatched": "insert",
+            }
+        },
+    ]
+    return pipeline
+
+
+class RiskStatsService:
+    """
+    Precomputed Sentinela KPIs: assessments per risk level, fired triggers and CryptoPix
+    actions, counted per hour and per day in `risk_stats`.
+
+    A refresh only aggregates the source documents inserted since the previous one and
+    `$merge`s the counts into the existing buckets, so reading stats never scans
+    `risk_assessments` or `cryptopix_analysis`. Each source has a `(timestamp, _id)` mark in
+    `risk_stats_state`; documents newer than `rollup_lag_seconds` are left for the next
+    refresh, because neither field is assigned in commit order. A refresh leases the
+    source, records the range it claims, and moves the mark only once every rollup of the
+    range is merged. A refresh that fails midway leaves the range pending, and the next one
+    runs only the rollups that were not merged yet.
+    """
+
+    def __init__(
+        self,
+        rollup_lag_seconds: float = settings.RISK_STATS_ROLLUP_LAG_SECONDS,
+        lease_seconds: float = settings.RISK_STATS_REFRESH_LEASE_SECONDS,
+    ):
+        self.rollup_lag_seconds = rollup_lag_seconds
+        self.lease_seconds = lease_seconds
+        self.stats_collection: Optional[AsyncIOMotorCollection] = None
+        self.state_collection: Optional[AsyncIOMotorCollection] = None
+        self._indexes_ready = False
+
+    def _get_stats_collection(self) -> AsyncIOMotorCollection:
+        if self.stats_collection is None:
+            self.stats_collection = get_collection("risk_stats")
+        return self.stats_collection
+
+    def _get_state_collection(self) -> AsyncIOMotorCollection:
+        if self.state_collection is None:
+            self.state_collection = get_collection("risk_stats_state")
+        return self.state_collection
+
+    async def _ensure_indexes(self) -> None:
+        if self._indexes_ready:
+            return
+        await self._get_stats_collection().create_index(
+            [("metric", ASCENDING), ("granularity", ASCENDING), ("period", ASCENDING)]
+        )
+        for source, timestamp_field in SOURCE_TIMESTAMPS.items():
+            await get_collection(source).create_index([(timestamp_field, ASCENDING), ("_id", ASCENDING)])
+        self._indexes_ready = True
+
+    async def _acquire_lease(self, source: str) -> Optional[Dict[str, Any]]:
+        """Leases the source's rollup state to this refresh; None while another refresh holds it."""
+        now = datetime.utcnow()
+        try:
+            return await self._get_state_collection().find_one_and_update(
+                {"_id": source, "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]},
+                {"$set": {"lease_until": now + timedelta(seconds=self.lease_seconds)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            return None
+
+    async def _claim_range(
+        self, source: str, state: Dict[str, Any]
+    ) -> Optional[Tuple[Optional[Mark], Mark, List[str]]]:
+        """
+        Returns the `(lower, upper)` marks of the documents to roll up and the rollups already
+        merged for them: the pending range of a refresh that failed midway, or else every
+        document after the mark and older than `rollup_lag_seconds`. None if there is nothing new.
+        """
+        timestamp_field = SOURCE_TIMESTAMPS[source]
+        lower: Optional[Mark] = None
+        if state.get("last_timestamp") is not None:
+            lower = (state["last_timestamp"], state["last_id"])
+        elif state.get("last_id") is not None:
+            # Marks written before `last_timestamp` existed only hold the `_id`.
+            last_doc = await get_collection(source).find_one({"_id": state["last_id"]}, {timestamp_field: 1})
+            if last_doc is not None:
+                lower = (last_doc[timestamp_field], last_doc["_id"])
+
+        pending = state.get("pending")
+        if pending:
+            return lower, (pending["timestamp"], pending["_id"]), pending["done"]
+
+        cutoff = datetime.utcnow() - timedelta(seconds=self.rollup_lag_seconds)
+        newest = await get_collection(source).find_one(
+            {timestamp_field: {"$lte": cutoff}},
+            {timestamp_field: 1},
+            sort=[(timestamp_field, DESCENDING), ("_id", DESCENDING)],
+        )
+        if newest is None:
+            return None
+        upper = (newest[timestamp_field], newest["_id"])
+        if lower is not None and upper <= lower:
+            return None
+        await self._get_state_collection().update_one(
+            {"_id": source}, {"$set": {"pending": {"timestamp": upper[0], "_id": upper[1], "done": []}}}
+        )
+        return lower, upper, []
+
+    async def _refresh_source(self, source: str) -> int:
+        """Rolls up the source's claimed range; returns how many source documents it held."""
+        state_collection = self._get_state_collection()
+        state = await self._acquire_lease(source)
+        if state is None:
+            return 0
+        try:
+            claim = await self._claim_range(source, state)
+            if claim is None:
+                return 0
+            lower, upper, done = claim
+            match = _mark_range(SOURCE_TIMESTAMPS[source], lower, upper)
+            for metric, (metric_source, timestamp_field, key, unwind) in ROLLUPS.items():
+                if metric_source != source:
+                    continue
+                for granularity in StatsGranularity:
+                    rollup = f"{metric}|{granularity.value}"
+                    if rollup in done:
+                        continue
+                    pipeline = _rollup_pipeline(metric, timestamp_field, key, unwind, granularity, match)
+                    await get_collection(source).aggregate(pipeline).to_list(length=None)
+                    await state_collection.update_one({"_id": source}, {"$push": {"pending.done": rollup}})
+            await state_collection.update_one(
+                {"_id": source},
+                {
+                    "$set": {"last_timestamp": upper[0], "last_id": upper[1], "updated_at": datetime.utcnow()},
+                    "$unset": {"pending": ""},
+                },
+            )
+            return await get_collection(source).count_documents(match)
+        finally:
+            await state_collection.update_one({"_id": source}, {"$set": {"lease_until": None}})
+
+    async def refresh(self) -> RiskStatsRefreshResult:
+        """Folds the source documents inserted since the last refresh into the rollups."""
+        await self._ensure_indexes()
+        rolled_up: Dict[str, int] = {}
+        for source in SOURCE_TIMESTAMPS:
+            rolled_up[source] = await self._refresh_source(source)
+
+        refreshed_at = datetime.utcnow()
+        await self._get_state_collection().update_one(
+            {"_id": "refresh"}, {"$set": {"refreshed_at": refreshed_at}}, upsert=True
+        )
+        return RiskStatsRefreshResult(refreshed_at=refreshed_at, rolled_up=rolled_up)
+
+    async def get_stats(
+        self,
+        granularity: StatsGranularity = StatsGranularity.HOUR,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        top_triggers: int = 10,
+    ) -> RiskStatsResult:
+        """
+        Reads the KPIs of the buckets from `since` through `until` from the rollups only.
+        Rollups older than `RISK_STATS_REFRESH_INTERVAL_SECONDS` are refreshed first.
+        """
+        state = await self._get_state_collection().find_one({"_id": "refresh"})
+        refreshed_at = state["refreshed_at"] if state else None
+        if refreshed_at is None or datetime.utcnow() - refreshed_at > timedelta(
+            seconds=settings.RISK_STATS_REFRESH_INTERVAL_SECONDS
+        ):
+            refreshed_at = (await self.refresh()).refreshed_at
+
+        until = until or datetime.utcnow()
+        since = since or until - DEFAULT_RANGES[granularity]
+        period_format = PERIOD_FORMATS[granularity]
+        query = {
+            "granularity": granularity.value,
+            "period": {"$gte": since.strftime(period_format), "$lte": until.strftime(period_format)},
+        }
+
+        levels: Dict[str, RiskLevelPeriodCounts] = {}
+        triggers: Dict[str, int] = {}
+        actions: Dict[str, int] = {}
+        async for bucket in self._get_stats_collection().find(query):
+            match bucket["metric"]:
+                case "assessment_levels":
+                    period = levels.setdefault(bucket["period"], RiskLevelPeriodCounts(period=bucket["period"]))
+                    period.counts[bucket["key"]] = bucket["count"]
+                case "trigger_fires":
+                    triggers[bucket["key"]] = triggers.get(bucket["key"], 0) + bucket["count"]
+                case "cryptopix_actions":
+                    actions[bucket["key"]] = actions.get(bucket["key"], 0) + bucket["count"]
+
+        total_actions = sum(actions.values())
+        return RiskStatsResult(
+            granularity=granularity,
+            since=since,
+            until=until,
+            assessments_by_level=[levels[period] for period in sorted(levels)],
+            top_triggers=[
+                TriggerFireCount(trigger_name=name, count=count)
+                for name, count in sorted(triggers.items(), key=lambda item: (-item[1], item[0]))[:top_triggers]
+            ],
+            cryptopix_actions=[
+                CryptoPixActionStat(action=action, count=count, ratio=count / total_actions)
+                for action, count in sorted(actions.items())
+            ],
+            refreshed_at=refreshed_at,
+        )
@@ -1,53 +1,405 @@
+from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional
 
 from fastapi import HTTPException, status
 from motor.motor_asyncio import AsyncIOMotorCollection
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import DuplicateKeyError
 
 from app.database import get_collection
-from app.models.score import ScoreInput, ScoreResult
+from app.models.score import (
+    FeatureTransformConfig,
+    FeatureTransformConfigInput,
+    FlagDeltaInput,
+    FlagWithValue,
+    RollupGranularity,
+    ScoreInput,
+    ScoreResult,
+    ScoreRollup,
+)
+from app.utils.catalog_versions import catalog_versions
+from app.utils.category_scores import CategoryScoreTables, category_score_tables
+from app.utils.feature_transforms import feature_extractor_cache
 from app.utils.score_calculator import ScoreCalculator
 
 
+def _rollup_period_start(timestamp: datetime, granularity: RollupGranularity) -> datetime:
+    """Returns the UTC start of the rollup bucket containing `timestamp`."""
+    day_start = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == RollupGranularity.WEEKLY:
+        return day_start - timedelta(days=day_start.weekday())
+    return day_start
+
+
 class ScoreLabService:
     def __init__(self):
         self.scores_collection: Optional[AsyncIOMotorCollection] = None
+        self.rollups_collection: Optional[AsyncIOMotorCollection] = None
+        self.states_collection: Optional[AsyncIOMotorCollection] = None
+        self.feature_configs_collection: Optional[AsyncIOMotorCollection] = None
         self.score_calculator = ScoreCalculator()
+        self._rollup_indexes_ready = False
+        self._state_indexes_ready = False
+        self._feature_config_indexes_ready = False
 
     def _get_collection(self) -> AsyncIOMotorCollection:
         if self.scores_collection is None:
             self.scores_collection = get_collection("scores")
         return self.scores_collection
 
-    async def calculate_score(self, score_input: ScoreInput) -> ScoreResult:
+    def _get_rollups_collection(self) -> AsyncIOMotorCollection:
+        if self.rollups_collection is None:
+            self.rollups_collection = get_collection("score_rollups")
+        return self.rollups_collection
+
+    def _get_states_collection(self) -> AsyncIOMotorCollection:
+        if self.states_collection is None:
+            self.states_collection = get_collection("score_states")
+        return self.states_collection
+
+    async def _ensure_state_indexes(self) -> None:
+        if self._state_indexes_ready:
+            return
+        await self._get_states_collection().create_index("entity_id", unique=True)
+        self._state_indexes_ready = True
+
+    def _get_feature_configs_collection(self) -> AsyncIOMotorCollection:
+        if self.feature_configs_collection is None:
+            self.feature_configs_collection = get_collection("feature_transform_configs")
+        return self.feature_configs_collection
+
+    async def get_active_feature_config(self) -> Optional[FeatureTransformConfig]:
+        """Retrieves the latest (active) feature transform config, if any has been published."""
+        config = await self._get_feature_configs_collection().find_one({}, sort=[("version", -1)])
+        return FeatureTransformConfig(**config) if config else None
+
+    async def publish_feature_config(
+        self, config_input: FeatureTransformConfigInput, max_retries: int = 5
+    ) -> FeatureTransformConfig:
         """
-        Calculates a new reputation score P(x) for a given entity based on provided flags and metadata.
-        Only flags marked as `is_active=True` will contribute to the P(x) calculation.
-        The full list of flags provided in `score_input` (active and inactive) is stored.
-        The calculated score result is stored in the database.
+        Stores a new feature transform config version, which becomes active for subsequent scores.
+        Versions are unique; a publish that loses the race for a version number retries with the next one.
         """
-        active_flags = [f for f in score_input.flags if f.is_active]
+        collection = self._get_feature_configs_collection()
+        if not self._feature_config_indexes_ready:
+            await collection.create_index("version", unique=True)
+            self._feature_config_indexes_ready = True
+        for _ in range(max_retries):
+            latest = await self.get_active_feature_config()
+            now = datetime.utcnow()
+            config_data = {
+                "version": (latest.version + 1) if latest else 1,
+                "transforms": [t.model_dump() for t in config_input.transforms],
+                "created_at": now,
+                "updated_at": now,
+            }
+            try:
+                insert_result = await collection.insert_one(config_data)
+                break
+            except DuplicateKeyError:
+                continue
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Concurrent feature config publishes; please retry.",
+            )
+        feature_extractor_cache.invalidate()
+        new_config = await collection.find_one({"_id": insert_result.inserted_id})
+        return FeatureTransformConfig(**new_config)
 
-        raw_score, probability_score = self.score_calculator.calculate_p_x(
-            active_flags, score_input.metadata
+    async def _ensure_feature_extractor(self) -> None:
+        """
+        Recompiles the feature extractor if a config version other than the compiled one is stored,
+        whichever process published it. The latest version is looked up on the unique `version` index.
+        """
+        if not feature_extractor_cache.is_check_due:
+            return
+        latest = await self._get_feature_configs_collection().find_one({}, {"version": 1}, sort=[("version", -1)])
+        if not feature_extractor_cache.is_stale(latest["version"] if latest else None):
+            feature_extractor_cache.mark_checked()
+            return
+        config = await self.get_active_feature_config()
+        if config:
+            feature_extractor_cache.load(config.transforms, config.version)
+        else:
+            feature_extractor_cache.load([], None)
+
+    async def _ensure_category_tables(self) -> None:
+        """Recompiles the DFC category-to-score tables if the flag ruleset changed since the last compile."""
+        ruleset_version = await catalog_versions.current(CategoryScoreTables.CATALOG)
+        if not category_score_tables.is_stale(ruleset_version):
+            return
+        definitions = await get_collection("flags").find(
+            {"type": "category", "category_scores": {"$ne": None}},
+            {"name": 1, "category_scores": 1},
+        ).to_list(length=None)
+        category_score_tables.compile(definitions, ruleset_version)
+
+    async def _ensure_rollup_indexes(self) -> None:
+        if self._rollup_indexes_ready:
+            return
+        await self._get_rollups_collection().create_index(
+            [("entity_id", ASCENDING), ("granularity", ASCENDING), ("period_start", DESCENDING)],
+            unique=True,
         )
+        self._rollup_indexes_ready = True
 
+    async def _update_rollups(self, entity_id: str, score_id: str, probability_score: float, scored_at: datetime) -> None:
+        """
+        Folds one new score into the entity's daily and weekly rollup buckets.
+        Each bucket is upserted in place, so the cost does not depend on the size of the score history.
+        The counters are folded unconditionally; `last_*` only moves to a score at least as
+        recent as the recorded one, so concurrent scores stored out of order keep the latest.
+        """
+        await self._ensure_rollup_indexes()
+        operations = []
+        for granularity in RollupGranularity:
+            bucket = {
+                "entity_id": entity_id,
+                "granularity": granularity.value,
+                "period_start": _rollup_period_start(scored_at, granularity),
+            }
+            operations.append(
+                UpdateOne(
+                    bucket,
+                    {
+                        "$inc": {"count": 1, "sum_score": probability_score},
+                        "$min": {"min_score": probability_score},
+                        "$max": {"max_score": probability_score},
+                    },
+                    upsert=True,
+                )
+            )
+            operations.append(
+                UpdateOne(
+                    {
+                        **bucket,
+                        "$or": [
+                            {"last_scored_at": None},
+                            {"last_scored_at": {"$lt": scored_at}},
+                            {"last_scored_at": scored_at, "last_score_id": {"$lt": score_id}},
+                        ],
+                    },
+                    {"$set": {"last_score": probability_score, "last_score_id": score_id, "last_scored_at": scored_at}},
+                )
+            )
+        # Ordered: each bucket exists before its conditional `last_*` update runs.
+        await self._get_rollups_collection().bulk_write(operations, ordered=True)
+
+    async def _store_score(
+        self,
+        entity_id: str,
+        flags: List[Dict[str, Any]],
+        metadata: Dict[str, Any],
+        raw_score: float,
+        probability_score: float,
+        features: List[Dict[str, Any]],
+        feature_config_version: Optional[int],
+    ) -> ScoreResult:
+        """Persists a calculated score and folds it into the entity's rollups."""
+        now = datetime.utcnow()
         score_data = {
-            "entity_id": score_input.entity_id,
+            "entity_id": entity_id,
             "probability_score": probability_score,
             "raw_score": raw_score,
             "algorithm_version": self.score_calculator.version,
-            "flags_used": [f.model_dump() for f in score_input.flags],
-            "metadata_used": score_input.metadata,
-            "summary": f"Reputation score for {score_input.entity_id} is {probability_score:.4f}.",
+            "flags_used": flags,
+            "metadata_used": metadata,
+            "features_used": features,
+            "feature_config_version": feature_config_version,
+            "summary": f"Reputation score for {entity_id} is {probability_score:.4f}.",
+            "created_at": now,
+            "updated_at": now,
         }
 
         collection = self._get_collection()
         insert_result = await collection.insert_one(score_data)
         new_score_doc = await collection.find_one({"_id": insert_result.inserted_id})
 
+        await self._update_rollups(entity_id, str(insert_result.inserted_id), probability_score, now)
+
         return ScoreResult(**new_score_doc)
 
+    async def calculate_score(self, score_input: ScoreInput) -> ScoreResult:
+        """
+        Calculates a new reputation score P(x) for a given entity based on provided flags and metadata.
+        Only flags marked as `is_active=True` will contribute to the P(x) calculation.
+        The full list of flags provided in `score_input` (active and inactive) is stored.
+        The calculated score result is stored in the database, and the entity's running
+        aggregates are reset to this flag vector so later single-flag deltas build on it.
+        """
+        await self._ensure_category_tables()
+        await self._ensure_feature_extractor()
+        extractor = feature_extractor_cache.extractor
+        return await self._score_with_features(score_input, extractor.extract(score_input.metadata), extractor.version)
+
+    async def calculate_scores_batch(self, score_inputs: List[ScoreInput]) -> List[ScoreResult]:
+        """
+        Calculates and stores the scores of many entities, in input order, exactly as `calculate_score`
+        would. Metadata features are extracted for the whole batch at once with the same compiled config.
+        """
+        await self._ensure_category_tables()
+        await self._ensure_feature_extractor()
+        extractor = feature_extractor_cache.extractor
+        batch_features = extractor.extract_batch([score_input.metadata for score_input in score_inputs])
+        return [
+            await self._score_with_features(score_input, features, extractor.version)
+            for score_input, features in zip(score_inputs, batch_features)
+        ]
+
+    async def _score_with_features(
+        self, score_input: ScoreInput, features: List[FlagWithValue], feature_config_version: Optional[int]
+    ) -> ScoreResult:
+        active_flags = [f for f in score_input.flags if f.is_active]
+        raw_score, probability_score = self.score_calculator.calculate_p_x(
+            active_flags, score_input.metadata, features
+        )
+
+        result = await self._store_score(
+            score_input.entity_id,
+            [f.model_dump() for f in score_input.flags],
+            score_input.metadata,
+            raw_score,
+            probability_score,
+            [f.model_dump() for f in features],
+            feature_config_version,
+        )
+        await self._reset_score_state(
+            score_input.entity_id, score_input.flags, score_input.metadata, features, feature_config_version
+        )
+        return result
+
+    async def _reset_score_state(
+        self,
+        entity_id: str,
+        flags: List[FlagWithValue],
+        metadata: Dict[str, Any],
+        features: List[FlagWithValue],
+        feature_config_version: Optional[int],
+    ) -> None:
+        """
+        Replaces the entity's running Σw / Σwv aggregates and flag vector (flag names are unique, see `ScoreInput`).
+        Metadata features are folded into the sums once here; single-flag deltas leave them untouched.
+        Each flag's (w, wv) contribution is stored too, so a delta subtracts exactly what was added
+        even if the DFC category tables changed in between.
+        """
+        await self._ensure_state_indexes()
+        flag_vector = {f.name: f for f in flags}
+        contributions = {name: list(self.score_calculator.flag_contribution(f)) for name, f in flag_vector.items()}
+        sum_of_weights, sum_of_weighted_values = self.score_calculator.aggregate(features)
+        sum_of_weights += sum(w for w, _ in contributions.values())
+        sum_of_weighted_values += sum(wv for _, wv in contributions.values())
+        await self._get_states_collection().update_one(
+            {"entity_id": entity_id},
+            {
+                "$set": {
+                    "sum_w": sum_of_weights,
+                    "sum_wv": sum_of_weighted_values,
+                    "flags": {name: f.model_dump() for name, f in flag_vector.items()},
+                    "contributions": contributions,
+                    "metadata": metadata,
+                    "features": [f.model_dump() for f in features],
+                    "feature_config_version": feature_config_version,
+                    "algorithm_version": self.score_calculator.version,
+                    "updated_at": datetime.utcnow(),
+                },
+                "$inc": {"version": 1},
+            },
+            upsert=True,
+        )
+
+    async def apply_flag_delta(self, entity_id: str, delta: FlagDeltaInput, max_retries: int = 3) -> Optional[ScoreResult]:
+        """
+        Applies a single flag change to the entity's stored flag vector and emits a new score.
+        Only the changed flag's contribution is subtracted from and added to the running sums,
+        so the cost does not depend on how many flags the entity carries.
+        Returns None if the entity has never been scored.
+        """
+        await self._ensure_category_tables()
+        states = self._get_states_collection()
+        for _ in range(max_retries):
+            state = await states.find_one({"entity_id": entity_id})
+            if not state:
+                return None
+
+            flags: Dict[str, Dict[str, Any]] = state["flags"]
+            contributions: Dict[str, List[float]] = state.get("contributions", {})
+            sum_of_weights = state["sum_w"]
+            sum_of_weighted_values = state["sum_wv"]
+
+            previous = flags.get(delta.name)
+            if previous is not None:
+                # What was added to the sums, not a recomputation: the category tables may have changed since.
+                old_weight, old_weighted_value = contributions.get(delta.name) or self.score_calculator.flag_contribution(
+                    FlagWithValue(**previous)
+                )
+                sum_of_weights -= old_weight
+                sum_of_weighted_values -= old_weighted_value
+
+            if delta.remove:
+                if previous is None:
+                    raise HTTPException(
+                        status_code=status.HTTP_404_NOT_FOUND,
+                        detail=f"Flag '{delta.name}' is not set for entity {entity_id}.",
+                    )
+                flags.pop(delta.name)
+                contributions.pop(delta.name, None)
+            else:
+                if previous is None and delta.value is None:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"Flag '{delta.name}' is new for entity {entity_id}; a value is required.",
+                    )
+                updated = FlagWithValue(
+                    name=delta.name,
+                    value=delta.value if delta.value is not None else previous["value"],
+                    weight=delta.weight if delta.weight is not None else (previous or {}).get("weight", 0.0),
+                    is_active=delta.is_active if delta.is_active is not None else (previous or {}).get("is_active", True),
+                )
+                new_weight, new_weighted_value = self.score_calculator.flag_contribution(updated)
+                sum_of_weights += new_weight
+                sum_of_weighted_values += new_weighted_value
+                flags[delta.name] = updated.model_dump()
+                contributions[delta.name] = [new_weight, new_weighted_value]
+
+            if abs(sum_of_weights) < 1e-12:
+                sum_of_weights, sum_of_weighted_values = 0.0, 0.0  # Drop floating-point residue once nothing contributes.
+
+            update_result = await states.update_one(
+                {"entity_id": entity_id, "version": state["version"]},
+                {
+                    "$set": {
+                        "sum_w": sum_of_weights,
+                        "sum_wv": sum_of_weighted_values,
+                        "flags": flags,
+                        "contributions": contributions,
+                        "updated_at": datetime.utcnow(),
+                    },
+                    "$inc": {"version": 1},
+                },
+            )
+            if update_result.modified_count == 0:
+                continue  # Another delta won the race; re-read the state and retry.
+
+            raw_score, probability_score = self.score_calculator.p_x_from_aggregates(
+                sum_of_weights, sum_of_weighted_values
+            )
+            return await self._store_score(
+                entity_id,
+                list(flags.values()),
+                state.get("metadata", {}),
+                raw_score,
+                probability_score,
+                state.get("features", []),
+                state.get("feature_config_version"),
+            )
+
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Concurrent flag updates for entity {entity_id}; please retry.",
+        )
+
     async def get_score_by_id(self, score_id: str) -> Optional[ScoreResult]:
         """Retrieves a previously calculated score by its unique ID."""
         if not ObjectId.is_valid(score_id):
@@ -59,6 +411,18 @@ class ScoreLabService:
 
         return ScoreResult(**score) if score else None
 
+    async def get_scores_by_ids(self, score_ids: List[str]) -> Dict[str, ScoreResult]:
+        """Retrieves many scores with a single `$in` query, keyed by score ID. Unknown or invalid IDs are omitted."""
+        object_ids = list({ObjectId(score_id) for score_id in score_ids if ObjectId.is_valid(score_id)})
+        scores: Dict[str, ScoreResult] = {}
+        if not object_ids:
+            return scores
+        collection = self._get_collection()
+        async for score_doc in collection.find({"_id": {"$in": object_ids}}):
+            score_result = ScoreResult(**score_doc)
+            scores[str(score_result.id)] = score_result
+        return scores
+
     async def get_scores_by_entity_id(self, entity_id: str) -> List[ScoreResult]:
         """Retrieves all historical scores for a given entity, ordered by most recent first."""
         scores = []
@@ -67,3 +431,31 @@ class ScoreLabService:
         async for score_doc in cursor:
             scores.append(ScoreResult(**score_doc))
         return scores
+
+    async def get_score_rollups(
+        self, entity_id: str, granularity: RollupGranularity, limit: int = 30
+    ) -> List[ScoreRollup]:
+        """Retrieves the most recent rollup buckets for an entity, ordered by most recent first."""
+        rollups = []
+        collection = self._get_rollups_collection()
+        cursor = (
+            collection.find({"entity_id": entity_id, "granularity": granularity.value})
+            .sort("period_start", -1)
+            .limit(limit)
+        )
+        async for rollup_doc in cursor:
+            rollups.append(
+                ScoreRollup(
+                    entity_id=rollup_doc["entity_id"],
+                    granularity=rollup_doc["granularity"],
+                    period_start=rollup_doc["period_start"],
+                    count=rollup_doc["count"],
+                    min_score=rollup_doc["min_score"],
+                    max_score=rollup_doc["max_score"],
+                    mean_score=rollup_doc["sum_score"] / rollup_doc["count"],
+                    last_score=rollup_doc["last_score"],
+                    last_score_id=rollup_doc.get("last_score_id"),
+                    last_scored_at=rollup_doc["last_scored_at"],
+                )
+            )
+        return rollups
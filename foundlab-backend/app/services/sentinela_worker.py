@@ -0,0 +1,237 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+from app.config import settings
+from app.database import close_mongo_connection, connect_to_mongo, get_collection
+from app.models.score import ScoreResult
+from app.services.risk_service import SentinelaService
+
+CHECKPOINT_ID = "sentinela_worker"
+
+
+class SentinelaWorker:
+    """
+    Reactive Sentinela consumer: assesses every newly inserted score without a client
+    calling `POST /sentinela/assess`.
+
+    New `scores` documents are tailed through a change stream, or by polling on
+    `(created_at, _id)` when MongoDB runs without a replica set. Polling only reads scores
+    older than `poll_lag_seconds`, so a write that commits after a later one has been read
+    is still picked up (neither `_id` nor `created_at` is assigned in commit order). Each
+    micro-batch is split into chunks that are assessed concurrently (bounded by
+    `max_concurrency`) and written with one `insert_many` per chunk. Scores that already
+    have an assessment are skipped, and progress is checkpointed so a restarted worker
+    resumes where it stopped.
+    """
+
+    def __init__(
+        self,
+        sentinela_service: Optional[SentinelaService] = None,
+        batch_size: int = settings.SENTINELA_WORKER_BATCH_SIZE,
+        chunk_size: int = settings.SENTINELA_WORKER_CHUNK_SIZE,
+        max_concurrency: int = settings.SENTINELA_WORKER_MAX_CONCURRENCY,
+        poll_interval_seconds: float = settings.SENTINELA_WORKER_POLL_INTERVAL_SECONDS,
+        use_change_stream: bool = settings.SENTINELA_WORKER_USE_CHANGE_STREAM,
+        poll_lag_seconds: float = settings.SENTINELA_WORKER_POLL_LAG_SECONDS,
+        retry_base_seconds: float = settings.SENTINELA_WORKER_RETRY_BASE_SECONDS,
+        retry_max_seconds: float = settings.SENTINELA_WORKER_RETRY_MAX_SECONDS,
+    ):
+        self.sentinela_service = sentinela_service or SentinelaService()
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.poll_interval_seconds = poll_interval_seconds
+        self.use_change_stream = use_change_stream
+        self.poll_lag_seconds = poll_lag_seconds
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self._failures = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._task: Optional[asyncio.Task] = None
+        self._last_score_id = None
+        self._last_created_at: Optional[datetime] = None
+        self._resume_token: Optional[Dict[str, Any]] = None
+        self._checkpoint_loaded = False
+        self._indexes_ready = False
+
+    def _get_scores_collection(self) -> AsyncIOMotorCollection:
+        return get_collection("scores")
+
+    def _get_checkpoints_collection(self) -> AsyncIOMotorCollection:
+        return get_collection("worker_checkpoints")
+
+    async def _load_checkpoint(self) -> None:
+        if self._checkpoint_loaded:
+            return
+        checkpoint = await self._get_checkpoints_collection().find_one({"_id": CHECKPOINT_ID})
+        if checkpoint:
+            self._last_score_id = checkpoint.get("last_score_id")
+            self._last_created_at = checkpoint.get("last_created_at")
+            self._resume_token = checkpoint.get("resume_token")
+            if self._last_created_at is None and self._last_score_id is not None:
+                # Checkpoints written before `last_created_at` existed only hold the `_id`.
+                last_doc = await self._get_scores_collection().find_one({"_id": self._last_score_id}, {"created_at": 1})
+                self._last_created_at = last_doc["created_at"] if last_doc else None
+        self._checkpoint_loaded = True
+
+    async def _save_checkpoint(self) -> None:
+        await self._get_checkpoints_collection().update_one(
+            {"_id": CHECKPOINT_ID},
+            {
+                "$set": {
+                    "last_score_id": self._last_score_id,
+                    "last_created_at": self._last_created_at,
+                    "resume_token": self._resume_token,
+                }
+            },
+            upsert=True,
+        )
+
+    def _advance(self, last_doc: Dict[str, Any]) -> None:
+        self._last_score_id = last_doc["_id"]
+        self._last_created_at = last_doc.get("created_at")
+
+    async def _ensure_indexes(self) -> None:
+        if not self._indexes_ready:
+            await self._get_scores_collection().create_index([("created_at", ASCENDING), ("_id", ASCENDING)])
+            self._indexes_ready = True
+
+    async def _assess_chunk(self, score_results: List[ScoreResult]) -> int:
+        async with self._semaphore:
+            assessments = await self.sentinela_service.assess_score_results(score_results)
+        return len(assessments)
+
+    async def process_batch(self, score_docs: List[Dict[str, Any]]) -> int:
+        """Assesses a micro-batch of score documents; returns how many assessments were written."""
+        already_assessed = await self.sentinela_service.get_assessed_score_ids([str(doc["_id"]) for doc in score_docs])
+        pending = [ScoreResult(**doc) for doc in score_docs if str(doc["_id"]) not in already_assessed]
+        if not pending:
+            return 0
+
+        chunks = [pending[i:i + self.chunk_size] for i in range(0, len(pending), self.chunk_size)]
+        written = await asyncio.gather(*(self._assess_chunk(chunk) for chunk in chunks))
+        return sum(written)
+
+    async def poll_once(self) -> int:
+        """
+        Assesses the next batch of scores created after the checkpoint and at least
+        `poll_lag_seconds` ago; returns how many were assessed.
+        """
+        await self._load_checkpoint()
+        await self._ensure_indexes()
+        query: Dict[str, Any] = {"created_at": {"$lte": datetime.utcnow() - timedelta(seconds=self.poll_lag_seconds)}}
+        if self._last_created_at is not None:
+            query["$or"] = [
+                {"created_at": {"$gt": self._last_created_at}},
+                {"created_at": self._last_created_at, "_id": {"$gt": self._last_score_id}},
+            ]
+        score_docs = (
+            await self._get_scores_collection()
+            .find(query)
+            .sort([("created_at", ASCENDING), ("_id", ASCENDING)])
+            .limit(self.batch_size)
+            .to_list(length=self.batch_size)
+        )
+        if not score_docs:
+            return 0
+
+        written = await self.process_batch(score_docs)
+        self._advance(score_docs[-1])
+        await self._save_checkpoint()
+        return written
+
+    async def _run_polling(self) -> None:
+        while True:
+            written = await self.poll_once()
+            self._failures = 0
+            if written == 0:
+                await asyncio.sleep(self.poll_interval_seconds)
+
+    async def _run_change_stream(self) -> None:
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        async with self._get_scores_collection().watch(
+            pipeline,
+            resume_after=self._resume_token,
+            max_await_time_ms=int(self.poll_interval_seconds * 1000),
+        ) as stream:
+            while True:
+                score_docs = []
+                while len(score_docs) < self.batch_size:
+                    change = await stream.try_next()
+                    if change is None:
+                        break
+                    score_docs.append(change["fullDocument"])
+                if not score_docs:
+                    continue
+
+                await self.process_batch(score_docs)
+                self._advance(score_docs[-1])
+                self._resume_token = stream.resume_token
+                await self._save_checkpoint()
+                self._failures = 0
+
+    async def run(self) -> None:
+        """
+        Consumes new scores until cancelled, preferring a change stream over polling.
+
+        Any other error is logged and the consumer restarts after an exponential backoff,
+        resuming from the in-memory checkpoint (or change stream resume token).
+        """
+        use_change_stream = self.use_change_stream
+        positioned = False
+        while True:
+            try:
+                await self._load_checkpoint()
+                if use_change_stream:
+                    try:
+                        await self._run_change_stream()
+                    except OperationFailure as e:
+                        print(f"Sentinela worker: change streams unavailable ({e}); falling back to polling.")
+                        use_change_stream = False
+                if not positioned and self._last_created_at is None:
+                    # Without a checkpoint, consume only scores inserted from now on, as a fresh change stream would.
+                    latest = await self._get_scores_collection().find_one(
+                        {}, sort=[("created_at", DESCENDING), ("_id", DESCENDING)]
+                    )
+                    if latest:
+                        self._advance(latest)
+                positioned = True
+                await self._run_polling()
+            except Exception as e:
+                self._failures += 1
+                delay = min(self.retry_max_seconds, self.retry_base_seconds * 2 ** (self._failures - 1))
+                print(f"Sentinela worker failed ({e!r}); retrying from the last checkpoint in {delay:.1f}s.")
+                await asyncio.sleep(delay)
+
+    def start(self) -> None:
+        """Starts the worker as a background task of the running event loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+async def main() -> None:
+    """Standalone worker entrypoint: `python -m app.services.sentinela_worker`."""
+    await connect_to_mongo()
+    worker = SentinelaWorker()
+    try:
+        print("Sentinela worker started.")
+        await worker.run()
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
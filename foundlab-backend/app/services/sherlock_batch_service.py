@@ -0,0 +1,252 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from app.config import settings
+from app.database import get_collection
+from app.models.sherlock import (
+    ExternalProviderResult,
+    RequestPriority,
+    SherlockBatchJob,
+    SherlockBatchJobStatus,
+    SherlockBatchValidationInput,
+    SherlockValidationInput,
+    SherlockValidationResult,
+)
+from app.services.sherlock_service import ProviderCheck, SherlockService
+from app.utils.provider_cache import provider_cache_key, provider_result_cache
+
+
+class SherlockBatchService:
+    """
+    Bulk Sherlock validation as background jobs.
+
+    Submitted entities are deduplicated and screened in chunks of `SHERLOCK_BATCH_CHUNK_SIZE`:
+    local providers first, then every remote provider concurrently, serving cached provider
+    results and sending the rest as batch requests where the adapter has a batch API (one
+    request per entity otherwise), with at most `SHERLOCK_BATCH_PROVIDER_CONCURRENCY`
+    requests in flight per provider, all at the job's quota priority (`batch` or `backfill`,
+    behind interactive validations). Each chunk's results are stored with one `insert_many`
+    and the job document's counters are advanced, which is what progress streams read.
+
+    Jobs run inside the API process that accepted them, which renews the job's
+    `lease_until` while it runs. A pending or running job whose lease ran out (its process
+    was restarted or died) is marked failed at startup, or when it is next read.
+    """
+
+    def __init__(
+        self,
+        sherlock_service: Optional[SherlockService] = None,
+        lease_seconds: float = settings.SHERLOCK_BATCH_LEASE_SECONDS,
+    ):
+        self.sherlock_service = sherlock_service or SherlockService()
+        self.lease_seconds = lease_seconds
+        self.jobs_collection: Optional[AsyncIOMotorCollection] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def _get_jobs_collection(self) -> AsyncIOMotorCollection:
+        if self.jobs_collection is None:
+            self.jobs_collection = get_collection("sherlock_batch_jobs")
+        return self.jobs_collection
+
+    async def create_job(self, batch_input: SherlockBatchValidationInput) -> SherlockBatchJob:
+        if len(batch_input.entities) > settings.SHERLOCK_BATCH_MAX_ENTITIES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"A batch may contain at most {settings.SHERLOCK_BATCH_MAX_ENTITIES} entities.",
+            )
+        unique: Dict[Tuple[str, str, str], SherlockValidationInput] = {}
+        for entity in batch_input.entities:
+            unique.setdefault(provider_cache_key("", entity.entity_id, entity.entity_type), entity)
+
+        job = SherlockBatchJob(
+            id=uuid.uuid4().hex,
+            priority=batch_input.priority,
+            total_entities=len(batch_input.entities),
+            unique_entities=len(unique),
+            lease_until=self._lease_until(),
+        )
+        await self._get_jobs_collection().insert_one(job.model_dump(by_alias=True))
+        task = asyncio.create_task(self._run(job.id, list(unique.values()), batch_input.priority))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+        return job
+
+    async def get_job(self, job_id: str) -> SherlockBatchJob:
+        jobs = self._get_jobs_collection()
+        job_doc = await jobs.find_one({"_id": job_id})
+        if job_doc is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Batch job '{job_id}' not found.")
+        job = SherlockBatchJob(**job_doc)
+        if self._is_orphaned(job) and await self.fail_orphaned_jobs():
+            job = SherlockBatchJob(**await jobs.find_one({"_id": job_id}))
+        return job
+
+    def _lease_until(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+
+    @staticmethod
+    def _is_orphaned(job: SherlockBatchJob) -> bool:
+        return job.status in (SherlockBatchJobStatus.PENDING, SherlockBatchJobStatus.RUNNING) and (
+            job.lease_until is None or job.lease_until < datetime.utcnow()
+        )
+
+    async def fail_orphaned_jobs(self) -> int:
+        """Marks failed the pending and running jobs whose lease ran out; returns how many."""
+        now = datetime.utcnow()
+        result = await self._get_jobs_collection().update_many(
+            {
+                "status": {"$in": [SherlockBatchJobStatus.PENDING.value, SherlockBatchJobStatus.RUNNING.value]},
+                "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}],
+            },
+            {
+                "$set": {
+                    "status": SherlockBatchJobStatus.FAILED.value,
+                    "error": "Interrupted: the process running the job stopped.",
+                    "completed_at": now,
+                }
+            },
+        )
+        if result.modified_count:
+            print(f"Marked {result.modified_count} interrupted Sherlock batch job(s) as failed.")
+        return result.modified_count
+
+    async def _renew_lease(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self._get_jobs_collection().update_one({"_id": job_id}, {"$set": {"lease_until": self._lease_until()}})
+            except Exception as e:
+                print(f"Failed to renew the lease of Sherlock batch job {job_id}: {e}")
+
+    async def get_job_results(
+        self, job_id: str, skip: int = 0, limit: int = 100, include_raw: bool = False
+    ) -> List[SherlockValidationResult]:
+        await self.get_job(job_id)
+        return await self.sherlock_service.find_results(
+            {"batch_job_id": job_id}, [("_id", 1)], skip=skip, limit=limit, include_raw=include_raw
+        )
+
+    async def progress_events(self, job_id: str) -> AsyncIterator[str]:
+        """
+        Server-Sent Events with the job document every time it changes, ending with a
+        `completed` or `failed` event. Polls the job document, so it works from any API process.
+        """
+        last_payload = None
+        while True:
+            job = await self.get_job(job_id)
+            payload = job.model_dump_json(by_alias=True)
+            finished = job.status in (SherlockBatchJobStatus.COMPLETED, SherlockBatchJobStatus.FAILED)
+            if payload != last_payload:
+                event = job.status.value if finished else "progress"
+                yield f"event: {event}\ndata: {payload}\n\n"
+                last_payload = payload
+            if finished:
+                return
+            await asyncio.sleep(settings.SHERLOCK_BATCH_PROGRESS_INTERVAL_SECONDS)
+
+    async def _run(
+        self, job_id: str, entities: List[SherlockValidationInput], priority: RequestPriority = RequestPriority.BATCH
+    ) -> None:
+        jobs = self._get_jobs_collection()
+        await jobs.update_one(
+            {"_id": job_id},
+            {"$set": {"status": SherlockBatchJobStatus.RUNNING.value, "lease_until": self._lease_until()}},
+        )
+        lease = asyncio.create_task(self._renew_lease(job_id))
+        try:
+            chunk_size = settings.SHERLOCK_BATCH_CHUNK_SIZE
+            for start in range(0, len(entities), chunk_size):
+                await self._validate_chunk(job_id, entities[start : start + chunk_size], priority)
+            await jobs.update_one(
+                {"_id": job_id},
+                {"$set": {"status": SherlockBatchJobStatus.COMPLETED.value, "completed_at": datetime.utcnow()}},
+            )
+        except Exception as e:
+            print(f"Sherlock batch job {job_id} failed: {e}")
+            await jobs.update_one(
+                {"_id": job_id},
+                {
+                    "$set": {
+                        "status": SherlockBatchJobStatus.FAILED.value,
+                        "error": str(e),
+                        "completed_at": datetime.utcnow(),
+                    }
+                },
+            )
+        finally:
+            lease.cancel()
+
+    async def _validate_chunk(
+        self, job_id: str, chunk: List[SherlockValidationInput], priority: RequestPriority = RequestPriority.BATCH
+    ) -> None:
+        service = self.sherlock_service
+        provider_results = [await service.screen_locally(entity) for entity in chunk]
+        remote_indexes = [
+            i for i, entity in enumerate(chunk) if not service.local_results_are_final(provider_results[i], entity.entity_type)
+        ]
+        remote_entities = [chunk[i] for i in remote_indexes]
+        per_provider = await asyncio.gather(
+            *(self._screen_remote(name, check, remote_entities, priority) for name, check in service.providers.items())
+        )
+
+        provider_calls = sum(calls for _, calls, _ in per_provider)
+        cache_hits = sum(hits for _, _, hits in per_provider)
+        for position, i in enumerate(remote_indexes):
+            provider_results[i] = provider_results[i] + [results[position] for results, _, _ in per_provider]
+
+        results = [service.aggregate(entity, provider_results[i]) for i, entity in enumerate(chunk)]
+        status_counts: Dict[str, int] = {}
+        for result in results:
+            result.batch_job_id = job_id
+            key = f"status_counts.{result.overall_sanction_status.value}"
+            status_counts[key] = status_counts.get(key, 0) + 1
+        await service.store_results(results)
+        await self._get_jobs_collection().update_one(
+            {"_id": job_id},
+            {"$inc": {"processed": len(chunk), "provider_calls": provider_calls, "cache_hits": cache_hits, **status_counts}},
+        )
+
+    async def _screen_remote(
+        self,
+        provider_name: str,
+        check: ProviderCheck,
+        entities: List[SherlockValidationInput],
+        priority: RequestPriority = RequestPriority.BATCH,
+    ) -> Tuple[List[ExternalProviderResult], int, int]:
+        """One provider's results for `entities` (in order), plus the requests made and cache hits."""
+        service = self.sherlock_service
+        semaphore = asyncio.Semaphore(settings.SHERLOCK_BATCH_PROVIDER_CONCURRENCY)
+        adapter = service.batch_providers.get(provider_name)
+
+        if adapter is None:
+            async def call(entity: SherlockValidationInput) -> ExternalProviderResult:
+                async with semaphore:
+                    return await service.call_provider(provider_name, check, entity.entity_id, entity.entity_type, priority)
+
+            results = list(await asyncio.gather(*(call(entity) for entity in entities)))
+            cache_hits = sum(1 for result in results if result.cache_age_seconds is not None)
+            return results, len(results) - cache_hits, cache_hits
+
+        results: List[Optional[ExternalProviderResult]] = [
+            provider_result_cache.get(provider_cache_key(provider_name, entity.entity_id, entity.entity_type))
+            for entity in entities
+        ]
+        misses = [i for i, result in enumerate(results) if result is None]
+        batches = [misses[start : start + adapter.batch_size] for start in range(0, len(misses), adapter.batch_size)]
+
+        async def call_batch(indexes: List[int]) -> None:
+            async with semaphore:
+                batch_results = await service.query_provider_batch(
+                    provider_name, adapter, [(entities[i].entity_id, entities[i].entity_type) for i in indexes], priority
+                )
+            for i, result in zip(indexes, batch_results):
+                results[i] = result
+
+        await asyncio.gather(*(call_batch(indexes) for indexes in batches))
+        return results, len(batches), len(entities) - len(misses)
+
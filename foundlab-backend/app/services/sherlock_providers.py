@@ -0,0 +1,311 @@
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Type
+
+import httpx
+
+from app.config import settings
+from app.models.sherlock import ComplianceFlag, ExternalProviderResult, ProviderStatus
+from app.utils.sanctions_index import SanctionsIndex, SanctionsIndexStore, sanctions_index_store
+
+
+class ProviderAdapter(ABC):
+    """
+    One external compliance provider as seen by Sherlock. Adapters are registered under a
+    `kind` and instantiated from `SHERLOCK_PROVIDERS`; `check` may raise or hang, since
+    timeouts and errors are handled by `SherlockService`.
+    """
+
+    kind: str = ""
+    # Local providers answer from memory: they run before the remote ones, without timeout or cache.
+    local: bool = False
+    # Entities per `check_batch` call; 0 when the provider has no batch API.
+    batch_size: int = 0
+
+    def __init__(self, name: str, **options: Any):
+        self.name = name
+        self.options = options
+
+    @abstractmethod
+    async def check(self, entity_id: str, entity_type: str) -> ExternalProviderResult: ...
+
+    async def check_batch(self, entities: Sequence[Tuple[str, str]]) -> List[ExternalProviderResult]:
+        """Screens `(entity_id, entity_type)` pairs in one provider request; only called when `batch_size` > 0."""
+        raise NotImplementedError(f"{self.name} has no batch API.")
+
+
+PROVIDER_ADAPTERS: Dict[str, Type[ProviderAdapter]] = {}
+
+
+def register_provider_adapter(adapter_class: Type[ProviderAdapter]) -> Type[ProviderAdapter]:
+    """Class decorator making an adapter available under its `kind` in `SHERLOCK_PROVIDERS`."""
+    PROVIDER_ADAPTERS[adapter_class.kind] = adapter_class
+    return adapter_class
+
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_provider_http_client() -> httpx.AsyncClient:
+    """
+    The process-wide client shared by all HTTP adapters: one connection pool with
+    keep-alive (and HTTP/2 when enabled), so provider calls reuse warm connections
+    instead of opening one per request.
+    """
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            http2=settings.SHERLOCK_HTTP2,
+            timeout=httpx.Timeout(settings.SHERLOCK_PROVIDER_TIMEOUT_SECONDS, connect=settings.SHERLOCK_HTTP_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=settings.SHERLOCK_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.SHERLOCK_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.SHERLOCK_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+        )
+    return _http_client
+
+
+async def close_provider_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+@register_provider_adapter
+class HTTPProviderAdapter(ProviderAdapter):
+    """
+    Screens an entity with `POST {base_url}/screen` and a JSON body of `entity_id` and
+    `entity_type`. The provider answers with `status`, `score`, `flags` and `message`;
+    the whole body is kept as `raw_response`. With a `batch_size` option, bulk validation
+    sends up to that many entities to `POST {base_url}/screen/batch` as `{"entities": [...]}`
+    and expects `{"results": [...]}` in the same order.
+    """
+
+    kind = "http"
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        api_key: Optional[str] = None,
+        client_factory: Callable[[], httpx.AsyncClient] = get_provider_http_client,
+        batch_size: int = 0,
+        **options: Any,
+    ):
+        super().__init__(name, **options)
+        self.url = base_url.rstrip("/") + "/screen"
+        self.headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.batch_size = batch_size
+        self._client_factory = client_factory
+
+    def _result(self, body: Dict[str, Any]) -> ExternalProviderResult:
+        return ExternalProviderResult(
+            provider_name=self.name,
+            status=ProviderStatus(body.get("status", ProviderStatus.SUCCESS.value)),
+            score=body.get("score"),
+            flags=[ComplianceFlag(**flag) for flag in body.get("flags", [])],
+            raw_response=body,
+            message=body.get("message"),
+        )
+
+    async def check(self, entity_id: str, entity_type: str) -> ExternalProviderResult:
+        response = await self._client_factory().post(
+            self.url, json={"entity_id": entity_id, "entity_type": entity_type}, headers=self.headers
+        )
+        response.raise_for_status()
+        return self._result(response.json())
+
+    async def check_batch(self, entities: Sequence[Tuple[str, str]]) -> List[ExternalProviderResult]:
+        response = await self._client_factory().post(
+            self.url + "/batch",
+            json={"entities": [{"entity_id": entity_id, "entity_type": entity_type} for entity_id, entity_type in entities]},
+            headers=self.headers,
+        )
+        response.raise_for_status()
+        results = response.json()["results"]
+        if len(results) != len(entities):
+            raise ValueError(f"{self.name} returned {len(results)} results for {len(entities)} entities.")
+        return [self._result(body) for body in results]
+
+
+@register_provider_adapter
+class MockChainalysisAdapter(ProviderAdapter):
+    """Offline stand-in for Chainalysis, driven by substrings of the entity ID."""
+
+    kind = "mock_chainalysis"
+
+    async def check(self, entity_id: str, entity_type: str) -> ExternalProviderResult:
+        flags: List[ComplianceFlag] = []
+        score = 0.1
+        status_val = ProviderStatus.SUCCESS
+        message = "No significant issues found by Chainalysis."
+
+        if "sanctioned_entity" in entity_id.lower() or "ofac_test" in entity_id.lower():
+            flags.append(ComplianceFlag(flag_name="OFAC_SDN_Match", category="Sanctions", value="Direct hit", severity=1.0))
+            score = 1.0
+            message = "Entity directly linked to OFAC SDN list."
+        elif "dark_market_exposure" in entity_id.lower():
+            flags.append(ComplianceFlag(flag_name="Dark_Market_Involvement", category="Illicit Activities", value="Indirect exposure", severity=0.85))
+            flags.append(ComplianceFlag(flag_name="High_Risk_DEX_Usage", category="DeFi & Exchanges", value="Extensive DEX only activity", severity=0.6))
+            score = 0.85
+            message = "Entity has exposure to dark market transactions."
+        elif "high_volume_gambling" in entity_id.lower():
+            flags.append(ComplianceFlag(flag_name="High_Intensity_Gambling", category="AML", value="Frequent large transfers to gambling sites", severity=0.7))
+            score = 0.7
+            message = "High volume of transactions with known gambling services."
+        elif "under_investigation" in entity_id.lower():
+            status_val = ProviderStatus.PENDING
+            message = "Entity is currently under investigation, manual review required."
+            score = 0.5
+        elif "mixer_usage" in entity_id.lower():
+            flags.append(ComplianceFlag(flag_name="Crypto_Mixer_Usage", category="Privacy Enhancing", value="Observed interaction with CoinJoin/mixers", severity=0.75))
+            score = 0.75
+            message = "Transaction history includes interaction with cryptocurrency mixers."
+
+        return ExternalProviderResult(
+            provider_name=self.name,
+            status=status_val,
+            score=score,
+            flags=flags,
+            message=message,
+        )
+
+
+@register_provider_adapter
+class MockTRMLabsAdapter(ProviderAdapter):
+    """Offline stand-in for TRM Labs, driven by substrings of the entity ID."""
+
+    kind = "mock_trm_labs"
+
+    async def check(self, entity_id: str, entity_type: str) -> ExternalProviderResult:
+        flags: List[ComplianceFlag] = []
+        score = 0.05
+        status_val = ProviderStatus.SUCCESS
+        message = "No red flags from TRM Labs."
+
+        if "terror_finance_org" in entity_id.lower() or "cft_listed" in entity_id.lower():
+            flags.append(ComplianceFlag(flag_name="CFT_List_Match", category="Terrorist Financing", value="Match on CFT watchlist", severity=0.98))
+            score = 0.98
+            message = "Entity found on Counter-Terrorism Financing watchlist."
+        elif "pep_exposed" in entity_id.lower():
+            flags.append(ComplianceFlag(flag_name="PEP_Exposure", category="AML", value="Politically Exposed Person", severity=0.6))
+            score = 0.6
+            message = "Entity flagged as Politically Exposed Person."
+        elif "sanctioned_entity" in entity_id.lower():
+            flags.append(ComplianceFlag(flag_name="Global_Sanctions_Match", category="Sanctions", value="International sanctions list", severity=0.95))
+            score = 0.95
+            message = "Entity found on global sanctions lists."
+        elif "high_risk_jurisdiction" in entity_id.lower():
+            flags.append(ComplianceFlag(flag_name="High_Risk_Jurisdiction_Link", category="Geographic Risk", value="Tied to known high-risk region", severity=0.8))
+            score = 0.8
+            message = "Entity linked to a high-risk jurisdiction."
+
+        return ExternalProviderResult(
+            provider_name=self.name,
+            status=status_val,
+            score=score,
+            flags=flags,
+            message=message,
+        )
+
+
+WATCHLIST_NAME_MATCH_FLAG = "Watchlist_Name_Match"
+
+
+@register_provider_adapter
+class SanctionsListAdapter(ProviderAdapter):
+    """
+    Screening against the local sanctions lists of `SANCTIONS_LIST_PATHS`: exact match of
+    identifiers, fuzzy match of names for `SANCTIONS_NAME_ENTITY_TYPES`.
+    """
+
+    kind = "sanctions_list"
+    local = True
+
+    def __init__(self, name: str, store: SanctionsIndexStore = sanctions_index_store, **options: Any):
+        super().__init__(name, **options)
+        self.store = store
+
+    async def check(self, entity_id: str, entity_type: str) -> ExternalProviderResult:
+        index = self.store.current
+        if index is None:
+            raise RuntimeError("Sanctions lists are not loaded.")
+        if entity_type in settings.SANCTIONS_NAME_ENTITY_TYPES:
+            return self._name_result(index, entity_id)
+        matches = index.lookup(entity_id)
+        if not matches:
+            return ExternalProviderResult(
+                provider_name=self.name,
+                status=ProviderStatus.SUCCESS,
+                score=0.0,
+                message=f"No match in local sanctions lists (version {index.version[:12]}).",
+            )
+        return ExternalProviderResult(
+            provider_name=self.name,
+            status=ProviderStatus.SUCCESS,
+            score=1.0,
+            flags=[
+                ComplianceFlag(
+                    flag_name="Sanctions_List_Match",
+                    category="Sanctions",
+                    value=f"{match.list_name}: {match.name or match.identifier}" + (f" ({match.program})" if match.program else ""),
+                    severity=1.0,
+                )
+                for match in matches
+            ],
+            message=f"Identifier listed in {', '.join(sorted({match.list_name for match in matches}))}.",
+        )
+
+    def _name_result(self, index: SanctionsIndex, name: str) -> ExternalProviderResult:
+        """
+        Fuzzy name screening. Names are not unique, so matches are reported as watchlist
+        flags (manual review) with the similarity as severity, never as a sanctions hit.
+        """
+        matches = index.names.search(
+            name,
+            threshold=settings.SANCTIONS_NAME_MATCH_THRESHOLD,
+            max_candidates=settings.SANCTIONS_NAME_MAX_CANDIDATES,
+        )
+        flags = []
+        for similarity, listed_name, entries in matches:
+            for list_name in sorted({entry.list_name for entry in entries}):
+                flags.append(
+                    ComplianceFlag(
+                        flag_name=WATCHLIST_NAME_MATCH_FLAG,
+                        category="Watchlist",
+                        value=f"{list_name}: {listed_name} (similarity {similarity:.2f})",
+                        severity=round(similarity, 4),
+                        listed_name=listed_name,
+                    )
+                )
+        return ExternalProviderResult(
+            provider_name=self.name,
+            status=ProviderStatus.SUCCESS,
+            score=round(matches[0][0], 4) if matches else 0.0,
+            flags=flags,
+            message=(
+                f"{len(matches)} similar listed names." if matches else f"No similar name in local sanctions lists (version {index.version[:12]})."
+            ),
+        )
+
+
+def build_provider_adapters(configs: Optional[List[Dict[str, Any]]] = None) -> List[ProviderAdapter]:
+    """
+    Instantiates the configured providers, e.g.
+    `[{"name": "Chainalysis", "kind": "http", "base_url": "https://..."}]`; extra keys are
+    passed to the adapter. The local sanctions lists provider is added whenever
+    `SANCTIONS_LIST_PATHS` is set.
+    """
+    if configs is None:
+        configs = list(settings.SHERLOCK_PROVIDERS)
+        if settings.SANCTIONS_LIST_PATHS and not any(c.get("kind") == SanctionsListAdapter.kind for c in configs):
+            configs.insert(0, {"name": "Local Sanctions Lists", "kind": SanctionsListAdapter.kind})
+    adapters = []
+    for config in configs:
+        options = dict(config)
+        kind = options.pop("kind")
+        if kind not in PROVIDER_ADAPTERS:
+            raise ValueError(f"Unknown Sherlock provider kind '{kind}'.")
+        adapters.append(PROVIDER_ADAPTERS[kind](**options))
+    return adapters
@@ -0,0 +1,357 @@
+import asyncio
+import gzip
+import json
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from bson import Binary
+from fastapi import HTTPException, status
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING, ReplaceOne
+from pymongo.errors import DuplicateKeyError
+
+from app.config import settings
+from app.database import get_collection
+from app.models.sherlock import (
+    RequestPriority,
+    SherlockBatchJobStatus,
+    SherlockRescreenJob,
+    SherlockValidationInput,
+)
+from app.services.sherlock_service import SherlockService
+from app.utils.sanctions_index import SanctionsIndex, SanctionsListDiff, SanctionsListSnapshot
+
+_STATE_ID = "sanctions_lists"
+
+
+class SherlockRescreenService:
+    """
+    Re-screens stored entities when a new sanctions list version is loaded.
+
+    Only entities the diff between the two versions can affect are visited: those whose
+    identifier was added, removed or re-listed, found with `entity_key $in` lookups (results
+    store their `entity_id` normalized like list identifiers), and those flagged with a name
+    match on a listed name that was removed, found by the flags' `listed_name`. They are
+    re-validated at `backfill` quota priority by `SANCTIONS_RESCREEN_WORKERS` workers, and a
+    new result is stored only when the sanction status or suggested action changed.
+    Newly listed names are not matched here (name matching is fuzzy and cannot be looked up
+    by `entity_id`); those entities pick the change up on their next validation.
+
+    `sherlock_rescreen_state` records the last list version re-screened for, whose snapshot
+    is kept in `sherlock_rescreen_snapshots` (split into documents of at most
+    `SANCTIONS_RESCREEN_SNAPSHOT_CHUNK` identifiers or names), so the first load after a
+    restart is diffed against it too. A process claims a new version with a compare-and-swap
+    on the state, so when several API processes load the same change only one starts the job.
+    The recorded version only moves once the job completed: a failed job releases its claim,
+    and the claim of a job whose process died expires after `SANCTIONS_RESCREEN_LEASE_SECONDS`
+    and is taken over by the next load (at the latest, on startup).
+    """
+
+    def __init__(self, sherlock_service: Optional[SherlockService] = None):
+        self.sherlock_service = sherlock_service or SherlockService()
+        self.jobs_collection: Optional[AsyncIOMotorCollection] = None
+        self.state_collection: Optional[AsyncIOMotorCollection] = None
+        self.snapshots_collection: Optional[AsyncIOMotorCollection] = None
+        self.lease_seconds = settings.SANCTIONS_RESCREEN_LEASE_SECONDS
+        self.last_job_id: Optional[str] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._snapshot_indexes_ready = False
+
+    def _get_jobs_collection(self) -> AsyncIOMotorCollection:
+        if self.jobs_collection is None:
+            self.jobs_collection = get_collection("sherlock_rescreen_jobs")
+        return self.jobs_collection
+
+    def _get_state_collection(self) -> AsyncIOMotorCollection:
+        if self.state_collection is None:
+            self.state_collection = get_collection("sherlock_rescreen_state")
+        return self.state_collection
+
+    def _get_snapshots_collection(self) -> AsyncIOMotorCollection:
+        if self.snapshots_collection is None:
+            self.snapshots_collection = get_collection("sherlock_rescreen_snapshots")
+        return self.snapshots_collection
+
+    def _claim_until(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+
+    async def on_sanctions_reload(
+        self, previous: Optional[SanctionsIndex], current: SanctionsIndex
+    ) -> Optional[SherlockRescreenJob]:
+        """
+        `SanctionsIndexStore` listener. Diffs `current` against the persisted snapshot
+        (`previous` is only the one this process loaded); the very first version is just recorded.
+        """
+        if not settings.SANCTIONS_RESCREEN_ENABLED:
+            return None
+        states = self._get_state_collection()
+        state = await states.find_one({"_id": _STATE_ID})
+        if state is not None and state["version"] == current.version:
+            return None
+        snapshot = await asyncio.to_thread(current.snapshot)
+        if state is None:
+            await self._store_snapshot(snapshot)
+            try:
+                await states.insert_one(
+                    {"_id": _STATE_ID, "version": snapshot.version, "updated_at": datetime.utcnow()}
+                )
+            except DuplicateKeyError:
+                pass  # recorded by another process
+            return None
+
+        now = datetime.utcnow()
+        job_id = uuid.uuid4().hex
+        claimed = await states.find_one_and_update(
+            {
+                "_id": _STATE_ID,
+                "version": state["version"],
+                "$or": [
+                    {"pending_job_id": None},
+                    {"pending_until": {"$lt": now}},
+                    {"pending_version": {"$ne": current.version}},  # a newer version supersedes the claim
+                ],
+            },
+            {
+                "$set": {
+                    "pending_version": current.version,
+                    "pending_job_id": job_id,
+                    "pending_until": self._claim_until(),
+                }
+            },
+        )
+        if claimed is None:
+            return None  # another process took this change
+        if claimed.get("pending_job_id") and claimed["pending_until"] < now:
+            await self._fail_interrupted_job(claimed["pending_job_id"])
+        if claimed.get("pending_version") not in (None, current.version):
+            await self._get_snapshots_collection().delete_many({"version": claimed["pending_version"]})
+
+        try:
+            await self._store_snapshot(snapshot)
+            recorded = await self._load_snapshot(state["version"])
+            diff = await asyncio.to_thread(snapshot.diff, recorded)
+        except Exception:
+            await self._release_claim(job_id)
+            raise
+        if not diff:
+            await self._advance(job_id, state["version"], current.version)
+            return None
+        return await self.start_job(job_id, diff, state["version"], current.version)
+
+    async def start_job(
+        self, job_id: str, diff: SanctionsListDiff, previous_version: str, list_version: str
+    ) -> SherlockRescreenJob:
+        job = SherlockRescreenJob(
+            id=job_id,
+            previous_version=previous_version,
+            list_version=list_version,
+            changed_identifiers=len(diff.changed_identifiers),
+            removed_names=len(diff.removed_names),
+        )
+        await self._get_jobs_collection().insert_one(job.model_dump(by_alias=True))
+        self.last_job_id = job.id
+        task = asyncio.create_task(self._run(job.id, diff, previous_version, list_version))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+        return job
+
+    async def _store_snapshot(self, snapshot: SanctionsListSnapshot) -> None:
+        """Writes the snapshot's documents; rewriting a version (after a takeover) replaces them in place."""
+        collection = self._get_snapshots_collection()
+        if not self._snapshot_indexes_ready:
+            await collection.create_index([("version", ASCENDING), ("index", ASCENDING)])
+            self._snapshot_indexes_ready = True
+        documents = await asyncio.to_thread(_encode_snapshot, snapshot)
+        if not documents:
+            return  # empty lists
+        await collection.bulk_write(
+            [ReplaceOne({"_id": document["_id"]}, document, upsert=True) for document in documents], ordered=False
+        )
+
+    async def _load_snapshot(self, version: str) -> SanctionsListSnapshot:
+        cursor = self._get_snapshots_collection().find({"version": version}).sort("index", ASCENDING)
+        return await asyncio.to_thread(_decode_snapshot, version, await cursor.to_list(length=None))
+
+    async def _advance(self, job_id: str, previous_version: str, list_version: str) -> None:
+        """Records `list_version` as re-screened for, unless a newer version superseded this job's claim."""
+        advanced = await self._get_state_collection().update_one(
+            {"_id": _STATE_ID, "pending_job_id": job_id},
+            {
+                "$set": {"version": list_version, "updated_at": datetime.utcnow()},
+                "$unset": {"pending_version": "", "pending_job_id": "", "pending_until": ""},
+            },
+        )
+        if advanced.modified_count and previous_version != list_version:
+            await self._get_snapshots_collection().delete_many({"version": previous_version})
+
+    async def _release_claim(self, job_id: str) -> None:
+        await self._get_state_collection().update_one(
+            {"_id": _STATE_ID, "pending_job_id": job_id},
+            {"$unset": {"pending_version": "", "pending_job_id": "", "pending_until": ""}},
+        )
+
+    async def _renew_claim(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self._get_state_collection().update_one(
+                    {"_id": _STATE_ID, "pending_job_id": job_id}, {"$set": {"pending_until": self._claim_until()}}
+                )
+            except Exception as e:
+                print(f"Failed to renew the claim of Sherlock re-screening job {job_id}: {e}")
+
+    async def _fail_interrupted_job(self, job_id: str) -> None:
+        await self._get_jobs_collection().update_one(
+            {
+                "_id": job_id,
+                "status": {"$in": [SherlockBatchJobStatus.PENDING.value, SherlockBatchJobStatus.RUNNING.value]},
+            },
+            {
+                "$set": {
+                    "status": SherlockBatchJobStatus.FAILED.value,
+                    "error": "Interrupted: the process running the job stopped.",
+                    "completed_at": datetime.utcnow(),
+                }
+            },
+        )
+
+    async def get_job(self, job_id: str) -> SherlockRescreenJob:
+        job_doc = await self._get_jobs_collection().find_one({"_id": job_id})
+        if job_doc is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Re-screening job '{job_id}' not found.")
+        return SherlockRescreenJob(**job_doc)
+
+    async def _run(self, job_id: str, diff: SanctionsListDiff, previous_version: str, list_version: str) -> None:
+        jobs = self._get_jobs_collection()
+        await jobs.update_one({"_id": job_id}, {"$set": {"status": SherlockBatchJobStatus.RUNNING.value}})
+        claim = asyncio.create_task(self._renew_claim(job_id))
+        queue: asyncio.Queue = asyncio.Queue(maxsize=settings.SANCTIONS_RESCREEN_WORKERS * 4)
+        workers = [asyncio.create_task(self._worker(job_id, queue)) for _ in range(settings.SANCTIONS_RESCREEN_WORKERS)]
+        try:
+            await self.sherlock_service.backfill_entity_keys()
+            await self.sherlock_service.backfill_listed_names()
+            candidates = 0
+            async for entity in self._affected_entities(diff):
+                candidates += 1
+                await queue.put(entity)
+            await jobs.update_one({"_id": job_id}, {"$set": {"candidates": candidates}})
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+            await self._advance(job_id, previous_version, list_version)
+            await jobs.update_one(
+                {"_id": job_id},
+                {"$set": {"status": SherlockBatchJobStatus.COMPLETED.value, "completed_at": datetime.utcnow()}},
+            )
+        except Exception as e:
+            for worker in workers:
+                worker.cancel()
+            print(f"Sherlock re-screening job {job_id} failed: {e}")
+            await self._release_claim(job_id)
+            await jobs.update_one(
+                {"_id": job_id},
+                {
+                    "$set": {
+                        "status": SherlockBatchJobStatus.FAILED.value,
+                        "error": str(e),
+                        "completed_at": datetime.utcnow(),
+                    }
+                },
+            )
+        finally:
+            claim.cancel()
+
+    async def _affected_entities(self, diff: SanctionsListDiff) -> AsyncIterator[SherlockValidationInput]:
+        """Distinct stored `(entity_id, entity_type)` pairs the diff can affect."""
+        collection = self.sherlock_service._get_collection()
+        seen: Set[Tuple[str, str]] = set()
+
+        keys = sorted(diff.changed_identifiers)
+        chunk_size = settings.SANCTIONS_RESCREEN_QUERY_CHUNK
+        for start in range(0, len(keys), chunk_size):
+            cursor = collection.find(
+                {
+                    "entity_key": {"$in": keys[start : start + chunk_size]},
+                    "entity_type": {"$nin": settings.SANCTIONS_NAME_ENTITY_TYPES},
+                },
+                {"entity_id": 1, "entity_type": 1},
+            )
+            async for doc in cursor:
+                pair = (doc["entity_id"], doc["entity_type"])
+                if pair not in seen:
+                    seen.add(pair)
+                    yield SherlockValidationInput(entity_id=pair[0], entity_type=pair[1])
+
+        names = sorted(diff.removed_names)
+        for start in range(0, len(names), chunk_size):
+            cursor = collection.find(
+                {"sherlock_flags.listed_name": {"$in": names[start : start + chunk_size]}},
+                {"entity_id": 1, "entity_type": 1},
+            )
+            async for doc in cursor:
+                pair = (doc["entity_id"], doc["entity_type"])
+                if pair not in seen:
+                    seen.add(pair)
+                    yield SherlockValidationInput(entity_id=pair[0], entity_type=pair[1])
+
+    async def _worker(self, job_id: str, queue: asyncio.Queue) -> None:
+        jobs = self._get_jobs_collection()
+        while True:
+            entity = await queue.get()
+            if entity is None:
+                return
+            changed = failed = 0
+            try:
+                changed = int(await self._rescreen(job_id, entity))
+            except Exception as e:
+                print(f"Failed to re-screen {entity.entity_type} {entity.entity_id}: {e}")
+                failed = 1
+            await jobs.update_one({"_id": job_id}, {"$inc": {"processed": 1, "changed": changed, "failed": failed}})
+
+    async def _rescreen(self, job_id: str, entity: SherlockValidationInput) -> bool:
+        """Re-validates the entity; stores the result and returns True only if the verdict changed."""
+        service = self.sherlock_service
+        latest = await service._get_collection().find_one(
+            {"entity_id": entity.entity_id, "entity_type": entity.entity_type},
+            {"overall_sanction_status": 1, "suggested_action": 1},
+            sort=[("created_at", -1)],
+        )
+        result = await service.screen(entity, RequestPriority.BACKFILL)
+        if (
+            latest is not None
+            and latest.get("overall_sanction_status") == result.overall_sanction_status.value
+            and latest.get("suggested_action") == result.suggested_action
+        ):
+            return False
+        result.rescreen_job_id = job_id
+        await service.store_results([result])
+        return True
+
+
+def _encode_snapshot(snapshot: SanctionsListSnapshot) -> List[Dict[str, Any]]:
+    """Splits the snapshot into gzip-compressed documents of at most `SANCTIONS_RESCREEN_SNAPSHOT_CHUNK` entries."""
+    chunk_size = settings.SANCTIONS_RESCREEN_SNAPSHOT_CHUNK
+    identifiers = sorted(snapshot.identifiers.items())
+    names = sorted(snapshot.names)
+    parts = [{"identifiers": dict(identifiers[i : i + chunk_size])} for i in range(0, len(identifiers), chunk_size)]
+    parts += [{"names": names[i : i + chunk_size]} for i in range(0, len(names), chunk_size)]
+    return [
+        {
+            "_id": f"{snapshot.version}:{index}",
+            "version": snapshot.version,
+            "index": index,
+            "data": Binary(gzip.compress(json.dumps(part, separators=(",", ":")).encode("utf-8"))),
+        }
+        for index, part in enumerate(parts)
+    ]
+
+
+def _decode_snapshot(version: str, documents: List[Dict[str, Any]]) -> SanctionsListSnapshot:
+    identifiers: Dict[str, str] = {}
+    names: Set[str] = set()
+    for document in documents:
+        part = json.loads(gzip.decompress(document["data"]))
+        identifiers.update(part.get("identifiers", {}))
+        names.update(part.get("names", []))
+    return SanctionsListSnapshot(version, identifiers, names)
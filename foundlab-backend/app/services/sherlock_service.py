@@ -1,107 +1,525 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import re
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
 
+from bson import Binary
 from fastapi import HTTPException, status
 from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
 
+from app.config import settings
 from app.database import get_collection
 from app.models.sherlock import (
     ComplianceFlag,
     ExternalProviderResult,
     ProviderStatus,
+    RequestPriority,
     SanctionStatus,
     SherlockValidationInput,
     SherlockValidationResult,
 )
+from app.services.sherlock_providers import WATCHLIST_NAME_MATCH_FLAG, ProviderAdapter, build_provider_adapters
+from app.utils.circuit_breaker import CircuitBreaker, provider_guards
+from app.utils.latency_tracker import LatencyTracker
+from app.utils.provider_cache import provider_cache_key, provider_result_cache
+from app.utils.provider_scheduler import provider_schedulers
+from app.utils.sanctions_index import normalize_identifier
+
+ProviderCheck = Callable[[str, str], Awaitable[ExternalProviderResult]]
+
+# `value` of the name-match flags stored before they had `listed_name`.
+_LEGACY_NAME_MATCH_VALUE = re.compile(r"^[^:]*: (?P<name>.*) \(similarity [0-9.]+\)$")
+
+
+def verdict_hash(result: SherlockValidationResult) -> str:
+    """
+    Identifies what a validation concluded: sanction status, risk score, flags and each
+    provider's status. Provider messages, raw responses and cache ages are left out.
+    """
+    verdict = {
+        "status": result.overall_sanction_status.value,
+        "score": round(result.overall_risk_score, 6),
+        "action": result.suggested_action,
+        "flags": sorted(
+            [flag.flag_name, flag.category, str(flag.value), round(flag.severity, 6)] for flag in result.sherlock_flags
+        ),
+        "providers": sorted([res.provider_name, res.status.value] for res in result.provider_results),
+    }
+    return hashlib.sha256(json.dumps(verdict, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
 
 
 class SherlockService:
     def __init__(self):
         self.validation_results_collection: Optional[AsyncIOMotorCollection] = None
+        self.raw_responses_collection: Optional[AsyncIOMotorCollection] = None
+        self._indexes_ready = False
+        adapters = build_provider_adapters()
+        # Provider name -> check. Local providers (in-memory lists) run first; remote ones are
+        # called concurrently by `validate_entity`.
+        self.local_providers: Dict[str, ProviderCheck] = {
+            adapter.name: adapter.check for adapter in adapters if adapter.local
+        }
+        self.providers: Dict[str, ProviderCheck] = {
+            adapter.name: adapter.check for adapter in adapters if not adapter.local
+        }
+        # Remote providers with a batch API, used by bulk validation.
+        self.batch_providers: Dict[str, ProviderAdapter] = {
+            adapter.name: adapter for adapter in adapters if not adapter.local and adapter.batch_size > 0
+        }
+        self.latencies = LatencyTracker(
+            max_samples=settings.SHERLOCK_LATENCY_SAMPLES, min_samples=settings.SHERLOCK_HEDGE_MIN_SAMPLES
+        )
 
     def _get_collection(self) -> AsyncIOMotorCollection:
         if self.validation_results_collection is None:
             self.validation_results_collection = get_collection("sherlock_results")
         return self.validation_results_collection
 
-    async def _mock_chainalysis_check(self, entity_id: str, entity_type: str) -> ExternalProviderResult:
-        flags: List[ComplianceFlag] = []
-        score = 0.1
-        status_val = ProviderStatus.SUCCESS
-        message = "No significant issues found by Chainalysis."
-
-        if "sanctioned_entity" in entity_id.lower() or "ofac_test" in entity_id.lower():
-            flags.append(ComplianceFlag(flag_name="OFAC_SDN_Match", category="Sanctions", value="Direct hit", severity=1.0))
-            score = 1.0
-            message = "Entity directly linked to OFAC SDN list."
-        elif "dark_market_exposure" in entity_id.lower():
-            flags.append(ComplianceFlag(flag_name="Dark_Market_Involvement", category="Illicit Activities", value="Indirect exposure", severity=0.85))
-            flags.append(ComplianceFlag(flag_name="High_Risk_DEX_Usage", category="DeFi & Exchanges", value="Extensive DEX only activity", severity=0.6))
-            score = 0.85
-            message = "Entity has exposure to dark market transactions."
-        elif "high_volume_gambling" in entity_id.lower():
-            flags.append(ComplianceFlag(flag_name="High_Intensity_Gambling", category="AML", value="Frequent large transfers to gambling sites", severity=0.7))
-            score = 0.7
-            message = "High volume of transactions with known gambling services."
-        elif "under_investigation" in entity_id.lower():
-            status_val = ProviderStatus.PENDING
-            message = "Entity is currently under investigation, manual review required."
-            score = 0.5
-        elif "mixer_usage" in entity_id.lower():
-            flags.append(ComplianceFlag(flag_name="Crypto_Mixer_Usage", category="Privacy Enhancing", value="Observed interaction with CoinJoin/mixers", severity=0.75))
-            score = 0.75
-            message = "Transaction history includes interaction with cryptocurrency mixers."
-
-        return ExternalProviderResult(
-            provider_name="Chainalysis",
-            status=status_val,
-            score=score,
-            flags=flags,
-            message=message,
-        )
+    def _get_raw_responses_collection(self) -> AsyncIOMotorCollection:
+        if self.raw_responses_collection is None:
+            self.raw_responses_collection = get_collection("sherlock_raw_responses")
+        return self.raw_responses_collection
+
+    async def ensure_indexes(self) -> None:
+        """`entity_id` lookups (history, latest verdict), plus the `entity_key`s and listed names re-screening reads."""
+        if self._indexes_ready:
+            return
+        collection = self._get_collection()
+        await collection.create_index([("entity_id", ASCENDING), ("created_at", DESCENDING)])
+        await collection.create_index("entity_key")
+        await collection.create_index("sherlock_flags.flag_name", sparse=True)
+        await collection.create_index("sherlock_flags.listed_name", sparse=True)
+        self._indexes_ready = True
+
+    async def backfill_entity_keys(self, batch_size: int = 1000) -> int:
+        """Sets `entity_key` on results stored before it existed; returns how many were updated."""
+        await self.ensure_indexes()
+        collection = self._get_collection()
+        updated = 0
+        while True:
+            cursor = collection.find({"entity_key": None}, {"entity_id": 1}).limit(batch_size)
+            documents = await cursor.to_list(length=None)
+            if not documents:
+                return updated
+            await collection.bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": document["_id"]}, {"$set": {"entity_key": normalize_identifier(document["entity_id"])}}
+                    )
+                    for document in documents
+                ],
+                ordered=False,
+            )
+            updated += len(documents)
+
+    async def backfill_listed_names(self, batch_size: int = 1000) -> int:
+        """Sets `listed_name` on name-match flags stored before flags had it; returns how many results were updated."""
+        await self.ensure_indexes()
+        collection = self._get_collection()
+        query = {"sherlock_flags": {"$elemMatch": {"flag_name": WATCHLIST_NAME_MATCH_FLAG, "listed_name": None}}}
+        updated = 0
+        while True:
+            cursor = collection.find(query, {"sherlock_flags": 1}).limit(batch_size)
+            documents = await cursor.to_list(length=None)
+            if not documents:
+                return updated
+            for document in documents:
+                for flag in document["sherlock_flags"]:
+                    if flag["flag_name"] == WATCHLIST_NAME_MATCH_FLAG and flag.get("listed_name") is None:
+                        match = _LEGACY_NAME_MATCH_VALUE.match(str(flag.get("value", "")))
+                        flag["listed_name"] = match.group("name") if match else ""
+            await collection.bulk_write(
+                [
+                    UpdateOne({"_id": document["_id"]}, {"$set": {"sherlock_flags": document["sherlock_flags"]}})
+                    for document in documents
+                ],
+                ordered=False,
+            )
+            updated += len(documents)
+
+    def _provider_timeout(self, provider_name: str) -> float:
+        return settings.SHERLOCK_PROVIDER_TIMEOUTS.get(provider_name, settings.SHERLOCK_PROVIDER_TIMEOUT_SECONDS)
+
+    def _hedge_delay(self, provider_name: str) -> Optional[float]:
+        """The provider's recent p95 latency, or None when hedging is off or there is no history yet."""
+        if not settings.SHERLOCK_HEDGING_ENABLED:
+            return None
+        return self.latencies.percentile(provider_name, settings.SHERLOCK_HEDGE_PERCENTILE)
+
+    async def _hedged_call(
+        self,
+        provider_name: str,
+        check: ProviderCheck,
+        entity_id: str,
+        entity_type: str,
+        priority: RequestPriority = RequestPriority.INTERACTIVE,
+    ) -> ExternalProviderResult:
+        """
+        Calls the provider; if it has not answered after its hedge delay, sends a second
+        request and returns whichever succeeds first. Losing requests are cancelled.
+        The second request takes its own quota token, and is not sent if none is available
+        right away.
+        """
+        primary = asyncio.ensure_future(check(entity_id, entity_type))
+        pending = {primary}
+        try:
+            hedge_delay = self._hedge_delay(provider_name)
+            if hedge_delay is not None:
+                done, _ = await asyncio.wait(pending, timeout=hedge_delay)
+                if not done and provider_schedulers.get(provider_name).try_acquire(priority):
+                    pending.add(asyncio.ensure_future(check(entity_id, entity_type)))
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def call_provider(
+        self,
+        provider_name: str,
+        check: ProviderCheck,
+        entity_id: str,
+        entity_type: str,
+        priority: RequestPriority = RequestPriority.INTERACTIVE,
+    ) -> ExternalProviderResult:
+        """
+        Returns the provider's cached result for the entity if still fresh, or shares the call
+        already in flight for it; otherwise queries the provider.
+        """
+        key = provider_cache_key(provider_name, entity_id, entity_type)
+        shared = await provider_result_cache.get_or_join(key)
+        if shared is not None:
+            return shared
+        return await self._query_provider(provider_name, check, entity_id, entity_type, priority)
+
+    async def _query_provider(
+        self,
+        provider_name: str,
+        check: ProviderCheck,
+        entity_id: str,
+        entity_type: str,
+        priority: RequestPriority = RequestPriority.INTERACTIVE,
+    ) -> ExternalProviderResult:
+        """
+        Runs one provider check under the provider's circuit breaker and bulkhead, within its
+        quota (see `ProviderScheduler`) and under its own timeout. Timeouts and errors become
+        a result, never an exception; an open circuit, a full bulkhead or no quota within the
+        priority class's maximum wait returns `UNAVAILABLE` without calling the provider.
+
+        The call is only shared with concurrent callers (single flight) once it has its quota
+        token, so every caller waits in its own priority class and none of these rejections
+        is cached. A caller whose entity was loaded by another one while it waited gives its
+        token back.
+
+        The quota wait comes first: the bulkhead slot and a half-open circuit's trial slot are
+        only taken once the call can be made, and the token is refunded if either rejects it.
+        """
+        scheduler = provider_schedulers.get(provider_name)
+        if not await scheduler.acquire(priority):
+            return ExternalProviderResult(
+                provider_name=provider_name,
+                status=ProviderStatus.UNAVAILABLE,
+                message=f"{provider_name} quota exhausted; {priority.value} call not scheduled.",
+            )
+        breaker, bulkhead = provider_guards.get(provider_name)
+        if not bulkhead.try_acquire():
+            scheduler.refund()
+            return ExternalProviderResult(
+                provider_name=provider_name,
+                status=ProviderStatus.UNAVAILABLE,
+                message=f"{provider_name} is at its concurrency limit ({bulkhead.max_concurrency} calls in flight).",
+            )
+        try:
+            if not breaker.allow_request():
+                scheduler.refund()
+                return ExternalProviderResult(
+                    provider_name=provider_name,
+                    status=ProviderStatus.UNAVAILABLE,
+                    message=f"{provider_name} circuit is {breaker.state.value}; provider skipped.",
+                )
+
+            called = False
+
+            def load() -> Awaitable[ExternalProviderResult]:
+                nonlocal called
+                called = True
+                return self._timed_provider_call(provider_name, check, entity_id, entity_type, breaker, priority)
+
+            try:
+                return await provider_result_cache.get_or_load(
+                    provider_cache_key(provider_name, entity_id, entity_type), load
+                )
+            finally:
+                if not called:
+                    scheduler.refund()
+                    breaker.cancel()
+        finally:
+            bulkhead.release()
+
+    async def _timed_provider_call(
+        self,
+        provider_name: str,
+        check: ProviderCheck,
+        entity_id: str,
+        entity_type: str,
+        breaker: CircuitBreaker,
+        priority: RequestPriority = RequestPriority.INTERACTIVE,
+    ) -> ExternalProviderResult:
+        timeout = self._provider_timeout(provider_name)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            result = await asyncio.wait_for(
+                self._hedged_call(provider_name, check, entity_id, entity_type, priority), timeout
+            )
+        except asyncio.TimeoutError:
+            breaker.record(failed=True, duration_seconds=loop.time() - started)
+            return ExternalProviderResult(
+                provider_name=provider_name,
+                status=ProviderStatus.UNAVAILABLE,
+                message=f"{provider_name} did not respond within {timeout:g}s.",
+            )
+        except Exception as e:
+            breaker.record(failed=True, duration_seconds=loop.time() - started)
+            return ExternalProviderResult(
+                provider_name=provider_name,
+                status=ProviderStatus.FAILED,
+                message=f"{provider_name} check failed: {e}",
+            )
+        elapsed = loop.time() - started
+        breaker.record(failed=False, duration_seconds=elapsed)
+        self.latencies.record(provider_name, elapsed)
+        return result
 
-    async def _mock_trm_labs_check(self, entity_id: str, entity_type: str) -> ExternalProviderResult:
-        flags: List[ComplianceFlag] = []
-        score = 0.05
-        status_val = ProviderStatus.SUCCESS
-        message = "No red flags from TRM Labs."
-
-        if "terror_finance_org" in entity_id.lower() or "cft_listed" in entity_id.lower():
-            flags.append(ComplianceFlag(flag_name="CFT_List_Match", category="Terrorist Financing", value="Match on CFT watchlist", severity=0.98))
-            score = 0.98
-            message = "Entity found on Counter-Terrorism Financing watchlist."
-        elif "pep_exposed" in entity_id.lower():
-            flags.append(ComplianceFlag(flag_name="PEP_Exposure", category="AML", value="Politically Exposed Person", severity=0.6))
-            score = 0.6
-            message = "Entity flagged as Politically Exposed Person."
-        elif "sanctioned_entity" in entity_id.lower():
-            flags.append(ComplianceFlag(flag_name="Global_Sanctions_Match", category="Sanctions", value="International sanctions list", severity=0.95))
-            score = 0.95
-            message = "Entity found on global sanctions lists."
-        elif "high_risk_jurisdiction" in entity_id.lower():
-            flags.append(ComplianceFlag(flag_name="High_Risk_Jurisdiction_Link", category="Geographic Risk", value="Tied to known high-risk region", severity=0.8))
-            score = 0.8
-            message = "Entity linked to a high-risk jurisdiction."
-
-        return ExternalProviderResult(
-            provider_name="TRM Labs",
-            status=status_val,
-            score=score,
-            flags=flags,
-            message=message,
+    async def query_provider_batch(
+        self,
+        provider_name: str,
+        adapter: ProviderAdapter,
+        entities: Sequence[Tuple[str, str]],
+        priority: RequestPriority = RequestPriority.BATCH,
+    ) -> List[ExternalProviderResult]:
+        """
+        One batch request to the provider (one quota token) under its timeout, circuit breaker
+        and bulkhead, taken in that order after the quota wait as in `_query_provider`. A failed
+        request yields one FAILED / UNAVAILABLE result per entity; fresh results are cached.
+        """
+        def unavailable(status_val: ProviderStatus, message: str) -> List[ExternalProviderResult]:
+            return [ExternalProviderResult(provider_name=provider_name, status=status_val, message=message) for _ in entities]
+
+        scheduler = provider_schedulers.get(provider_name)
+        if not await scheduler.acquire(priority):
+            return unavailable(ProviderStatus.UNAVAILABLE, f"{provider_name} quota exhausted; {priority.value} call not scheduled.")
+        breaker, bulkhead = provider_guards.get(provider_name)
+        if not bulkhead.try_acquire():
+            scheduler.refund()
+            return unavailable(ProviderStatus.UNAVAILABLE, f"{provider_name} is at its concurrency limit.")
+        try:
+            if not breaker.allow_request():
+                scheduler.refund()
+                return unavailable(ProviderStatus.UNAVAILABLE, f"{provider_name} circuit is {breaker.state.value}; provider skipped.")
+            timeout = self._provider_timeout(provider_name)
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            try:
+                results = await asyncio.wait_for(adapter.check_batch(entities), timeout)
+            except asyncio.TimeoutError:
+                breaker.record(failed=True, duration_seconds=loop.time() - started)
+                return unavailable(ProviderStatus.UNAVAILABLE, f"{provider_name} did not respond within {timeout:g}s.")
+            except Exception as e:
+                breaker.record(failed=True, duration_seconds=loop.time() - started)
+                return unavailable(ProviderStatus.FAILED, f"{provider_name} batch check failed: {e}")
+            breaker.record(failed=False, duration_seconds=loop.time() - started)
+        finally:
+            bulkhead.release()
+
+        for (entity_id, entity_type), result in zip(entities, results):
+            provider_result_cache.put(provider_cache_key(provider_name, entity_id, entity_type), result)
+        return results
+
+    async def _query_local_provider(self, provider_name: str, check: ProviderCheck, entity_id: str, entity_type: str) -> ExternalProviderResult:
+        try:
+            return await check(entity_id, entity_type)
+        except Exception as e:
+            return ExternalProviderResult(
+                provider_name=provider_name,
+                status=ProviderStatus.FAILED,
+                message=f"{provider_name} check failed: {e}",
+            )
+
+    def local_results_are_final(self, local_results: List[ExternalProviderResult], entity_type: str) -> bool:
+        """
+        A local sanctions hit already decides the outcome (block), so remote providers are not
+        called. A clean local answer is only final for `SANCTIONS_LIST_SHORT_CIRCUIT_ENTITY_TYPES`,
+        and fuzzy name matches never are.
+        """
+        if not local_results:
+            return False
+        if any(flag.category == "Sanctions" for res in local_results for flag in res.flags):
+            return True
+        if any(res.flags for res in local_results):
+            return False
+        return entity_type in settings.SANCTIONS_LIST_SHORT_CIRCUIT_ENTITY_TYPES and all(
+            res.status == ProviderStatus.SUCCESS for res in local_results
         )
 
+    async def screen_locally(self, validation_input: SherlockValidationInput) -> List[ExternalProviderResult]:
+        return [
+            await self._query_local_provider(name, check, validation_input.entity_id, validation_input.entity_type)
+            for name, check in self.local_providers.items()
+        ]
+
+    async def screen(
+        self, validation_input: SherlockValidationInput, priority: RequestPriority = RequestPriority.INTERACTIVE
+    ) -> SherlockValidationResult:
+        """Screens the entity with every provider and aggregates the verdict, without storing it."""
+        provider_results = await self.screen_locally(validation_input)
+        # Remote providers are queried concurrently, so latency follows the slowest provider
+        # (capped by its timeout) rather than the sum of all of them. Providers behind an open
+        # circuit answer UNAVAILABLE immediately, and the result is degraded to manual review.
+        if not self.local_results_are_final(provider_results, validation_input.entity_type):
+            provider_results += await asyncio.gather(
+                *(
+                    self.call_provider(name, check, validation_input.entity_id, validation_input.entity_type, priority)
+                    for name, check in self.providers.items()
+                )
+            )
+        return self.aggregate(validation_input, provider_results)
+
     async def validate_entity(self, validation_input: SherlockValidationInput) -> SherlockValidationResult:
-        provider_results: List[ExternalProviderResult] = []
+        """
+        Screens the entity and stores the result only if its verdict differs from the
+        entity's latest stored one. Otherwise the latest document just gets `last_checked_at`
+        and `check_count` bumped, and is what the returned result's `id` points to.
+        """
+        result = await self.screen(validation_input)
+        result.verdict_hash = verdict_hash(result)
+        await self.ensure_indexes()
+        collection = self._get_collection()
+        latest = await collection.find_one(
+            {"entity_id": result.entity_id, "entity_type": result.entity_type},
+            {"verdict_hash": 1},
+            sort=[("created_at", -1)],
+        )
+        if latest is not None and latest.get("verdict_hash") == result.verdict_hash:
+            touched = await collection.find_one_and_update(
+                {"_id": latest["_id"]},
+                {"$set": {"last_checked_at": result.created_at, "updated_at": result.created_at}, "$inc": {"check_count": 1}},
+                projection={"created_at": 1, "check_count": 1, "last_checked_at": 1},
+                return_document=ReturnDocument.AFTER,
+            )
+            if touched is not None:
+                # Provider details (messages, raw responses) are those of this validation.
+                result.id = str(touched["_id"])
+                result.created_at = touched["created_at"]
+                result.last_checked_at = touched["last_checked_at"]
+                result.check_count = touched["check_count"]
+                return result
+
+        (inserted_id,) = await self.store_results([result])
+        if not inserted_id:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to save Sherlock validation result.",
+            )
+        # The stored document only references the raw provider responses; the caller still
+        # gets them inline with the fresh result.
+        result.id = inserted_id
+        return result
+
+    async def store_results(self, results: List[SherlockValidationResult]) -> List[Any]:
+        """
+        Inserts the results with their raw provider responses moved to `sherlock_raw_responses`:
+        gzip-compressed, keyed by the SHA-256 of their canonical JSON so identical payloads are
+        stored once, and referenced from `raw_response_ref`. Returns the inserted IDs.
+        """
+        raw_documents: Dict[str, Dict[str, Any]] = {}
+        documents = []
+        for result in results:
+            result.verdict_hash = result.verdict_hash or verdict_hash(result)
+            result.entity_key = result.entity_key or normalize_identifier(result.entity_id)
+            result.last_checked_at = result.last_checked_at or result.created_at
+            for provider_result in result.provider_results:
+                if provider_result.raw_response is None:
+                    continue
+                canonical = json.dumps(
+                    provider_result.raw_response, sort_keys=True, separators=(",", ":"), default=str
+                ).encode("utf-8")
+                content_hash = hashlib.sha256(canonical).hexdigest()
+                provider_result.raw_response_ref = content_hash
+                if content_hash not in raw_documents:
+                    compressed = gzip.compress(canonical, compresslevel=6)
+                    raw_documents[content_hash] = {
+                        "encoding": "gzip",
+                        "data": Binary(compressed),
+                        "size": len(canonical),
+                        "compressed_size": len(compressed),
+                        "created_at": datetime.utcnow(),
+                    }
+            documents.append(
+                result.model_dump(by_alias=True, exclude={"id": True, "provider_results": {"__all__": {"raw_response"}}})
+            )
 
-        chainalysis_result = await self._mock_chainalysis_check(validation_input.entity_id, validation_input.entity_type)
-        provider_results.append(chainalysis_result)
+        if raw_documents:
+            await self._get_raw_responses_collection().bulk_write(
+                [
+                    UpdateOne({"_id": content_hash}, {"$setOnInsert": raw_document}, upsert=True)
+                    for content_hash, raw_document in raw_documents.items()
+                ],
+                ordered=False,
+            )
+        collection = self._get_collection()
+        if len(documents) == 1:
+            return [str((await collection.insert_one(documents[0])).inserted_id)]
+        inserted = await collection.insert_many(documents, ordered=False)
+        return [str(inserted_id) for inserted_id in inserted.inserted_ids]
 
-        trm_labs_result = await self._mock_trm_labs_check(validation_input.entity_id, validation_input.entity_type)
-        provider_results.append(trm_labs_result)
+    async def find_results(
+        self, query: Dict[str, Any], sort: List[Tuple[str, int]], skip: int = 0, limit: int = 0, include_raw: bool = False
+    ) -> List[SherlockValidationResult]:
+        """
+        Reads stored results without raw provider responses (also dropping the inline ones of
+        older documents), or with them re-inflated from `sherlock_raw_responses` in one query.
+        """
+        projection = None if include_raw else {"provider_results.raw_response": 0}
+        cursor = self._get_collection().find(query, projection).sort(sort).skip(skip)
+        if limit:
+            cursor = cursor.limit(limit)
+        documents = await cursor.to_list(length=None)
+        if include_raw:
+            refs = {
+                provider_document["raw_response_ref"]
+                for document in documents
+                for provider_document in document.get("provider_results", [])
+                if provider_document.get("raw_response_ref")
+            }
+            raw_responses = {}
+            if refs:
+                async for raw_document in self._get_raw_responses_collection().find({"_id": {"$in": list(refs)}}):
+                    raw_responses[raw_document["_id"]] = json.loads(gzip.decompress(raw_document["data"]))
+            for document in documents:
+                for provider_document in document.get("provider_results", []):
+                    ref = provider_document.get("raw_response_ref")
+                    if ref in raw_responses:
+                        provider_document["raw_response"] = raw_responses[ref]
+        return [SherlockValidationResult(**document) for document in documents]
 
+    def aggregate(
+        self, validation_input: SherlockValidationInput, provider_results: List[ExternalProviderResult]
+    ) -> SherlockValidationResult:
+        """Combines the provider results into the overall sanction status, risk score and action."""
         overall_risk_score = 0.0
-        overall_sanction_status = SanctionStatus.UNKNOWN if any(res.status == ProviderStatus.PENDING for res in provider_results) else SanctionStatus.CLEAN
+        # A provider that is pending, timed out or failed leaves the entity unverified.
+        overall_sanction_status = SanctionStatus.UNKNOWN if any(res.status != ProviderStatus.SUCCESS for res in provider_results) else SanctionStatus.CLEAN
         sherlock_flags: List[ComplianceFlag] = []
 
         sanction_or_cft_flag_detected = False
@@ -135,7 +553,7 @@ class SherlockService:
         elif overall_sanction_status in [SanctionStatus.HIGH_RISK, SanctionStatus.UNKNOWN]:
             suggested_action = "review_manual"
 
-        result = SherlockValidationResult(
+        return SherlockValidationResult(
             entity_id=validation_input.entity_id,
             entity_type=validation_input.entity_type,
             overall_sanction_status=overall_sanction_status,
@@ -145,21 +563,5 @@ class SherlockService:
             suggested_action=suggested_action,
         )
 
-        collection = self._get_collection()
-        inserted_result = await collection.insert_one(result.model_dump(by_alias=True))
-        if not inserted_result.inserted_id:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to save Sherlock validation result.",
-            )
-
-        new_result = await collection.find_one({"_id": inserted_result.inserted_id})
-        return SherlockValidationResult(**new_result)
-
-    async def get_validation_results_by_entity_id(self, entity_id: str) -> List[SherlockValidationResult]:
-        collection = self._get_collection()
-        results = []
-        cursor = collection.find({"entity_id": entity_id}).sort("created_at", -1)
-        async for result_doc in cursor:
-            results.append(SherlockValidationResult(**result_doc))
-        return results
+    async def get_validation_results_by_entity_id(self, entity_id: str, include_raw: bool = False) -> List[SherlockValidationResult]:
+        return await self.find_results({"entity_id": entity_id}, [("created_at", -1)], include_raw=include_raw)
@@ -0,0 +1,55 @@
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.config import settings
+from app.models.risk import RiskAssessmentResult
+
+# (score_id, trigger_set_version, context_hash)
+AssessmentKey = Tuple[str, str, str]
+
+
+def context_hash(additional_context: Optional[Dict[str, Any]]) -> str:
+    """Stable hash of an assessment's additional_context; key order does not matter."""
+    canonical = json.dumps(additional_context or {}, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+class AssessmentCache:
+    """
+    LRU of stored assessments keyed by `(score_id, trigger_set_version, context_hash)`.
+    A hit is returned as-is instead of being re-evaluated and stored again. The unique
+    index on `risk_assessments` backs it across processes and restarts.
+
+    Apart from `window` triggers, an assessment only depends on that key. Window triggers
+    also read the entity's counters, which may have moved since; a repeated assessment of
+    the same key is deliberately not a new window event, so it neither counts again nor
+    picks up events recorded after the first one.
+    """
+
+    def __init__(self, max_entries: int = settings.SENTINELA_ASSESSMENT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[AssessmentKey, RiskAssessmentResult]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def get(self, key: AssessmentKey) -> Optional[RiskAssessmentResult]:
+        assessment = self._entries.get(key)
+        if assessment is None:
+            return None
+        self._entries.move_to_end(key)
+        return assessment.model_copy(deep=True)
+
+    def put(self, key: AssessmentKey, assessment: RiskAssessmentResult) -> None:
+        self._entries[key] = assessment.model_copy(deep=True)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+assessment_cache = AssessmentCache()
@@ -0,0 +1,50 @@
+import time
+from datetime import datetime
+from typing import Dict, Tuple
+
+from pymongo import ReturnDocument
+
+from app.config import settings
+from app.database import get_collection
+
+
+class CatalogVersions:
+    """
+    Versions of the definition catalogs compiled into process-wide caches (DFC flag
+    definitions, Sentinela triggers, ...), stored in the `catalog_versions` collection.
+
+    Every write to a catalog bumps its version, so the caches of every API and worker
+    process notice the change, not only those of the process that made it. A process reads
+    a stored version at most once per `check_interval_seconds`; its own bumps are seen at once.
+    """
+
+    def __init__(self, check_interval_seconds: float = settings.CATALOG_VERSION_CHECK_SECONDS):
+        self.check_interval_seconds = check_interval_seconds
+        self._checked: Dict[str, Tuple[int, float]] = {}  # catalog -> (version, monotonic time read)
+
+    async def bump(self, catalog: str) -> int:
+        """Records a change to `catalog`; returns its new version."""
+        document = await get_collection("catalog_versions").find_one_and_update(
+            {"_id": catalog},
+            {"$inc": {"version": 1}, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        self._checked[catalog] = (document["version"], time.monotonic())
+        return document["version"]
+
+    async def current(self, catalog: str) -> int:
+        """The stored version of `catalog` (0 if it was never changed), re-read once the check interval elapsed."""
+        checked = self._checked.get(catalog)
+        if checked is not None and time.monotonic() - checked[1] < self.check_interval_seconds:
+            return checked[0]
+        document = await get_collection("catalog_versions").find_one({"_id": catalog}, {"version": 1})
+        version = document["version"] if document else 0
+        self._checked[catalog] = (version, time.monotonic())
+        return version
+
+    def clear(self) -> None:
+        self._checked.clear()
+
+
+catalog_versions = CatalogVersions()
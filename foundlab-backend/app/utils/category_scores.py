@@ -0,0 +1,60 @@
+from typing import Any, Dict, Iterable, Optional
+
+
+def _category_key(value: Any) -> str:
+    """Normalizes a categorical value into its lookup key (case- and whitespace-insensitive)."""
+    return str(value).strip().lower()
+
+
+class CategoryScoreTables:
+    """
+    Compiled category-to-score lookup tables for DFC `category` flags.
+    Tables are rebuilt at most once per ruleset version: DFC bumps the `flags` version in
+    `catalog_versions` on every flag definition change, and ScoreLab/DFC recompile lazily,
+    in any process, once they read a version other than the compiled one.
+    """
+
+    CATALOG = "flags"
+
+    def __init__(self):
+        self._compiled_version = -1
+        self._tables: Dict[str, Dict[str, float]] = {}
+
+    def is_stale(self, ruleset_version: int) -> bool:
+        return self._compiled_version != ruleset_version
+
+    def invalidate(self) -> None:
+        """Forgets the compiled version, so the tables are rebuilt on their next use."""
+        self._compiled_version = -1
+
+    def compile(self, definitions: Iterable[Dict[str, Any]], ruleset_version: int) -> None:
+        """
+        Compiles `{flag_name: {category: score}}` from flag definition documents.
+        Scores are clamped to [0, 1] like any other normalized flag value. Pass the
+        `ruleset_version` read before loading the definitions so a concurrent change
+        is not lost.
+        """
+        tables: Dict[str, Dict[str, float]] = {}
+        for definition in definitions:
+            category_scores = definition.get("category_scores")
+            if not category_scores:
+                continue
+            tables[definition["name"]] = {
+                _category_key(category): max(0.0, min(1.0, float(score)))
+                for category, score in category_scores.items()
+            }
+        self._tables = tables
+        self._compiled_version = ruleset_version
+
+    def has_table(self, flag_name: str) -> bool:
+        return flag_name in self._tables
+
+    def lookup(self, flag_name: str, value: Any) -> Optional[float]:
+        """Returns the score mapped to `value` for `flag_name`, or None if there is no mapping."""
+        table = self._tables.get(flag_name)
+        if table is None:
+            return None
+        return table.get(_category_key(value))
+
+
+category_score_tables = CategoryScoreTables()
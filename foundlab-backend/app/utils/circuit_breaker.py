@@ -0,0 +1,128 @@
+import time
+from collections import deque
+from enum import Enum
+from typing import Deque, Dict, Tuple
+
+from app.config import settings
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Error-rate and latency circuit breaker over the last `window_size` calls.
+
+    While closed, the circuit opens once at least `min_calls` were recorded and the share
+    of failed calls reaches `failure_rate_threshold`, or the share of calls slower than
+    `slow_call_seconds` reaches `slow_call_rate_threshold`. An open circuit rejects calls
+    for `open_seconds`, then lets `half_open_max_calls` trial calls through: a successful
+    trial closes it again, a failed or slow one re-opens it.
+    """
+
+    def __init__(
+        self,
+        window_size: int = settings.SHERLOCK_BREAKER_WINDOW_SIZE,
+        min_calls: int = settings.SHERLOCK_BREAKER_MIN_CALLS,
+        failure_rate_threshold: float = settings.SHERLOCK_BREAKER_FAILURE_RATE,
+        slow_call_seconds: float = settings.SHERLOCK_BREAKER_SLOW_CALL_SECONDS,
+        slow_call_rate_threshold: float = settings.SHERLOCK_BREAKER_SLOW_CALL_RATE,
+        open_seconds: float = settings.SHERLOCK_BREAKER_OPEN_SECONDS,
+        half_open_max_calls: int = 1,
+    ):
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CircuitState.CLOSED
+        self._calls: Deque[Tuple[bool, bool]] = deque(maxlen=window_size)  # (failed, slow)
+        self._opened_at = 0.0
+        self._trials_in_flight = 0
+
+    def allow_request(self) -> bool:
+        if self.state == CircuitState.OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                return False
+            self.state = CircuitState.HALF_OPEN
+            self._trials_in_flight = 0
+        if self.state == CircuitState.HALF_OPEN:
+            if self._trials_in_flight >= self.half_open_max_calls:
+                return False
+            self._trials_in_flight += 1
+        return True
+
+    def cancel(self) -> None:
+        """Gives back the trial slot of a call `allow_request` admitted but that was not made."""
+        if self.state == CircuitState.HALF_OPEN:
+            self._trials_in_flight = max(0, self._trials_in_flight - 1)
+
+    def record(self, failed: bool, duration_seconds: float) -> None:
+        slow = duration_seconds >= self.slow_call_seconds
+        if self.state == CircuitState.HALF_OPEN:
+            self._trials_in_flight = max(0, self._trials_in_flight - 1)
+            if failed or slow:
+                self._open()
+            else:
+                self.state = CircuitState.CLOSED
+                self._calls.clear()
+            return
+        if self.state == CircuitState.OPEN:
+            return
+
+        self._calls.append((failed, slow))
+        if len(self._calls) < self.min_calls:
+            return
+        failures = sum(1 for call_failed, _ in self._calls if call_failed)
+        slow_calls = sum(1 for _, call_slow in self._calls if call_slow)
+        if (
+            failures / len(self._calls) >= self.failure_rate_threshold
+            or slow_calls / len(self._calls) >= self.slow_call_rate_threshold
+        ):
+            self._open()
+
+    def _open(self) -> None:
+        self.state = CircuitState.OPEN
+        self._opened_at = time.monotonic()
+        self._calls.clear()
+        self._trials_in_flight = 0
+
+
+class Bulkhead:
+    """Caps the calls in flight to one provider; a full bulkhead rejects instead of queueing."""
+
+    def __init__(self, max_concurrency: int = settings.SHERLOCK_PROVIDER_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+
+    def try_acquire(self) -> bool:
+        if self.in_flight >= self.max_concurrency:
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self) -> None:
+        self.in_flight = max(0, self.in_flight - 1)
+
+
+class ProviderGuards:
+    """Process-wide circuit breaker and bulkhead of every provider, created on first use."""
+
+    def __init__(self):
+        self._guards: Dict[str, Tuple[CircuitBreaker, Bulkhead]] = {}
+
+    def get(self, provider_name: str) -> Tuple[CircuitBreaker, Bulkhead]:
+        guards = self._guards.get(provider_name)
+        if guards is None:
+            guards = self._guards[provider_name] = (CircuitBreaker(), Bulkhead())
+        return guards
+
+    def clear(self) -> None:
+        self._guards.clear()
+
+
+provider_guards = ProviderGuards()
@@ -0,0 +1,148 @@
+import time
+from bisect import bisect_right
+from math import log1p
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from app.config import settings
+from app.models.score import FeatureTransform, FeatureTransformType, FlagWithValue
+
+# A compiled transform maps one metadata dict to a normalized value in [0, 1], or None if it cannot be computed.
+CompiledTransform = Callable[[Dict[str, Any]], Optional[float]]
+
+
+def _clamp01(value: float) -> float:
+    return max(0.0, min(1.0, value))
+
+
+def _as_number(value: Any) -> Optional[float]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value)
+
+
+def _compile_transform(transform: FeatureTransform) -> CompiledTransform:
+    """
+    Turns one declarative transform into a closure with all of its parameters pre-bound,
+    so evaluating it is a dict lookup plus a few float operations.
+    """
+    source = transform.source
+    default = transform.default
+
+    match transform.transform:
+        case FeatureTransformType.LOG:
+            log_scale = log1p(transform.scale)
+
+            def _apply(x: float) -> float:
+                return _clamp01(log1p(max(0.0, x)) / log_scale)
+
+        case FeatureTransformType.CLIP:
+            low, span = transform.min_value, transform.max_value - transform.min_value
+
+            def _apply(x: float) -> float:
+                return _clamp01((x - low) / span)
+
+        case FeatureTransformType.BUCKET:
+            edges = tuple(transform.bucket_edges)
+            scores = tuple(_clamp01(s) for s in transform.bucket_scores)
+
+            def _apply(x: float) -> float:
+                return scores[bisect_right(edges, x)]
+
+        case FeatureTransformType.RATIO:
+            denominator = transform.denominator
+            if transform.min_value is not None and transform.max_value is not None:
+                low, span = transform.min_value, transform.max_value - transform.min_value
+            else:
+                low, span = 0.0, 1.0
+
+            def _transform(metadata: Dict[str, Any]) -> Optional[float]:
+                x = _as_number(metadata.get(source))
+                y = _as_number(metadata.get(denominator))
+                if x is None or y is None or y == 0:
+                    return default
+                return _clamp01((x / y - low) / span)
+
+            return _transform
+
+    def _transform(metadata: Dict[str, Any]) -> Optional[float]:
+        x = _as_number(metadata.get(source))
+        if x is None:
+            return default
+        return _apply(x)
+
+    return _transform
+
+
+class FeatureExtractor:
+    """
+    A versioned feature transform config compiled into a single extraction function.
+    The extracted features are weighted inputs to P(x), just like DFC flags.
+    """
+
+    def __init__(self, transforms: Sequence[FeatureTransform], version: Optional[int] = None):
+        self.version = version
+        self._names = tuple(t.name for t in transforms)
+        self._weights = tuple(max(0.0, t.weight) for t in transforms)
+        self._compiled = tuple(_compile_transform(t) for t in transforms)
+
+    def __bool__(self) -> bool:
+        return bool(self._compiled)
+
+    def extract(self, metadata: Dict[str, Any]) -> List[FlagWithValue]:
+        """Evaluates every transform against one metadata dict; features that cannot be computed are skipped."""
+        features = []
+        for name, weight, transform in zip(self._names, self._weights, self._compiled):
+            value = transform(metadata)
+            if value is not None:
+                features.append(FlagWithValue(name=name, value=value, weight=weight, is_active=True))
+        return features
+
+    def extract_batch(self, metadata_rows: Sequence[Dict[str, Any]]) -> List[List[FlagWithValue]]:
+        """
+        Column-wise variant of `extract` for many entities at once: each transform runs over
+        the whole batch before the next one, keeping the hot loop on a single closure.
+        """
+        features: List[List[FlagWithValue]] = [[] for _ in metadata_rows]
+        for name, weight, transform in zip(self._names, self._weights, self._compiled):
+            for row_features, metadata in zip(features, metadata_rows):
+                value = transform(metadata)
+                if value is not None:
+                    row_features.append(FlagWithValue(name=name, value=value, weight=weight, is_active=True))
+        return features
+
+
+class FeatureExtractorCache:
+    """
+    Holds the compiled extractor for the active feature transform config.
+    ScoreLab compares it with the latest config version stored in Mongo, so a config
+    published by any process is picked up; the stored version is re-read at most once
+    per `check_interval_seconds`.
+    """
+
+    def __init__(self, check_interval_seconds: float = settings.CATALOG_VERSION_CHECK_SECONDS):
+        self.check_interval_seconds = check_interval_seconds
+        self._loaded = False
+        self._checked_at: Optional[float] = None
+        self.extractor = FeatureExtractor([])
+
+    @property
+    def is_check_due(self) -> bool:
+        return not self._loaded or time.monotonic() - self._checked_at >= self.check_interval_seconds
+
+    def is_stale(self, latest_version: Optional[int]) -> bool:
+        return not self._loaded or self.extractor.version != latest_version
+
+    def mark_checked(self) -> None:
+        self._checked_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        """Forgets the compiled extractor, so the stored config is read again on its next use."""
+        self._loaded = False
+
+    def load(self, transforms: Sequence[FeatureTransform], version: Optional[int]) -> None:
+        self.extractor = FeatureExtractor(transforms, version)
+        self._loaded = True
+        self._checked_at = time.monotonic()
+
+
+feature_extractor_cache = FeatureExtractorCache()
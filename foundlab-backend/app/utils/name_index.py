@@ -0,0 +1,157 @@
+import heapq
+import itertools
+import math
+import re
+import unicodedata
+from typing import Counter, Dict, Generic, Iterable, List, Sequence, Set, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Latin letters that NFKD does not decompose into a base letter plus accents.
+_TRANSLITERATIONS = str.maketrans(
+    {"ß": "ss", "æ": "ae", "œ": "oe", "ø": "o", "đ": "d", "ð": "d", "ł": "l", "þ": "th", "ı": "i"}
+)
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase ASCII words: accents stripped, punctuation dropped, whitespace collapsed."""
+    decomposed = unicodedata.normalize("NFKD", name.lower().translate(_TRANSLITERATIONS))
+    ascii_name = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return _NON_WORD.sub(" ", ascii_name).strip()
+
+
+def _trigrams(normalized: str) -> Set[str]:
+    padded = f"  {normalized} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def jaro_winkler(a: str, b: str, prefix_scale: float = 0.1) -> float:
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    match_distance = max(0, max(len(a), len(b)) // 2 - 1)
+    a_matched = [False] * len(a)
+    b_matched = [False] * len(b)
+    matches = 0
+    for i, char in enumerate(a):
+        for j in range(max(0, i - match_distance), min(i + match_distance + 1, len(b))):
+            if not b_matched[j] and b[j] == char:
+                a_matched[i] = b_matched[j] = True
+                matches += 1
+                break
+    if not matches:
+        return 0.0
+
+    transpositions = 0
+    j = 0
+    for i, char in enumerate(a):
+        if a_matched[i]:
+            while not b_matched[j]:
+                j += 1
+            if char != b[j]:
+                transpositions += 1
+            j += 1
+    jaro = (matches / len(a) + matches / len(b) + (matches - transpositions / 2) / matches) / 3
+
+    prefix = 0
+    for char_a, char_b in zip(a[:4], b[:4]):
+        if char_a != char_b:
+            break
+        prefix += 1
+    return jaro + prefix * prefix_scale * (1 - jaro)
+
+
+def name_similarity(a: str, b: str) -> float:
+    """Jaro-Winkler of two normalized names, also comparing them with their words sorted (word order varies by list)."""
+    return max(jaro_winkler(a, b), jaro_winkler(" ".join(sorted(a.split())), " ".join(sorted(b.split()))))
+
+
+class NameIndex(Generic[T]):
+    """
+    Trigram inverted index over normalized watchlist names.
+
+    A query keeps the `max_candidates` names sharing the most trigrams with it (Dice
+    coefficient at least `min_overlap`) and re-ranks just those with Jaro-Winkler, instead
+    of comparing the query against every listed name. Candidates are only taken from the
+    postings of the query's rarest trigrams (prefix filter), so the long postings of common
+    name parts (muhammad, al-, ...) only complete the counts of names already found.
+    """
+
+    def __init__(self, names: Iterable[Tuple[str, T]]):
+        self._names: List[str] = []
+        self._trigram_counts: List[int] = []
+        self._sorted_names: List[str] = []
+        self._items: List[List[T]] = []
+        self._postings: Dict[str, List[int]] = {}
+        ids: Dict[str, int] = {}
+        for name, item in names:
+            normalized = normalize_name(name)
+            if not normalized:
+                continue
+            name_id = ids.get(normalized)
+            if name_id is None:
+                name_id = ids[normalized] = len(self._names)
+                trigrams = _trigrams(normalized)
+                self._names.append(normalized)
+                self._trigram_counts.append(len(trigrams))
+                self._sorted_names.append(" ".join(sorted(normalized.split())))
+                self._items.append([])
+                for trigram in trigrams:
+                    self._postings.setdefault(trigram, []).append(name_id)
+            self._items[name_id].append(item)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def normalized_names(self) -> Set[str]:
+        return set(self._names)
+
+    def search(
+        self, name: str, threshold: float = 0.88, max_candidates: int = 50, min_overlap: float = 0.3
+    ) -> List[Tuple[float, str, Sequence[T]]]:
+        """`(similarity, normalized listed name, items)` of the matches at or above `threshold`, best first."""
+        normalized = normalize_name(name)
+        if not normalized:
+            return []
+        trigrams = _trigrams(normalized)
+        size = len(trigrams)
+        # A name at Dice `min_overlap` shares at least `required` trigrams with the query, so
+        # it contains one of the `size - required + 1` rarest ones.
+        required = max(1, math.ceil(min_overlap * size / (2 - min_overlap) - 1e-9))
+        postings = sorted((self._postings.get(trigram, ()) for trigram in trigrams), key=len)
+        overlaps: Counter[int] = Counter()
+        for posting in postings[: size - required + 1]:
+            overlaps.update(posting)
+        for posting in postings[size - required + 1 :]:
+            overlaps.update(overlaps.keys() & posting)
+
+        # A name sharing `count` trigrams scores at most 2 * count / (size + count), so once the
+        # names sharing the most trigrams set a Dice floor, names with fewer are not ranked.
+        ranked = overlaps.most_common()
+        counts = self._trigram_counts
+        floor = min_overlap
+        if len(ranked) > max_candidates:
+            floor = max(floor, min(2 * count / (size + counts[name_id]) for name_id, count in ranked[:max_candidates]))
+        least_count = floor * size / (2 - floor) - 1e-9
+        candidates = heapq.nlargest(
+            max_candidates,
+            (
+                (2 * count / (size + counts[name_id]), name_id)
+                for name_id, count in itertools.takewhile(lambda item: item[1] >= least_count, ranked)
+            ),
+        )
+        sorted_query = " ".join(sorted(normalized.split()))
+        matches = []
+        for dice, name_id in candidates:
+            if dice < min_overlap:
+                break
+            listed = self._names[name_id]
+            similarity = jaro_winkler(normalized, listed)
+            if sorted_query != normalized or self._sorted_names[name_id] != listed:
+                similarity = max(similarity, jaro_winkler(sorted_query, self._sorted_names[name_id]))
+            if similarity >= threshold:
+                matches.append((similarity, listed, self._items[name_id]))
+        matches.sort(key=lambda match: match[0], reverse=True)
+        return matches
@@ -0,0 +1,105 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from app.config import settings
+from app.models.sherlock import ExternalProviderResult, ProviderStatus
+
+# (provider_name, entity_type, entity_id), normalized by `provider_cache_key`
+ProviderCacheKey = Tuple[str, str, str]
+
+
+def provider_cache_key(provider_name: str, entity_id: str, entity_type: str) -> ProviderCacheKey:
+    """Case and surrounding whitespace do not make a different entity."""
+    return provider_name, entity_type.strip().lower(), entity_id.strip().lower()
+
+
+class ProviderResultCache:
+    """
+    LRU of Sherlock provider results with a TTL per entry.
+
+    Successful results are kept for `ttl_seconds`; pending, failed and unavailable ones only
+    for `negative_ttl_seconds`, so a provider outage is retried soon. Concurrent lookups of
+    a key that is not cached share one in-flight load (single flight) instead of each
+    calling the provider. Results are returned with `cache_age_seconds` set when they
+    come from the cache.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = settings.SHERLOCK_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = settings.SHERLOCK_CACHE_TTL_SECONDS,
+        negative_ttl_seconds: float = settings.SHERLOCK_CACHE_NEGATIVE_TTL_SECONDS,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        # key -> (result, stored_at, expires_at) on the monotonic clock
+        self._entries: "OrderedDict[ProviderCacheKey, Tuple[ExternalProviderResult, float, float]]" = OrderedDict()
+        self._in_flight: Dict[ProviderCacheKey, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._in_flight.clear()
+
+    def get(self, key: ProviderCacheKey) -> Optional[ExternalProviderResult]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        result, stored_at, expires_at = entry
+        now = time.monotonic()
+        if now >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return result.model_copy(update={"cache_age_seconds": round(now - stored_at, 3)})
+
+    def put(self, key: ProviderCacheKey, result: ExternalProviderResult) -> None:
+        ttl = self.ttl_seconds if result.status == ProviderStatus.SUCCESS else self.negative_ttl_seconds
+        if ttl <= 0:
+            return
+        now = time.monotonic()
+        self._entries[key] = (result, now, now + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_join(self, key: ProviderCacheKey) -> Optional[ExternalProviderResult]:
+        """
+        Returns the fresh cached result of `key`, or waits for its in-flight load; returns
+        None, without suspending, if there is neither.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        in_flight = self._in_flight.get(key)
+        if in_flight is None:
+            return None
+        # Shielded so that one cancelled caller does not cancel the load the others wait on.
+        return await asyncio.shield(in_flight)
+
+    async def get_or_load(
+        self, key: ProviderCacheKey, load: Callable[[], Awaitable[ExternalProviderResult]]
+    ) -> ExternalProviderResult:
+        shared = await self.get_or_join(key)
+        if shared is not None:
+            return shared
+        in_flight = self._in_flight[key] = asyncio.ensure_future(self._load(key, load))
+        return await asyncio.shield(in_flight)
+
+    async def _load(
+        self, key: ProviderCacheKey, load: Callable[[], Awaitable[ExternalProviderResult]]
+    ) -> ExternalProviderResult:
+        try:
+            result = await load()
+            self.put(key, result)
+            return result
+        finally:
+            self._in_flight.pop(key, None)
+
+
+provider_result_cache = ProviderResultCache()
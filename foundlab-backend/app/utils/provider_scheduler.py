@@ -0,0 +1,226 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.models.sherlock import PriorityQueueMetrics, ProviderSchedulerMetrics, RequestPriority
+
+PRIORITY_ORDER = (RequestPriority.INTERACTIVE, RequestPriority.BATCH, RequestPriority.BACKFILL)
+
+
+class TokenBucket:
+    """Holds up to `burst` tokens, refilled continuously at `rate_per_second`."""
+
+    def __init__(self, rate_per_second: float, burst: float):
+        self.rate_per_second = rate_per_second
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self._updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated_at) * self.rate_per_second)
+        self._updated_at = now
+
+    def try_take(self, reserve: float = 0.0) -> bool:
+        """Takes one token if at least `reserve` tokens would be left."""
+        self._refill()
+        if self.tokens < 1.0 + reserve:
+            return False
+        self.tokens -= 1.0
+        return True
+
+    def give_back(self) -> None:
+        self._refill()
+        self.tokens = min(self.burst, self.tokens + 1.0)
+
+    def seconds_until(self, reserve: float = 0.0) -> float:
+        self._refill()
+        return max(0.0, (1.0 + reserve - self.tokens) / self.rate_per_second)
+
+
+class _PriorityStats:
+    def __init__(self):
+        self.granted = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+
+class ProviderScheduler:
+    """
+    Quota of one provider: a token bucket drained by one token per request, with a FIFO
+    queue per priority class.
+
+    Waiting calls are served strictly by class, so batch and backfill calls are deferred
+    while interactive ones are queued. Batch and backfill calls also leave
+    `interactive_reserve` of the bucket untouched, which keeps headroom for interactive
+    spikes. A call that waits longer than its class's maximum wait gives up.
+    Providers without a rate limit grant every call immediately (and are only counted).
+    """
+
+    def __init__(
+        self,
+        provider_name: str,
+        rate_per_second: Optional[float] = None,
+        burst: Optional[float] = None,
+        interactive_reserve: float = settings.SHERLOCK_INTERACTIVE_QUOTA_RESERVE,
+    ):
+        self.provider_name = provider_name
+        self.bucket: Optional[TokenBucket] = None
+        self.reserve = 0.0
+        if rate_per_second:
+            self.bucket = TokenBucket(rate_per_second, burst or rate_per_second * settings.SHERLOCK_RATE_LIMIT_BURST_SECONDS)
+            self.reserve = interactive_reserve * self.bucket.burst
+        self._queues: Dict[RequestPriority, Deque[Tuple[asyncio.Future, float]]] = {p: deque() for p in PRIORITY_ORDER}
+        self._stats: Dict[RequestPriority, _PriorityStats] = {p: _PriorityStats() for p in PRIORITY_ORDER}
+        self._recent_grants: Deque[float] = deque()
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    def _reserve_for(self, priority: RequestPriority) -> float:
+        return 0.0 if priority == RequestPriority.INTERACTIVE else self.reserve
+
+    def _grant(self, priority: RequestPriority, waited_seconds: float) -> None:
+        stats = self._stats[priority]
+        stats.granted += 1
+        stats.wait_seconds_total += waited_seconds
+        stats.wait_seconds_max = max(stats.wait_seconds_max, waited_seconds)
+        now = time.monotonic()
+        self._recent_grants.append(now)
+        while self._recent_grants and now - self._recent_grants[0] > 60.0:
+            self._recent_grants.popleft()
+
+    def _has_waiters(self, up_to: RequestPriority) -> bool:
+        for priority in PRIORITY_ORDER:
+            if any(not future.done() for future, _ in self._queues[priority]):
+                return True
+            if priority == up_to:
+                return False
+        return False
+
+    def try_acquire(self, priority: RequestPriority = RequestPriority.INTERACTIVE) -> bool:
+        """Takes a quota token only if one is available right now and no call of the same or a higher class waits."""
+        if self.bucket is None:
+            self._grant(priority, 0.0)
+            return True
+        if not self._has_waiters(priority) and self.bucket.try_take(self._reserve_for(priority)):
+            self._grant(priority, 0.0)
+            return True
+        return False
+
+    async def acquire(self, priority: RequestPriority = RequestPriority.INTERACTIVE, max_wait: Optional[float] = None) -> bool:
+        """Waits for a quota token; False when none was granted within `max_wait` (default: the class's setting)."""
+        if self.try_acquire(priority):
+            return True
+
+        if max_wait is None:
+            max_wait = settings.SHERLOCK_SCHEDULER_MAX_WAIT_SECONDS.get(priority.value, settings.SHERLOCK_PROVIDER_TIMEOUT_SECONDS)
+        future = asyncio.get_running_loop().create_future()
+        self._queues[priority].append((future, time.monotonic()))
+        self._wakeup.set()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        try:
+            await asyncio.wait_for(future, max_wait)
+            return True
+        except asyncio.TimeoutError:
+            self._stats[priority].rejected += 1
+            return False
+
+    def refund(self) -> None:
+        """Returns the token of a granted call that was not made after all."""
+        if self._recent_grants:
+            self._recent_grants.pop()
+        if self.bucket is not None:
+            self.bucket.give_back()
+            self._wakeup.set()
+
+    async def _dispatch(self) -> None:
+        """Hands out tokens to the head of the highest non-empty queue as the bucket refills."""
+        while True:
+            self._wakeup.clear()
+            head: Optional[RequestPriority] = None
+            for priority in PRIORITY_ORDER:
+                queue = self._queues[priority]
+                while queue and queue[0][0].done():  # gave up waiting
+                    queue.popleft()
+                if queue:
+                    head = priority
+                    break
+            if head is None:
+                return
+            reserve = self._reserve_for(head)
+            if self.bucket.try_take(reserve):
+                future, enqueued_at = self._queues[head].popleft()
+                future.set_result(True)
+                self._grant(head, time.monotonic() - enqueued_at)
+                continue
+            # Also woken up by new arrivals, which may be of a higher class than the current head.
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.bucket.seconds_until(reserve))
+            except asyncio.TimeoutError:
+                pass
+
+    def metrics(self) -> ProviderSchedulerMetrics:
+        now = time.monotonic()
+        requests_last_minute = sum(1 for granted_at in self._recent_grants if now - granted_at <= 60.0)
+        queues = []
+        for priority in PRIORITY_ORDER:
+            stats = self._stats[priority]
+            queues.append(
+                PriorityQueueMetrics(
+                    priority=priority,
+                    queue_depth=sum(1 for future, _ in self._queues[priority] if not future.done()),
+                    granted=stats.granted,
+                    rejected=stats.rejected,
+                    avg_wait_seconds=round(stats.wait_seconds_total / stats.granted, 4) if stats.granted else 0.0,
+                    max_wait_seconds=round(stats.wait_seconds_max, 4),
+                )
+            )
+        if self.bucket is None:
+            return ProviderSchedulerMetrics(
+                provider_name=self.provider_name, requests_last_minute=requests_last_minute, queues=queues
+            )
+        self.bucket._refill()
+        return ProviderSchedulerMetrics(
+            provider_name=self.provider_name,
+            rate_limit_per_second=self.bucket.rate_per_second,
+            burst=self.bucket.burst,
+            tokens_available=round(self.bucket.tokens, 3),
+            requests_last_minute=requests_last_minute,
+            quota_utilization=round(requests_last_minute / (self.bucket.rate_per_second * 60.0), 4),
+            queues=queues,
+        )
+
+    def close(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+
+
+class ProviderSchedulers:
+    """Process-wide quota scheduler of every provider, created on first use from `SHERLOCK_PROVIDER_RATE_LIMITS`."""
+
+    def __init__(self):
+        self._schedulers: Dict[str, ProviderScheduler] = {}
+
+    def get(self, provider_name: str) -> ProviderScheduler:
+        scheduler = self._schedulers.get(provider_name)
+        if scheduler is None:
+            scheduler = self._schedulers[provider_name] = ProviderScheduler(
+                provider_name, settings.SHERLOCK_PROVIDER_RATE_LIMITS.get(provider_name)
+            )
+        return scheduler
+
+    def metrics(self) -> List[ProviderSchedulerMetrics]:
+        return [scheduler.metrics() for _, scheduler in sorted(self._schedulers.items())]
+
+    def clear(self) -> None:
+        for scheduler in self._schedulers.values():
+            scheduler.close()
+        self._schedulers.clear()
+
+
+provider_schedulers = ProviderSchedulers()
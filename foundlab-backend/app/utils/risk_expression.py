@@ -0,0 +1,194 @@
+import ast
+import operator
+from typing import Any, Callable, Dict, Optional
+
+MAX_EXPRESSION_LENGTH = 1000
+
+# Evaluation environment: (score, flags, context).
+Environment = tuple
+Evaluator = Callable[[Environment], Any]
+
+_BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Mod: operator.mod,
+}
+_UNARY_OPERATORS = {
+    ast.Not: operator.not_,
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+}
+_COMPARISON_OPERATORS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda a, b: a in b,
+    ast.NotIn: lambda a, b: a not in b,
+}
+_VARIABLES = {"score": 0, "flags": 1, "context": 2}
+
+
+class ExpressionError(ValueError):
+    """Raised when a custom_logic expression is not valid in the restricted expression language."""
+
+
+def _function_has_flag(env: Environment, name: str) -> bool:
+    return name in env[1]
+
+
+def _function_flag(env: Environment, name: str, default: Any = None) -> Any:
+    return env[1].get(name, default)
+
+
+def _function_ctx(env: Environment, key: str, default: Any = None) -> Any:
+    return env[2].get(key, default)
+
+
+# Functions receiving the environment first, then the call arguments.
+_ENV_FUNCTIONS = {"has_flag": _function_has_flag, "flag": _function_flag, "ctx": _function_ctx}
+_PURE_FUNCTIONS = {"abs": abs, "min": min, "max": max, "len": len}
+
+
+def _compile_node(node: ast.AST) -> Evaluator:
+    """Validates one AST node against the whitelist and compiles it into a closure over the environment."""
+    match node:
+        case ast.Constant(value=value):
+            if not isinstance(value, (int, float, str, bool, type(None))):
+                raise ExpressionError(f"Unsupported constant {value!r}.")
+            return lambda env: value
+
+        case ast.Name(id=name):
+            if name not in _VARIABLES:
+                raise ExpressionError(f"Unknown name '{name}'. Available: score, flags, context.")
+            slot = _VARIABLES[name]
+            return lambda env: env[slot]
+
+        case ast.List(elts=elements) | ast.Tuple(elts=elements) | ast.Set(elts=elements):
+            items = [_compile_node(e) for e in elements]
+            return lambda env: tuple(item(env) for item in items)
+
+        case ast.BoolOp(op=op, values=values):
+            operands = [_compile_node(v) for v in values]
+            if isinstance(op, ast.And):
+                return lambda env: all(operand(env) for operand in operands)
+            return lambda env: any(operand(env) for operand in operands)
+
+        case ast.UnaryOp(op=op, operand=operand):
+            if type(op) not in _UNARY_OPERATORS:
+                raise ExpressionError(f"Unsupported operator {type(op).__name__}.")
+            function, compiled = _UNARY_OPERATORS[type(op)], _compile_node(operand)
+            return lambda env: function(compiled(env))
+
+        case ast.BinOp(left=left, op=op, right=right):
+            if type(op) not in _BINARY_OPERATORS:
+                raise ExpressionError(f"Unsupported operator {type(op).__name__}.")
+            function, compiled_left, compiled_right = _BINARY_OPERATORS[type(op)], _compile_node(left), _compile_node(right)
+
+            def _arithmetic(env: Environment) -> float:
+                a, b = compiled_left(env), compiled_right(env)
+                if not isinstance(a, (int, float)) or not isinstance(b, (int, float)):
+                    raise TypeError("Arithmetic is only defined on numbers.")
+                return function(a, b)
+
+            return _arithmetic
+
+        case ast.Compare(left=left, ops=ops, comparators=comparators):
+            for op in ops:
+                if type(op) not in _COMPARISON_OPERATORS:
+                    raise ExpressionError(f"Unsupported comparison {type(op).__name__}.")
+            compiled_left = _compile_node(left)
+            chain = [(_COMPARISON_OPERATORS[type(op)], _compile_node(c)) for op, c in zip(ops, comparators)]
+
+            def _compare(env: Environment) -> bool:
+                current = compiled_left(env)
+                for function, compiled in chain:
+                    following = compiled(env)
+                    if not function(current, following):
+                        return False
+                    current = following
+                return True
+
+            return _compare
+
+        case ast.Subscript(value=ast.Name(id=("flags" | "context") as name), slice=ast.Constant(value=str() as key)):
+            slot = _VARIABLES[name]
+            return lambda env: env[slot].get(key)
+
+        case ast.Subscript():
+            raise ExpressionError("Only flags['name'] and context['key'] subscripts are supported.")
+
+        case ast.Call(func=ast.Name(id=name), args=args, keywords=[]):
+            compiled_args = [_compile_node(a) for a in args]
+            if name in _ENV_FUNCTIONS:
+                function = _ENV_FUNCTIONS[name]
+                return lambda env: function(env, *(arg(env) for arg in compiled_args))
+            if name in _PURE_FUNCTIONS:
+                function = _PURE_FUNCTIONS[name]
+                return lambda env: function(*(arg(env) for arg in compiled_args))
+            raise ExpressionError(f"Unknown function '{name}'.")
+
+        case ast.Call():
+            raise ExpressionError("Only plain calls to the built-in expression functions are supported.")
+
+    raise ExpressionError(f"Unsupported syntax: {type(node).__name__}.")
+
+
+class CompiledExpression:
+    """
+    A custom_logic expression parsed and validated once, then compiled into nested closures.
+    Evaluating it never calls `eval` or re-parses the source.
+
+    Available names: `score` (P(x)), `flags` (active flag name -> value) and `context`
+    (the assessment's additional_context); functions: `has_flag(name)`,
+    `flag(name, default)`, `ctx(key, default)`, `abs`, `min`, `max`, `len`.
+    """
+
+    def __init__(self, source: str):
+        if not source or not source.strip():
+            raise ExpressionError("Expression is empty.")
+        if len(source) > MAX_EXPRESSION_LENGTH:
+            raise ExpressionError(f"Expression exceeds {MAX_EXPRESSION_LENGTH} characters.")
+        try:
+            tree = ast.parse(source.strip(), mode="eval")
+        except SyntaxError as e:
+            raise ExpressionError(f"Invalid expression syntax: {e.msg}.") from e
+        self.source = source.strip()
+        self._evaluator = _compile_node(tree.body)
+
+    def evaluate(self, score: float, flags: Dict[str, Any], context: Optional[Dict[str, Any]]) -> bool:
+        """
+        Returns whether the expression holds. Runtime type errors (e.g., comparing a missing
+        context value with a number) count as not matching rather than failing the assessment.
+        """
+        try:
+            return bool(self._evaluator((score, flags, context or {})))
+        except (TypeError, ValueError, ZeroDivisionError, AttributeError):
+            return False
+
+
+def expression_from_params(custom_logic_params: Dict[str, Any]) -> str:
+    """
+    Returns the expression source of a custom_logic trigger. Triggers created before the
+    expression language carry `max_score`/`min_recent_volume`, which map to an equivalent expression.
+    """
+    if "expression" in custom_logic_params:
+        return custom_logic_params["expression"]
+    max_score = float(custom_logic_params.get("max_score", 1.0))
+    min_recent_volume = float(custom_logic_params.get("min_recent_volume", 0.0))
+    return f"score <= {max_score!r} and ctx('recent_transaction_volume_usd', 0.0) >= {min_recent_volume!r}"
+
+
+def compile_custom_logic(custom_logic_params: Dict[str, Any]) -> CompiledExpression:
+    """Validates and compiles the custom_logic parameters of a trigger; raises `ExpressionError` if invalid."""
+    try:
+        expression = expression_from_params(custom_logic_params)
+    except (TypeError, ValueError) as e:
+        raise ExpressionError(f"Invalid custom_logic parameters: {e}") from e
+    if not isinstance(expression, str):
+        raise ExpressionError("'expression' must be a string.")
+    return CompiledExpression(expression)
@@ -0,0 +1,294 @@
+import asyncio
+import csv
+import hashlib
+import json
+import math
+import os
+import re
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from app.config import settings
+from app.utils.name_index import NameIndex
+
+_NON_ALPHANUMERIC = re.compile(r"[^0-9a-z]")
+
+# Column / key names accepted for the identifier in CSV and JSON drops.
+IDENTIFIER_FIELDS = ("identifier", "address", "wallet_address", "document_number", "id_number")
+
+
+class SanctionsEntry(NamedTuple):
+    identifier: str  # as published; empty for name-only entries (e.g. aliases)
+    name: str
+    program: str
+    list_name: str
+
+
+def normalize_identifier(value: str) -> str:
+    """Case, spaces and punctuation do not distinguish addresses or document numbers."""
+    return _NON_ALPHANUMERIC.sub("", value.lower())
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, sized for `capacity` items at `error_rate`."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(1, capacity)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> Iterator[int]:
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class SanctionsIndex:
+    """
+    Immutable exact-match index of sanctioned identifiers (wallet addresses, document
+    numbers). A Bloom filter answers the common "not listed" case before the hash table
+    of normalized identifiers is consulted. Listed names go to a `NameIndex` for fuzzy
+    person and organization screening.
+    """
+
+    def __init__(self, entries: Iterable[SanctionsEntry], version: str = "", error_rate: float = 0.001):
+        by_identifier: Dict[str, List[SanctionsEntry]] = {}
+        named: List[Tuple[str, SanctionsEntry]] = []
+        for entry in entries:
+            key = normalize_identifier(entry.identifier)
+            if key:
+                by_identifier.setdefault(key, []).append(entry)
+            if entry.name:
+                named.append((entry.name, entry))
+        self.names: NameIndex[SanctionsEntry] = NameIndex(named)
+        self._entries: Dict[str, Tuple[SanctionsEntry, ...]] = {key: tuple(value) for key, value in by_identifier.items()}
+        self._bloom = BloomFilter(len(self._entries), error_rate)
+        for key in self._entries:
+            self._bloom.add(key)
+        self.version = version
+        self.loaded_at = datetime.utcnow()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, identifier: str) -> Tuple[SanctionsEntry, ...]:
+        key = normalize_identifier(identifier)
+        if key not in self._bloom:
+            return ()
+        return self._entries.get(key, ())
+
+    def snapshot(self) -> "SanctionsListSnapshot":
+        """A fingerprint of each identifier's entries and the listed names, which list versions are diffed by."""
+        identifiers = {
+            key: hashlib.sha1(json.dumps(sorted(set(entries))).encode("utf-8")).hexdigest()
+            for key, entries in self._entries.items()
+        }
+        return SanctionsListSnapshot(self.version, identifiers, self.names.normalized_names())
+
+
+class SanctionsListSnapshot(NamedTuple):
+    version: str
+    identifiers: Dict[str, str]  # normalized identifier -> fingerprint of its entries
+    names: Set[str]  # normalized
+
+    def diff(self, previous: "SanctionsListSnapshot") -> "SanctionsListDiff":
+        """
+        What changed since `previous`: identifiers whose entries differ (added, removed or
+        re-listed) and names no longer listed.
+        """
+        changed = {
+            key
+            for key in self.identifiers.keys() | previous.identifiers.keys()
+            if self.identifiers.get(key) != previous.identifiers.get(key)
+        }
+        return SanctionsListDiff(changed, previous.names - self.names)
+
+
+class SanctionsListDiff(NamedTuple):
+    changed_identifiers: Set[str]  # normalized
+    removed_names: Set[str]  # normalized
+
+    def __bool__(self) -> bool:
+        return bool(self.changed_identifiers or self.removed_names)
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _child_text(element: ET.Element, name: str) -> str:
+    for child in element:
+        if _local_name(child.tag) == name and child.text:
+            return child.text.strip()
+    return ""
+
+
+def _load_csv(path: str, list_name: str) -> Iterator[SanctionsEntry]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            row = {(key or "").strip().lower(): (value or "").strip() for key, value in row.items()}
+            identifier = next((row[field] for field in IDENTIFIER_FIELDS if row.get(field)), "")
+            if identifier or row.get("name"):
+                yield SanctionsEntry(identifier, row.get("name", ""), row.get("program", ""), row.get("list", list_name))
+
+
+def _load_json(path: str, list_name: str) -> Iterator[SanctionsEntry]:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    records = data.get("entries", []) if isinstance(data, dict) else data
+    for record in records:
+        name, program, record_list = record.get("name", ""), record.get("program", ""), record.get("list", list_name)
+        identifiers = record.get("identifiers") or [record.get(field) for field in IDENTIFIER_FIELDS]
+        identifiers = [str(identifier) for identifier in identifiers if identifier]
+        for identifier in identifiers or [""]:
+            yield SanctionsEntry(identifier, name, program, record_list)
+        for alias in record.get("aliases", []):
+            yield SanctionsEntry("", alias, program, record_list)
+
+
+def _load_xml(path: str, list_name: str) -> Iterator[SanctionsEntry]:
+    """
+    OFAC SDN XML (`sdnEntry` with `idList/id/idNumber`, which includes the "Digital Currency
+    Address" IDs, and `akaList/aka` aliases) and the UN consolidated list (`INDIVIDUAL` /
+    `ENTITY` with `INDIVIDUAL_DOCUMENT/NUMBER` and `*_ALIAS/ALIAS_NAME`). Entries are
+    streamed and freed as they are parsed; aliases become name-only entries.
+    """
+    for _, element in ET.iterparse(path, events=("end",)):
+        tag = _local_name(element.tag)
+        if tag == "sdnEntry":
+            name = " ".join(filter(None, (_child_text(element, "firstName"), _child_text(element, "lastName"))))
+            program = ", ".join(p.text.strip() for p in element.iter() if _local_name(p.tag) == "program" and p.text)
+            numbers = [
+                _child_text(child, "idNumber") for child in element.iter() if _local_name(child.tag) == "id"
+            ]
+            for number in [n for n in numbers if n] or [""]:
+                yield SanctionsEntry(number, name, program, list_name)
+            for aka in element.iter():
+                if _local_name(aka.tag) == "aka":
+                    alias = " ".join(filter(None, (_child_text(aka, "firstName"), _child_text(aka, "lastName"))))
+                    if alias:
+                        yield SanctionsEntry("", alias, program, list_name)
+            element.clear()
+        elif tag in ("INDIVIDUAL", "ENTITY"):
+            name = " ".join(
+                filter(None, (_child_text(element, f"{part}_NAME") for part in ("FIRST", "SECOND", "THIRD")))
+            )
+            program = _child_text(element, "UN_LIST_TYPE")
+            numbers = [
+                _child_text(child, "NUMBER")
+                for child in element.iter()
+                if _local_name(child.tag) in ("INDIVIDUAL_DOCUMENT", "ENTITY_DOCUMENT")
+            ]
+            for number in [n for n in numbers if n] or [""]:
+                yield SanctionsEntry(number, name, program, list_name)
+            for alias in element.iter():
+                if _local_name(alias.tag) in ("INDIVIDUAL_ALIAS", "ENTITY_ALIAS"):
+                    alias_name = _child_text(alias, "ALIAS_NAME")
+                    if alias_name:
+                        yield SanctionsEntry("", alias_name, program, list_name)
+            element.clear()
+
+
+_LOADERS = {".csv": _load_csv, ".json": _load_json, ".xml": _load_xml}
+
+
+def load_sanctions_file(path: str) -> Iterator[SanctionsEntry]:
+    """Entries of one list drop; the file name (without extension) is the default list name."""
+    base, extension = os.path.splitext(path)
+    loader = _LOADERS.get(extension.lower())
+    if loader is None:
+        raise ValueError(f"Unsupported sanctions list format: {path}")
+    return loader(path, os.path.basename(base))
+
+
+def files_signature(paths: Sequence[str]) -> str:
+    """Changes whenever one of the list files is replaced, grows or shrinks."""
+    parts = []
+    for path in paths:
+        stat = os.stat(path)
+        parts.append(f"{path}:{stat.st_size}:{stat.st_mtime_ns}")
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def build_sanctions_index(paths: Sequence[str], error_rate: float = settings.SANCTIONS_BLOOM_ERROR_RATE) -> SanctionsIndex:
+    signature = files_signature(paths)
+    entries = (entry for path in paths for entry in load_sanctions_file(path))
+    return SanctionsIndex(entries, version=signature, error_rate=error_rate)
+
+
+ReloadListener = Callable[[Optional[SanctionsIndex], SanctionsIndex], Awaitable[None]]
+
+
+class SanctionsIndexStore:
+    """
+    Holds the current `SanctionsIndex`. A reload builds the new index off the event loop
+    and then swaps the reference, so lookups always see one complete list version.
+    Listeners are awaited with the previous and the new index after every swap.
+    """
+
+    def __init__(self, paths: Optional[Sequence[str]] = None):
+        self.paths = list(settings.SANCTIONS_LIST_PATHS if paths is None else paths)
+        self.current: Optional[SanctionsIndex] = None
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: List[ReloadListener] = []
+
+    def add_listener(self, listener: ReloadListener) -> None:
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: ReloadListener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    async def reload(self, force: bool = False) -> bool:
+        """Rebuilds the index if the list files changed (or `force`); returns whether it was swapped."""
+        if not self.paths:
+            return False
+        if not force and self.current is not None and self.current.version == files_signature(self.paths):
+            return False
+        previous = self.current
+        self.current = await asyncio.to_thread(build_sanctions_index, self.paths)
+        for listener in list(self._listeners):
+            try:
+                await listener(previous, self.current)
+            except Exception as e:
+                print(f"Sanctions list reload listener failed: {e}")
+        return True
+
+    def start(self) -> None:
+        """Watches the list files for new versions after the initial `reload`; a no-op while no list is configured."""
+        if self._task is None and self.paths:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(settings.SANCTIONS_LIST_RELOAD_INTERVAL_SECONDS)
+            try:
+                if await self.reload():
+                    print(f"Loaded sanctions lists version {self.current.version[:12]} ({len(self.current)} identifiers).")
+            except Exception as e:
+                print(f"Failed to reload sanctions lists: {e}")
+
+
+sanctions_index_store = SanctionsIndexStore()
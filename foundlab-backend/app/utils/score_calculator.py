@@ -1,7 +1,8 @@
 from math import exp
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 from app.models.score import FlagWithValue
+from app.utils.category_scores import CategoryScoreTables, category_score_tables
 
 
 class ScoreCalculator:
@@ -10,24 +11,35 @@ class ScoreCalculator:
     This implementation uses a weighted average of active flag values for P(x).
     """
 
-    def __init__(self, version: str = "1.0.0"):
+    def __init__(self, version: str = "1.0.0", category_tables: Optional[CategoryScoreTables] = None):
         self.version = version
         self.neutral_probability_score = 0.5  # A neutral starting point for P(x)
+        self.category_tables = category_tables if category_tables is not None else category_score_tables
 
-    def _normalize_flag_value(self, value: Any) -> float:
+    def _normalize_flag_value(self, value: Any, flag_name: Optional[str] = None) -> float:
         """
         Normalizes various flag value types to a float between 0 and 1.
         - `bool`: True -> 1.0, False -> 0.0
         - `int`/`float`: Clamped between 0.0 and 1.0 if outside this range, otherwise used directly.
-        - Other types: Currently defaults to 0.0, could be extended for categorical mapping if needed.
+        - Categorical values: Looked up in the compiled `category_scores` table of the DFC flag `flag_name`.
+        - Other types: Default to 0.0.
         """
         if isinstance(value, bool):
             return 1.0 if value else 0.0
         elif isinstance(value, (int, float)):
             return max(0.0, min(1.0, float(value)))
-        return 0.0  # Default for unhandled types or non-contributing values
+        if flag_name is not None and value is not None:
+            category_score = self.category_tables.lookup(flag_name, value)
+            if category_score is not None:
+                return category_score
+        return 0.0  # Default for unmapped categories or non-contributing values
 
-    def calculate_p_x(self, active_flags: List[FlagWithValue], metadata: Dict[str, Any]) -> Tuple[float, float]:
+    def calculate_p_x(
+        self,
+        active_flags: List[FlagWithValue],
+        metadata: Dict[str, Any],
+        features: Optional[List[FlagWithValue]] = None,
+    ) -> Tuple[float, float]:
         """
         Calculates the raw score and the probability score P(x).
         The formula for P(x) used here is a weighted average:
@@ -35,25 +47,44 @@ class ScoreCalculator:
 
         Args:
             active_flags: A list of `FlagWithValue` instances where `is_active=True`.
-            metadata: Additional metadata for context. Not directly factored into this P(x) calculation.
+            metadata: Additional metadata for context. Not read directly; see `features`.
+            features: Weighted inputs extracted from `metadata` by the compiled feature transforms.
+                They enter the weighted average exactly like active flags.
 
         Returns:
             A tuple (raw_score, probability_score)
         """
-        if not active_flags:
-            return 0.0, self.neutral_probability_score
+        sum_of_weights, sum_of_weighted_values = self.aggregate(active_flags + (features or []))
+        return self.p_x_from_aggregates(sum_of_weights, sum_of_weighted_values)
 
-        sum_of_weighted_values: float = 0.0
+    def flag_contribution(self, flag: FlagWithValue) -> Tuple[float, float]:
+        """
+        Returns the (effective_weight, weighted_value) pair a single flag adds to the P(x) sums.
+        Inactive flags contribute nothing.
+        """
+        if not flag.is_active:
+            return 0.0, 0.0
+        effective_weight = max(0.0, flag.weight)
+        return effective_weight, self._normalize_flag_value(flag.value, flag.name) * effective_weight
+
+    def aggregate(self, active_flags: List[FlagWithValue]) -> Tuple[float, float]:
+        """Returns the running sums (Σ effective_weight_i, Σ normalized_flag_value_i * effective_weight_i)."""
         sum_of_weights: float = 0.0
+        sum_of_weighted_values: float = 0.0
 
         for flag in active_flags:
-            normalized_value = self._normalize_flag_value(flag.value)
-            effective_weight = max(0.0, flag.weight)
-
-            sum_of_weighted_values += normalized_value * effective_weight
+            effective_weight, weighted_value = self.flag_contribution(flag)
             sum_of_weights += effective_weight
+            sum_of_weighted_values += weighted_value
+
+        return sum_of_weights, sum_of_weighted_values
 
-        if sum_of_weights == 0:
+    def p_x_from_aggregates(self, sum_of_weights: float, sum_of_weighted_values: float) -> Tuple[float, float]:
+        """
+        Derives (raw_score, probability_score) from the running sums of the weighted average.
+        Lets callers that maintain Σw and Σwv incrementally rescore in O(1).
+        """
+        if sum_of_weights <= 0:
             return 0.0, self.neutral_probability_score
 
         raw_score = sum_of_weighted_values
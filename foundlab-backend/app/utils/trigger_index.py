@@ -0,0 +1,218 @@
+import hashlib
+import json
+import time
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.models.risk import RiskLevel, RiskTrigger, RiskTriggerDetail, WindowEvent
+from app.models.score import ScoreResult
+from app.utils.risk_expression import CompiledExpression, ExpressionError, compile_custom_logic
+from app.utils.window_counters import WindowCounterStore
+
+RISK_LEVEL_ORDER = {
+    RiskLevel.LOW: 0,
+    RiskLevel.MEDIUM: 1,
+    RiskLevel.HIGH: 2,
+    RiskLevel.CRITICAL: 3,
+}
+
+
+def trigger_set_version(triggers: List[RiskTrigger]) -> str:
+    """
+    Content hash of a trigger set: it changes whenever a trigger's rule, level or activation
+    changes, and is independent of storage ids, timestamps and catalog order.
+    """
+    rules = sorted(
+        (trigger.model_dump(mode="json", exclude={"id", "created_at", "updated_at", "description"}) for trigger in triggers),
+        key=lambda rule: rule["name"],
+    )
+    canonical = json.dumps(rules, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+class TriggerIndex:
+    """
+    In-memory index of the active Sentinela triggers, partitioned by trigger type.
+
+    - `flag_presence` triggers are keyed by `flag_name` and probed once per active flag.
+    - `score_threshold` triggers are kept sorted by threshold, so one bisect finds every
+      threshold above the score.
+    - `custom_logic` triggers are compiled once into restricted expressions and evaluated one by one.
+    - `window` triggers count events per entity in sliding-window counters; they are evaluated
+      last, against the level reached by the other triggers.
+
+    Fired triggers are reported in catalog order, matching a linear scan of the triggers.
+    """
+
+    def __init__(self, triggers: List[RiskTrigger]):
+        self.triggers = triggers
+        self.version = trigger_set_version(triggers)
+        self._flag_triggers: Dict[str, List[Tuple[int, RiskTrigger]]] = {}
+        self._custom_triggers: List[Tuple[int, RiskTrigger, CompiledExpression]] = []
+        self._window_triggers: List[Tuple[int, RiskTrigger]] = []
+        thresholds: List[Tuple[float, int, RiskTrigger]] = []
+
+        for position, trigger in enumerate(triggers):
+            match trigger.trigger_type:
+                case "score_threshold":
+                    if trigger.score_threshold is not None:
+                        thresholds.append((trigger.score_threshold, position, trigger))
+                case "flag_presence":
+                    if trigger.flag_name:
+                        self._flag_triggers.setdefault(trigger.flag_name, []).append((position, trigger))
+                case "custom_logic":
+                    if trigger.custom_logic_params:
+                        try:
+                            expression = compile_custom_logic(trigger.custom_logic_params)
+                        except ExpressionError as e:
+                            print(f"Skipping custom_logic trigger '{trigger.name}': {e}")
+                            continue
+                        self._custom_triggers.append((position, trigger, expression))
+                case "window":
+                    if trigger.window_params:
+                        self._window_triggers.append((position, trigger))
+
+        thresholds.sort(key=lambda entry: entry[0])
+        self._thresholds = [threshold for threshold, _, _ in thresholds]
+        self._threshold_triggers = [(position, trigger) for _, position, trigger in thresholds]
+
+    def __len__(self) -> int:
+        return len(self.triggers)
+
+    @property
+    def has_window_triggers(self) -> bool:
+        return bool(self._window_triggers)
+
+    def evaluate(
+        self,
+        score_result: ScoreResult,
+        additional_context: Optional[Dict[str, Any]] = None,
+        window_counters: Optional[WindowCounterStore] = None,
+        now: Optional[float] = None,
+    ) -> List[RiskTriggerDetail]:
+        """
+        Returns the details of every trigger fired by `score_result`, in catalog order.
+        `window` triggers are only evaluated when `window_counters` is given; they record the
+        assessment's events into it, so each score must be evaluated once.
+        """
+        fired: List[Tuple[int, RiskTriggerDetail]] = []
+        score = score_result.probability_score
+
+        # Every trigger whose threshold is strictly above the score fires.
+        for position, trigger in self._threshold_triggers[bisect_right(self._thresholds, score):]:
+            fired.append(
+                (
+                    position,
+                    RiskTriggerDetail(
+                        trigger_name=trigger.name,
+                        risk_level=trigger.risk_level,
+                        reason=f"Score ({score:.4f}) is below threshold ({trigger.score_threshold:.4f}).",
+                    ),
+                )
+            )
+
+        if self._flag_triggers:
+            seen_flags = set()
+            for flag in score_result.flags_used:
+                if not flag.is_active or flag.name in seen_flags:
+                    continue
+                seen_flags.add(flag.name)
+                for position, trigger in self._flag_triggers.get(flag.name, ()):
+                    fired.append(
+                        (
+                            position,
+                            RiskTriggerDetail(
+                                trigger_name=trigger.name,
+                                risk_level=trigger.risk_level,
+                                reason=f"Flag '{trigger.flag_name}' is active with value '{flag.value}'.",
+                            ),
+                        )
+                    )
+
+        if self._custom_triggers:
+            active_flags = {}
+            for flag in score_result.flags_used:
+                if flag.is_active:
+                    active_flags.setdefault(flag.name, flag.value)
+            for position, trigger, expression in self._custom_triggers:
+                if expression.evaluate(score, active_flags, additional_context):
+                    reason = f"Custom logic: `{expression.source}` holds for score ({score:.4f})."
+                    fired.append(
+                        (position, RiskTriggerDetail(trigger_name=trigger.name, risk_level=trigger.risk_level, reason=reason))
+                    )
+
+        if self._window_triggers and window_counters is not None:
+            fired.extend(self._evaluate_windows(score_result, fired, window_counters, now or time.time()))
+
+        fired.sort(key=lambda entry: entry[0])
+        return [detail for _, detail in fired]
+
+    def _evaluate_windows(
+        self,
+        score_result: ScoreResult,
+        fired: List[Tuple[int, RiskTriggerDetail]],
+        window_counters: WindowCounterStore,
+        now: float,
+    ) -> List[Tuple[int, RiskTriggerDetail]]:
+        """
+        Counts this assessment's events and fires the window triggers that reach `min_count`.
+        Assessment levels are taken before window triggers apply, so a window trigger never
+        counts its own escalations. Only a matching event can fire a window trigger.
+        """
+        score = score_result.probability_score
+        base_level = max((RISK_LEVEL_ORDER[detail.risk_level] for _, detail in fired), default=0)
+        window_fired = []
+        for position, trigger in self._window_triggers:
+            params = trigger.window_params
+            if params.event == WindowEvent.ASSESSMENT_LEVEL:
+                matches = base_level >= RISK_LEVEL_ORDER[params.min_risk_level]
+                event = f"assessments at or above {params.min_risk_level.value}"
+            else:
+                matches = score < params.score_threshold
+                event = f"scores below {params.score_threshold:.4f}"
+            if not matches:
+                continue
+
+            count = window_counters.record(score_result.entity_id, trigger.name, params.window_seconds, now)
+            if count >= params.min_count:
+                window_fired.append(
+                    (
+                        position,
+                        RiskTriggerDetail(
+                            trigger_name=trigger.name,
+                            risk_level=trigger.risk_level,
+                            reason=f"{count} {event} within {params.window_seconds}s (minimum {params.min_count}).",
+                        ),
+                    )
+                )
+        return window_fired
+
+
+class TriggerIndexCache:
+    """
+    Process-wide cache of the active trigger index.
+    Sentinela bumps the `risk_triggers` version in `catalog_versions` on every trigger
+    create/update/delete, and every process (API workers, the standalone worker) rebuilds
+    its index lazily once it reads a version other than the one the index was built from.
+    """
+
+    CATALOG = "risk_triggers"
+
+    def __init__(self):
+        self._built_version = -1
+        self.index: Optional[TriggerIndex] = None
+
+    def is_stale(self, catalog_version: int) -> bool:
+        return self.index is None or self._built_version != catalog_version
+
+    def invalidate(self) -> None:
+        """Forgets the built index, so it is rebuilt on its next use."""
+        self.index = None
+
+    def load(self, triggers: List[RiskTrigger], catalog_version: int) -> TriggerIndex:
+        self.index = TriggerIndex(triggers)
+        self._built_version = catalog_version
+        return self.index
+
+
+trigger_index_cache = TriggerIndexCache()
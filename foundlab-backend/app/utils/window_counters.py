@@ -0,0 +1,182 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.config import settings
+
+# Counters of one entity, keyed by window trigger name.
+EntityCounters = Dict[str, "SlidingWindowCounter"]
+
+
+class SlidingWindowCounter:
+    """
+    Ring buffer of time buckets counting events over a sliding window.
+
+    Each slot remembers which bucket epoch it holds, so stale slots are reset lazily when
+    reused and ignored when counting; nothing is ever shifted or expired eagerly. The
+    window is resolved to `window_seconds / buckets`.
+    """
+
+    __slots__ = ("window_seconds", "bucket_seconds", "counts", "epochs")
+
+    def __init__(self, window_seconds: int, buckets: int = settings.SENTINELA_WINDOW_BUCKETS):
+        self.window_seconds = window_seconds
+        self.bucket_seconds = window_seconds / buckets
+        self.counts = [0] * buckets
+        self.epochs = [-1] * buckets
+
+    def _epoch(self, timestamp: float) -> int:
+        return int(timestamp // self.bucket_seconds)
+
+    def add(self, timestamp: float) -> int:
+        """Records one event at `timestamp` (epoch seconds); returns the count within the window."""
+        epoch = self._epoch(timestamp)
+        slot = epoch % len(self.counts)
+        if self.epochs[slot] != epoch:
+            self.epochs[slot] = epoch
+            self.counts[slot] = 0
+        self.counts[slot] += 1
+        return self.count(timestamp)
+
+    def count(self, timestamp: float) -> int:
+        """Returns how many events fall within the window ending at `timestamp`."""
+        epoch = self._epoch(timestamp)
+        oldest = epoch - len(self.counts)
+        return sum(count for count, slot_epoch in zip(self.counts, self.epochs) if oldest < slot_epoch <= epoch)
+
+    def expires_at(self) -> float:
+        """Epoch seconds after which every recorded event has left the window."""
+        return (max(self.epochs) + 1) * self.bucket_seconds + self.window_seconds
+
+    def to_document(self, trigger_name: str) -> Dict[str, Any]:
+        return {
+            "trigger_name": trigger_name,
+            "window_seconds": self.window_seconds,
+            "counts": self.counts,
+            "epochs": self.epochs,
+        }
+
+    @classmethod
+    def from_document(cls, document: Dict[str, Any]) -> "SlidingWindowCounter":
+        counter = cls(document["window_seconds"], len(document["counts"]))
+        counter.counts = list(document["counts"])
+        counter.epochs = list(document["epochs"])
+        return counter
+
+
+class WindowCounterStore:
+    """
+    Per-entity sliding-window counters for Sentinela `window` triggers.
+
+    Entities are kept in an LRU bounded by `max_entities`. Changed entities are tracked as
+    dirty and written to Mongo by `SentinelaService` snapshots, so counters survive restarts
+    and evictions; an evicted entity that was not snapshot yet is held until the next one.
+    Counters are local to the process, like the trigger index.
+    """
+
+    def __init__(self, max_entities: int = settings.SENTINELA_WINDOW_MAX_ENTITIES):
+        self.max_entities = max_entities
+        self._entities: "OrderedDict[str, EntityCounters]" = OrderedDict()
+        self._dirty: set = set()
+        self._evicted_dirty: Dict[str, EntityCounters] = {}
+        self.last_snapshot_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entities)
+
+    def clear(self) -> None:
+        self._entities.clear()
+        self._dirty.clear()
+        self._evicted_dirty.clear()
+        self.last_snapshot_at = 0.0
+
+    def missing(self, entity_ids: Iterable[str]) -> List[str]:
+        """Returns the entities whose counters are not in memory and must be loaded from a snapshot."""
+        return [
+            entity_id
+            for entity_id in dict.fromkeys(entity_ids)
+            if entity_id not in self._entities and entity_id not in self._evicted_dirty
+        ]
+
+    def restore(self, entity_id: str, document: Optional[Dict[str, Any]]) -> None:
+        """Loads an entity's counters from its snapshot document (or starts empty), unless already present."""
+        if entity_id in self._entities:
+            return
+        counters: EntityCounters = {}
+        if document:
+            counters = {c["trigger_name"]: SlidingWindowCounter.from_document(c) for c in document.get("counters", [])}
+        self._put(entity_id, counters)
+
+    def _put(self, entity_id: str, counters: EntityCounters) -> None:
+        self._entities[entity_id] = counters
+        while len(self._entities) > self.max_entities:
+            evicted_id, evicted = self._entities.popitem(last=False)
+            if evicted_id in self._dirty:
+                self._dirty.discard(evicted_id)
+                self._evicted_dirty[evicted_id] = evicted
+
+    def _get(self, entity_id: str) -> EntityCounters:
+        counters = self._entities.get(entity_id)
+        if counters is not None:
+            self._entities.move_to_end(entity_id)
+            return counters
+        counters = self._evicted_dirty.pop(entity_id, None)
+        if counters is not None:
+            self._dirty.add(entity_id)
+        self._put(entity_id, counters if counters is not None else {})
+        return self._entities[entity_id]
+
+    def record(self, entity_id: str, trigger_name: str, window_seconds: int, timestamp: float) -> int:
+        """
+        Records one event of `trigger_name` for the entity; returns the event count within the window.
+        A counter whose window length no longer matches the trigger is started over.
+        """
+        counters = self._get(entity_id)
+        counter = counters.get(trigger_name)
+        if counter is None or counter.window_seconds != window_seconds:
+            counter = counters[trigger_name] = SlidingWindowCounter(window_seconds)
+        self._dirty.add(entity_id)
+        return counter.add(timestamp)
+
+    @property
+    def dirty_count(self) -> int:
+        return len(self._dirty) + len(self._evicted_dirty)
+
+    def take_snapshot(self) -> List[Dict[str, Any]]:
+        """
+        Returns snapshot documents for every entity changed since the last snapshot and marks
+        them clean; pass the documents to `requeue` if they could not be written.
+        """
+        changed = dict(self._evicted_dirty)
+        changed.update((entity_id, self._entities[entity_id]) for entity_id in self._dirty if entity_id in self._entities)
+        self._dirty.clear()
+        self._evicted_dirty.clear()
+
+        documents = []
+        for entity_id, counters in changed.items():
+            if not counters:
+                continue
+            documents.append(
+                {
+                    "_id": entity_id,
+                    "counters": [counter.to_document(name) for name, counter in counters.items()],
+                    "expires_at": datetime.utcfromtimestamp(max(c.expires_at() for c in counters.values())),
+                    "updated_at": datetime.utcnow(),
+                }
+            )
+        return documents
+
+    def requeue(self, documents: List[Dict[str, Any]]) -> None:
+        """Marks the entities of unwritten snapshot documents dirty again, so the next snapshot retries them."""
+        for document in documents:
+            entity_id = document["_id"]
+            if entity_id in self._entities:
+                self._dirty.add(entity_id)
+            elif entity_id not in self._evicted_dirty:
+                # Evicted as clean while the write was in flight; the document holds its latest counters.
+                self._evicted_dirty[entity_id] = {
+                    c["trigger_name"]: SlidingWindowCounter.from_document(c) for c in document["counters"]
+                }
+
+
+window_counter_store = WindowCounterStore()
@@ -54,11 +54,33 @@ async def clear_database(mongo_client_fixture: AsyncIOMotorClient):
         await db.drop_collection(collection_name)
     print(f"Cleared database: {db.name}")
 
+    from app.utils.assessment_cache import assessment_cache
+    from app.utils.catalog_versions import catalog_versions
+    from app.utils.category_scores import category_score_tables
+    from app.utils.circuit_breaker import provider_guards
+    from app.utils.feature_transforms import feature_extractor_cache
+    from app.utils.provider_cache import provider_result_cache
+    from app.utils.provider_scheduler import provider_schedulers
+    from app.utils.trigger_index import trigger_index_cache
+    from app.utils.window_counters import window_counter_store
+    catalog_versions.clear()
+    category_score_tables.invalidate()
+    feature_extractor_cache.invalidate()
+    trigger_index_cache.invalidate()
+    window_counter_store.clear()
+    assessment_cache.clear()
+    provider_result_cache.clear()
+    provider_guards.clear()
+    provider_schedulers.clear()
+
     from app.services.score_service import ScoreLabService
     from app.services.dfc_service import DFCService
+    from app.services.sherlock_batch_service import SherlockBatchService
+    from app.services.sherlock_rescreen_service import SherlockRescreenService
     from app.services.sherlock_service import SherlockService
     from app.services.nft_service import SigilMeshService
     from app.services.risk_service import SentinelaService
+    from app.services.risk_stats_service import RiskStatsService
     from app.services.gas_monitor_service import GasMonitorService
 
     import app.routers.dfc_router as dfc_router_module
@@ -71,8 +93,11 @@ async def clear_database(mongo_client_fixture: AsyncIOMotorClient):
     dfc_router_module.dfc_service = DFCService()
     score_router_module.score_service = ScoreLabService()
     sherlock_router_module.sherlock_service = SherlockService()
+    sherlock_router_module.sherlock_batch_service = SherlockBatchService()
+    sherlock_router_module.sherlock_rescreen_service = SherlockRescreenService()
     nft_router_module.sigilmesh_service = SigilMeshService()
     risk_router_module.sentinela_service = SentinelaService()
+    risk_router_module.risk_stats_service = RiskStatsService()
     gas_monitor_router_module.gas_monitor_service = GasMonitorService()
 
 
@@ -0,0 +1,123 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request, Response
+from httpx import AsyncClient
+
+from app.models.risk import RiskAlert, RiskLevel, RiskTriggerDetail
+from app.models.score import FlagWithValue
+from app.services.alert_dispatcher import AlertDispatcher
+
+
+def _receiver_app(received: dict) -> FastAPI:
+    """Local stand-in for a case-management webhook: `/flaky` fails once with 503, `/rejecting` always 400."""
+    receiver = FastAPI()
+    calls = {"flaky": 0}
+
+    @receiver.post("/flaky")
+    async def flaky(request: Request):
+        calls["flaky"] += 1
+        if calls["flaky"] == 1:
+            return Response(status_code=503)
+        received.setdefault("flaky", []).extend((await request.json())["alerts"])
+        return Response(status_code=204)
+
+    @receiver.post("/rejecting")
+    async def rejecting():
+        return Response(status_code=400, content="unknown tenant")
+
+    return receiver
+
+
+@pytest.mark.asyncio
+async def test_critical_rules_are_dispatched_in_batches(
+    client: AsyncClient, create_score_result, create_risk_trigger, faker_instance, monkeypatch
+):
+    received: dict = {}
+    receiver_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=_receiver_app(received)))
+    dispatcher = AlertDispatcher(
+        webhook_urls=["http://receiver/flaky", "http://receiver/rejecting"],
+        client=receiver_client,
+        min_risk_level=RiskLevel.CRITICAL,
+        batch_size=10,
+        flush_interval_seconds=0.05,
+        max_retries=2,
+        backoff_base_seconds=0.01,
+    )
+    monkeypatch.setattr("app.services.risk_service.alert_dispatcher", dispatcher)
+    dispatcher.start()
+
+    await create_risk_trigger(name="alert_critical", score_threshold=0.3, risk_level=RiskLevel.CRITICAL)
+    await create_risk_trigger(name="alert_high", score_threshold=0.5, risk_level=RiskLevel.HIGH)
+    scores = [await create_score_result(flags=[FlagWithValue(name="f", value=value, weight=1.0)]) for value in (0.1, 0.2, 0.4)]
+    for score in scores:
+        response = await client.post("/sentinela/assess", json={"entity_id": score.entity_id, "score_id": str(score.id)})
+        assert response.status_code == 200
+    # A memoized re-assessment is not alerted twice.
+    await client.post("/sentinela/assess", json={"entity_id": scores[0].entity_id, "score_id": str(scores[0].id)})
+
+    await dispatcher.stop()
+    await receiver_client.aclose()
+
+    alerts = received["flaky"]
+    assert sorted(alert["score_id"] for alert in alerts) == sorted(str(score.id) for score in scores[:2])
+    assert all(alert["trigger"]["trigger_name"] == "alert_critical" for alert in alerts)
+
+    from app.database import get_collection
+    dead_letters = await get_collection("alert_dead_letters").find({}).to_list(length=None)
+    assert {d["webhook_url"] for d in dead_letters} == {"http://receiver/rejecting"}
+    assert all(d["attempts"] == 1 and "400" in d["error"] for d in dead_letters)
+    assert sum(len(d["alerts"]) for d in dead_letters) == 2
+
+
+@pytest.mark.asyncio
+async def test_undeliverable_batches_are_dead_lettered_after_retries(client: AsyncClient):
+    def unreachable(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("connection refused", request=request)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(unreachable)) as unreachable_client:
+        dispatcher = AlertDispatcher(
+            webhook_urls=["http://down/hook"], client=unreachable_client, max_retries=3, backoff_base_seconds=0.001
+        )
+        assert await dispatcher._deliver_to("http://down/hook", {"alerts": [{"entity_id": "e"}]}) is False
+
+    from app.database import get_collection
+    dead_letter = await get_collection("alert_dead_letters").find_one({"webhook_url": "http://down/hook"})
+    assert dead_letter["attempts"] == 4
+    assert dead_letter["error"].startswith("ConnectError")
+
+
+@pytest.mark.asyncio
+async def test_failing_webhook_does_not_stall_the_others(client: AsyncClient):
+    received = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/down":
+            return httpx.Response(503)
+        received.extend(json.loads(request.content)["alerts"])
+        return httpx.Response(204)
+
+    alert = RiskAlert(
+        entity_id="e",
+        score_id="s",
+        overall_risk_level=RiskLevel.CRITICAL,
+        trigger=RiskTriggerDetail(trigger_name="t", risk_level=RiskLevel.CRITICAL, reason="r"),
+    )
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as mock_client:
+        dispatcher = AlertDispatcher(
+            webhook_urls=["http://hooks/down", "http://hooks/up"],
+            client=mock_client,
+            flush_interval_seconds=0.01,
+            max_retries=3,
+            backoff_base_seconds=10.0,
+        )
+        dispatcher.start()
+        for _ in range(2):
+            dispatcher.enqueue([alert])
+            await asyncio.sleep(0.05)
+        # "/down" is still backing off on its first batch while "/up" got both.
+        assert len(received) == 2
+        await dispatcher.stop(timeout_seconds=0.01)
+    assert not dispatcher.is_running
@@ -205,3 +205,28 @@ async def test_apply_dynamic_flags_numeric_output_value(client: AsyncClient, cre
     assert response.json()["evaluated_flags"][0]["flag_name"] == "transaction_volume_flag"
     assert response.json()["evaluated_flags"][0]["is_active"] is True
     assert response.json()["evaluated_flags"][0]["value"] == 1500.50
+
+
+@pytest.mark.asyncio
+async def test_apply_dynamic_flags_category_scores(client: AsyncClient, faker_instance):
+    """Test that category flags resolve their value through the category_scores table."""
+    response = await client.post("/flags/definitions", json={
+        "name": "exchange_tier",
+        "description": "Counterparty exchange tier.",
+        "type": "category",
+        "rules": [{"field": "tier", "condition": "in", "value": ["tier1", "Unregulated"]}],
+        "weight": 0.4,
+        "category_scores": {"tier1": 1.0, "unregulated": 0.1},
+    })
+    assert response.status_code == 201
+    assert response.json()["category_scores"] == {"tier1": 1.0, "unregulated": 0.1}
+
+    response = await client.post("/flags/apply", json={"entity_id": faker_instance.uuid4(), "metadata": {"tier": "Unregulated"}})
+    assert response.status_code == 200
+    evaluated = response.json()["evaluated_flags"][0]
+    assert evaluated["is_active"] is True
+    assert evaluated["value"] == pytest.approx(0.1)
+
+    await client.put("/flags/definitions/exchange_tier", json={"category_scores": {"tier1": 1.0, "unregulated": 0.3}})
+    response = await client.post("/flags/apply", json={"entity_id": faker_instance.uuid4(), "metadata": {"tier": "Unregulated"}})
+    assert response.json()["evaluated_flags"][0]["value"] == pytest.approx(0.3)
@@ -0,0 +1,62 @@
+import pytest
+from httpx import AsyncClient
+
+from app.models.live import LiveEvent, LiveEventType
+from app.models.risk import RiskLevel
+from app.models.score import FlagWithValue
+from app.routers.live_router import event_stream
+from app.services.live_feed import BroadcastHub, Subscription, live_hub
+
+
+def _event(entity_id: str, risk_level=None, event_type=LiveEventType.RISK_ASSESSMENT) -> LiveEvent:
+    return LiveEvent(type=event_type, entity_id=entity_id, risk_level=risk_level, data={})
+
+
+@pytest.mark.asyncio
+async def test_hub_filters_and_drops_slow_subscribers():
+    hub = BroadcastHub(max_subscribers=2)
+    high_only = Subscription(min_risk_level=RiskLevel.HIGH, queue_size=10)
+    slow = Subscription(entity_ids=["e1"], queue_size=2)
+    assert hub.subscribe(high_only) and hub.subscribe(slow)
+    assert hub.subscribe(Subscription()) is False
+
+    hub.publish(_event("e1", RiskLevel.LOW))
+    hub.publish(_event("e2", RiskLevel.CRITICAL))
+    hub.publish(_event("e1", event_type=LiveEventType.GAS_ANOMALY))
+    assert (await high_only.get(timeout=1)).entity_id == "e2"
+    # Events without a risk level are not filtered out by `min_risk_level`.
+    assert (await high_only.get(timeout=1)).type == LiveEventType.GAS_ANOMALY
+
+    # `slow` holds two unread events; the third one drops it instead of growing its queue.
+    hub.publish(_event("e1", RiskLevel.HIGH))
+    assert len(hub) == 1 and hub.dropped_count == 1
+    assert await slow.get(timeout=1) is None
+    assert slow.closed_reason == "slow consumer"
+
+
+@pytest.mark.asyncio
+async def test_assessments_are_streamed_as_server_sent_events(
+    client: AsyncClient, create_score_result, create_risk_trigger, faker_instance
+):
+    await create_risk_trigger(name="live_high", score_threshold=0.5, risk_level=RiskLevel.HIGH)
+    score = await create_score_result(flags=[FlagWithValue(name="f", value=0.2, weight=1.0)])
+    other = await create_score_result(flags=[FlagWithValue(name="f", value=0.2, weight=1.0)])
+
+    subscription = Subscription(entity_ids=[score.entity_id])
+    assert live_hub.subscribe(subscription)
+    stream = event_stream(subscription, heartbeat_seconds=0.01)
+    assert await stream.__anext__() == ": keep-alive\n\n"
+
+    for s in (other, score):
+        response = await client.post("/sentinela/assess", json={"entity_id": s.entity_id, "score_id": str(s.id)})
+        assert response.status_code == 200
+
+    frame = await stream.__anext__()
+    assert frame.startswith("event: risk_assessment\ndata: ")
+    event = LiveEvent.model_validate_json(frame.split("data: ", 1)[1])
+    assert event.entity_id == score.entity_id
+    assert event.risk_level == RiskLevel.HIGH
+    assert event.data["score_id"] == str(score.id)
+
+    await stream.aclose()
+    assert subscription not in live_hub._subscribers
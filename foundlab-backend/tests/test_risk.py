@@ -1,7 +1,9 @@
+from datetime import datetime
+
 import pytest
 from httpx import AsyncClient
 
-from app.models.risk import RiskLevel, RiskTrigger
+from app.models.risk import RiskLevel, RiskTrigger, StatsGranularity
 from app.models.score import ScoreResult, FlagWithValue
 
 
@@ -235,3 +237,327 @@ async def test_assess_risk_mismatched_entity_id(client: AsyncClient, create_scor
     })
     assert response.status_code == 400
     assert "does not belong to entity" in response.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_assess_risk_custom_logic_expression(client: AsyncClient, create_score_result, create_risk_trigger, faker_instance):
+    entity_id = faker_instance.uuid4()
+    score_result = await create_score_result(
+        entity_id=entity_id,
+        flags=[FlagWithValue(name="new_device", value=True, weight=0.5), FlagWithValue(name="low", value=0.1, weight=0.5)],
+    )
+    await create_risk_trigger(
+        name="new_device_burst",
+        trigger_type="custom_logic",
+        custom_logic_params={"expression": "score < 0.8 and has_flag('new_device') and ctx('user_daily_transactions', 0) >= 5"},
+        risk_level=RiskLevel.HIGH,
+    )
+    await create_risk_trigger(
+        name="sanctioned_country",
+        trigger_type="custom_logic",
+        custom_logic_params={"expression": "context['country'] in ['KP', 'IR']"},
+        risk_level=RiskLevel.CRITICAL,
+    )
+
+    response = await client.post("/sentinela/assess", json={
+        "entity_id": entity_id,
+        "score_id": str(score_result.id),
+        "additional_context": {"user_daily_transactions": 7, "country": "BR"},
+    })
+    result = response.json()
+    assert response.status_code == 200
+    assert result["overall_risk_level"] == RiskLevel.HIGH.value
+    assert [r["trigger_name"] for r in result["triggered_rules"]] == ["new_device_burst"]
+
+
+@pytest.mark.asyncio
+async def test_create_risk_trigger_invalid_expression(client: AsyncClient):
+    for expression in ["__import__('os').system('id')", "score.__class__", "score <", "unknown_name > 1"]:
+        response = await client.post("/sentinela/triggers", json={
+            "name": "invalid_expression_trigger",
+            "description": "Rejected at creation",
+            "trigger_type": "custom_logic",
+            "custom_logic_params": {"expression": expression},
+            "risk_level": "HIGH",
+        })
+        assert response.status_code == 422, expression
+
+
+@pytest.mark.asyncio
+async def test_assess_risk_trigger_index_refreshes_on_crud(client: AsyncClient, create_score_result, create_risk_trigger, faker_instance):
+    entity_id = faker_instance.uuid4()
+    score_result = await create_score_result(
+        entity_id=entity_id,
+        flags=[FlagWithValue(name="mixer_usage", value=True, weight=0.5), FlagWithValue(name="low", value=0.2, weight=0.5)],
+    )
+    assess_payload = {"entity_id": entity_id, "score_id": str(score_result.id)}
+
+    response = await client.post("/sentinela/assess", json=assess_payload)
+    assert response.json()["overall_risk_level"] == RiskLevel.LOW.value
+
+    await create_risk_trigger(name="loose_threshold", score_threshold=0.9, risk_level=RiskLevel.MEDIUM)
+    await create_risk_trigger(name="tight_threshold", score_threshold=0.1, risk_level=RiskLevel.CRITICAL)
+    await create_risk_trigger(name="mixer_flag", trigger_type="flag_presence", flag_name="mixer_usage", risk_level=RiskLevel.HIGH)
+
+    response = await client.post("/sentinela/assess", json=assess_payload)
+    result = response.json()
+    assert result["overall_risk_level"] == RiskLevel.HIGH.value
+    assert [r["trigger_name"] for r in result["triggered_rules"]] == ["loose_threshold", "mixer_flag"]
+
+    await client.put("/sentinela/triggers/mixer_flag", json={"is_active": False})
+    response = await client.post("/sentinela/assess", json=assess_payload)
+    assert response.json()["overall_risk_level"] == RiskLevel.MEDIUM.value
+    assert [r["trigger_name"] for r in response.json()["triggered_rules"]] == ["loose_threshold"]
+
+
+@pytest.mark.asyncio
+async def test_trigger_index_caches_sharing_a_database_see_each_others_changes(client: AsyncClient, create_risk_trigger):
+    from app.services.risk_service import SentinelaService
+    from app.utils.catalog_versions import CatalogVersions
+    from app.utils.trigger_index import TriggerIndexCache
+
+    # Two processes (e.g. an API worker and the standalone Sentinela worker), each with its own caches.
+    api = SentinelaService(TriggerIndexCache(), CatalogVersions(check_interval_seconds=0.0))
+    worker = SentinelaService(TriggerIndexCache(), CatalogVersions(check_interval_seconds=0.0))
+    await create_risk_trigger(name="first_threshold", score_threshold=0.5)
+    assert (await api.get_trigger_index()).version == (await worker.get_trigger_index()).version
+
+    await api.create_risk_trigger({
+        "name": "second_threshold", "description": "Low threshold.", "trigger_type": "score_threshold",
+        "score_threshold": 0.2, "risk_level": RiskLevel.LOW.value, "is_active": True,
+    })
+    worker_index = await worker.get_trigger_index()
+    assert worker_index.version == (await api.get_trigger_index()).version
+    assert sorted(t.name for t in await worker.get_all_risk_triggers()) == ["first_threshold", "second_threshold"]
+
+    await worker.delete_risk_trigger("second_threshold")
+    assert (await api.get_trigger_index()).version != worker_index.version
+    assert (await api.get_trigger_index()).version == (await worker.get_trigger_index()).version
+
+
+@pytest.mark.asyncio
+async def test_assess_risk_batch(client: AsyncClient, create_score_result, create_risk_trigger, faker_instance):
+    low_entity, high_entity = faker_instance.uuid4(), faker_instance.uuid4()
+    low_score = await create_score_result(entity_id=low_entity, flags=[FlagWithValue(name="f", value=0.1, weight=1.0)])
+    high_score = await create_score_result(entity_id=high_entity, flags=[FlagWithValue(name="f", value=0.9, weight=1.0)])
+    await create_risk_trigger(name="batch_low_score", score_threshold=0.5, risk_level=RiskLevel.HIGH)
+
+    response = await client.post("/sentinela/assess/batch", json={"assessments": [
+        {"entity_id": low_entity, "score_id": str(low_score.id)},
+        {"entity_id": high_entity, "score_id": str(high_score.id)},
+        {"entity_id": low_entity, "score_id": str(high_score.id)},
+        {"entity_id": low_entity, "score_id": "60a7d9b01c9d440000a7b4c8"},
+    ]})
+    assert response.status_code == 200
+    result = response.json()
+    assert [a["overall_risk_level"] for a in result["assessments"]] == [RiskLevel.HIGH.value, RiskLevel.LOW.value]
+    assert all(a["_id"] for a in result["assessments"])
+    assert sorted(e["status_code"] for e in result["errors"]) == [400, 404]
+
+    stored = await client.post("/sentinela/assess", json={"entity_id": low_entity, "score_id": str(low_score.id)})
+    assert stored.json()["overall_risk_level"] == RiskLevel.HIGH.value
+
+
+@pytest.mark.asyncio
+async def test_assess_risk_window_trigger(client: AsyncClient, create_score_result, create_risk_trigger, faker_instance):
+    from app.routers import risk_router
+    from app.utils.window_counters import window_counter_store
+
+    entity_id = faker_instance.uuid4()
+    score_results = [
+        await create_score_result(entity_id=entity_id, flags=[FlagWithValue(name="mixer_usage", value=True, weight=1.0)])
+        for _ in range(4)
+    ]
+    await create_risk_trigger(name="mixer_flag_window", trigger_type="flag_presence", flag_name="mixer_usage", risk_level=RiskLevel.HIGH)
+    response = await client.post("/sentinela/triggers", json={
+        "name": "repeated_high_risk",
+        "description": "Third HIGH assessment within 24h",
+        "trigger_type": "window",
+        "window_params": {"event": "assessment_level", "min_risk_level": "HIGH", "window_seconds": 86400, "min_count": 3},
+        "risk_level": "CRITICAL",
+    })
+    assert response.status_code == 201, response.text
+    assess_payloads = [{"entity_id": entity_id, "score_id": str(score_result.id)} for score_result in score_results]
+
+    levels = [(await client.post("/sentinela/assess", json=payload)).json()["overall_risk_level"] for payload in assess_payloads[:3]]
+    assert levels == [RiskLevel.HIGH.value, RiskLevel.HIGH.value, RiskLevel.CRITICAL.value]
+
+    # Re-assessing the same score returns the stored assessment and is not a new window event.
+    repeated = (await client.post("/sentinela/assess", json=assess_payloads[0])).json()
+    assert repeated["overall_risk_level"] == RiskLevel.HIGH.value
+
+    # Counters survive a restart through their Mongo snapshot.
+    await risk_router.sentinela_service.snapshot_window_counters(force=True)
+    window_counter_store.clear()
+    result = (await client.post("/sentinela/assess", json=assess_payloads[3])).json()
+    assert result["overall_risk_level"] == RiskLevel.CRITICAL.value
+    assert result["triggered_rules"][-1]["reason"].startswith("4 assessments at or above HIGH")
+
+    response = await client.post("/sentinela/triggers", json={
+        "name": "window_missing_threshold",
+        "description": "Invalid",
+        "trigger_type": "window",
+        "window_params": {"event": "score_below", "window_seconds": 3600, "min_count": 10},
+        "risk_level": "HIGH",
+    })
+    assert response.status_code == 422
+
+
+def test_sliding_window_counter_expires_old_buckets():
+    from app.utils.window_counters import SlidingWindowCounter, WindowCounterStore
+
+    counter = SlidingWindowCounter(window_seconds=60, buckets=6)
+    assert [counter.add(t) for t in (0, 5, 15)] == [1, 2, 3]
+    assert counter.count(55) == 3
+    assert counter.count(65) == 1
+    assert counter.add(130) == 1
+
+    store = WindowCounterStore(max_entities=2)
+    for entity_id in ("a", "b", "c"):
+        store.record(entity_id, "t", 60, 0)
+    assert len(store) == 2 and store.missing(["a", "b", "c"]) == []
+    documents = store.take_snapshot()
+    assert sorted(d["_id"] for d in documents) == ["a", "b", "c"]
+    assert store.missing(["a"]) == ["a"]
+    assert store.dirty_count == 0
+
+    # A failed write puts the entities back, including "a", which is no longer in memory.
+    store.requeue(documents)
+    assert store.dirty_count == 3
+    assert store.missing(["a"]) == []
+    assert sorted(d["_id"] for d in store.take_snapshot()) == ["a", "b", "c"]
+
+
+@pytest.mark.asyncio
+async def test_assess_risk_memoized_per_trigger_set_version(client: AsyncClient, create_score_result, create_risk_trigger, faker_instance):
+    from app.utils.assessment_cache import assessment_cache
+
+    entity_id = faker_instance.uuid4()
+    score_result = await create_score_result(entity_id=entity_id, flags=[FlagWithValue(name="f", value=0.2, weight=1.0)])
+    await create_risk_trigger(name="memo_threshold", score_threshold=0.5, risk_level=RiskLevel.HIGH)
+    assess_payload = {"entity_id": entity_id, "score_id": str(score_result.id), "additional_context": {"a": 1, "b": 2}}
+
+    first = (await client.post("/sentinela/assess", json=assess_payload)).json()
+    again = (await client.post("/sentinela/assess", json={**assess_payload, "additional_context": {"b": 2, "a": 1}})).json()
+    assert again["_id"] == first["_id"]
+
+    # The unique index answers for the memo after a restart.
+    assessment_cache.clear()
+    again = (await client.post("/sentinela/assess", json=assess_payload)).json()
+    assert again["_id"] == first["_id"]
+
+    other_context = (await client.post("/sentinela/assess", json={**assess_payload, "additional_context": {"a": 2}})).json()
+    assert other_context["_id"] != first["_id"]
+
+    await client.put("/sentinela/triggers/memo_threshold", json={"risk_level": "CRITICAL"})
+    reassessed = (await client.post("/sentinela/assess", json=assess_payload)).json()
+    assert reassessed["_id"] != first["_id"]
+    assert reassessed["trigger_set_version"] != first["trigger_set_version"]
+    assert reassessed["overall_risk_level"] == RiskLevel.CRITICAL.value
+
+
+@pytest.mark.asyncio
+async def test_simulate_risk_trigger(client: AsyncClient, create_score_result, create_risk_trigger, faker_instance):
+    entity_a, entity_b = faker_instance.uuid4(), faker_instance.uuid4()
+    assessed = await create_score_result(entity_id=entity_a, flags=[FlagWithValue(name="mixer_usage", value=True, weight=0.2), FlagWithValue(name="f", value=0.1, weight=0.8)])
+    await create_score_result(entity_id=entity_a, flags=[FlagWithValue(name="f", value=0.2, weight=1.0)])
+    await create_score_result(entity_id=entity_b, flags=[FlagWithValue(name="f", value=0.3, weight=1.0)])
+    await create_score_result(entity_id=entity_b, flags=[FlagWithValue(name="f", value=0.9, weight=1.0)])
+    await create_risk_trigger(name="existing_high", score_threshold=0.29, risk_level=RiskLevel.HIGH)
+    await client.post("/sentinela/assess", json={"entity_id": entity_a, "score_id": str(assessed.id)})
+    draft = {"name": "draft_threshold", "description": "Draft", "trigger_type": "score_threshold", "score_threshold": 0.5, "risk_level": "HIGH"}
+
+    response = await client.post("/sentinela/triggers/simulate", json=draft)
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert result["evaluated_in"] == "database"
+    assert (result["scores_matched"], result["entities_matched"], result["entities_escalated"]) == (3, 2, 2)
+    assert [(b["previous_level"], b["scores"]) for b in result["by_previous_level"]] == [("LOW", 2), ("HIGH", 1)]
+    assert sum(b["escalated_scores"] for b in result["by_period"]) == 2
+    assert (await client.get("/sentinela/triggers/draft_threshold")).status_code == 404
+
+    flag_draft = {**draft, "trigger_type": "flag_presence", "flag_name": "mixer_usage", "score_threshold": None}
+    result = (await client.post("/sentinela/triggers/simulate", json=flag_draft, params={"granularity": "weekly"})).json()
+    assert (result["scores_matched"], result["entities_escalated"]) == (1, 0)
+    assert "-W" in result["by_period"][0]["period"]
+
+    custom_draft = {**draft, "trigger_type": "custom_logic", "custom_logic_params": {"expression": "0.25 < score < 0.5"}}
+    result = (await client.post("/sentinela/triggers/simulate", json=custom_draft)).json()
+    assert result["evaluated_in"] == "python"
+    assert (result["scores_matched"], result["entities_matched"]) == (2, 2)
+
+    window_draft = {**draft, "trigger_type": "window", "window_params": {"event": "score_below", "score_threshold": 0.5, "window_seconds": 60, "min_count": 2}}
+    assert (await client.post("/sentinela/triggers/simulate", json=window_draft)).status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_risk_stats_rollups(client: AsyncClient, create_score_result, create_risk_trigger, faker_instance):
+    from app.database import get_collection
+    from app.routers import risk_router
+
+    risk_router.risk_stats_service.rollup_lag_seconds = 0.0
+
+    await create_risk_trigger(name="stats_low_score", score_threshold=0.5, risk_level=RiskLevel.HIGH)
+    for value in (0.1, 0.2, 0.9):
+        score = await create_score_result(flags=[FlagWithValue(name="f", value=value, weight=1.0)])
+        await client.post("/sentinela/assess", json={"entity_id": score.entity_id, "score_id": str(score.id)})
+    await get_collection("cryptopix_analysis").insert_many(
+        [{"suggested_action": action, "analysis_timestamp": datetime.utcnow()} for action in ("APPROVE", "APPROVE", "APPROVE", "REJECT")]
+    )
+
+    response = await client.get("/sentinela/stats", params={"granularity": "day"})
+    assert response.status_code == 200, response.text
+    stats = response.json()
+    assert stats["assessments_by_level"][-1]["counts"] == {"HIGH": 2, "LOW": 1}
+    assert stats["top_triggers"] == [{"trigger_name": "stats_low_score", "count": 2}]
+    assert {a["action"]: a["ratio"] for a in stats["cryptopix_actions"]} == {"APPROVE": 0.75, "REJECT": 0.25}
+
+    # Incremental: only new assessments are folded in, existing buckets are added to.
+    refreshed = (await client.post("/sentinela/stats/refresh")).json()
+    assert refreshed["rolled_up"] == {"risk_assessments": 0, "cryptopix_analysis": 0}
+    score = await create_score_result(flags=[FlagWithValue(name="f", value=0.3, weight=1.0)])
+    await client.post("/sentinela/assess", json={"entity_id": score.entity_id, "score_id": str(score.id)})
+    refreshed = (await client.post("/sentinela/stats/refresh")).json()
+    assert refreshed["rolled_up"]["risk_assessments"] == 1
+
+    stats = (await client.get("/sentinela/stats")).json()
+    assert stats["assessments_by_level"][-1]["counts"] == {"HIGH": 3, "LOW": 1}
+    assert stats["top_triggers"][0]["count"] == 3
+
+
+@pytest.mark.asyncio
+async def test_risk_stats_refresh_lags_and_resumes_failed_rollups(client: AsyncClient, create_score_result, create_risk_trigger, monkeypatch):
+    from app.services import risk_stats_service as stats_module
+    from app.services.risk_stats_service import RiskStatsService
+
+    await create_risk_trigger(name="stats_resume", score_threshold=0.5, risk_level=RiskLevel.HIGH)
+    for value in (0.1, 0.9):
+        score = await create_score_result(flags=[FlagWithValue(name="f", value=value, weight=1.0)])
+        await client.post("/sentinela/assess", json={"entity_id": score.entity_id, "score_id": str(score.id)})
+
+    # Inside the lag window nothing is claimed yet.
+    assert (await RiskStatsService(rollup_lag_seconds=60.0).refresh()).rolled_up["risk_assessments"] == 0
+
+    # A refresh that fails after some rollups keeps the range pending instead of dropping it.
+    service = RiskStatsService(rollup_lag_seconds=0.0)
+    rollup_pipeline = stats_module._rollup_pipeline
+    calls = []
+
+    def failing_rollup_pipeline(*args):
+        calls.append(args)
+        if len(calls) == 2:
+            raise RuntimeError("merge failed")
+        return rollup_pipeline(*args)
+
+    monkeypatch.setattr(stats_module, "_rollup_pipeline", failing_rollup_pipeline)
+    with pytest.raises(RuntimeError):
+        await service.refresh()
+    monkeypatch.setattr(stats_module, "_rollup_pipeline", rollup_pipeline)
+    assert (await service.refresh()).rolled_up["risk_assessments"] == 2
+    assert (await service.refresh()).rolled_up["risk_assessments"] == 0
+
+    stats = await service.get_stats(StatsGranularity.HOUR)
+    assert stats.assessments_by_level[-1].counts == {"HIGH": 1, "LOW": 1}
+    stats = await service.get_stats(StatsGranularity.DAY)
+    assert stats.assessments_by_level[-1].counts == {"HIGH": 1, "LOW": 1}
+    assert stats.top_triggers[0].count == 1
@@ -1,3 +1,5 @@
+import asyncio
+
 import pytest
 from httpx import AsyncClient
 
@@ -94,3 +96,297 @@ async def test_get_scores_by_entity_no_scores(client: AsyncClient, faker_instanc
     response = await client.get(f"/scores/entity/{entity_id}")
     assert response.status_code == 200
     assert len(response.json()) == 0
+
+
+@pytest.mark.asyncio
+async def test_get_score_rollups_daily(client: AsyncClient, create_score_result, faker_instance):
+    entity_id = faker_instance.uuid4()
+    await create_score_result(entity_id=entity_id, flags=[FlagWithValue(name="f1", value=0.2, weight=1.0)], metadata={})
+    await create_score_result(entity_id=entity_id, flags=[FlagWithValue(name="f2", value=0.8, weight=1.0)], metadata={})
+    last = await create_score_result(entity_id=entity_id, flags=[FlagWithValue(name="f3", value=0.5, weight=1.0)], metadata={})
+
+    response = await client.get(f"/scores/entity/{entity_id}/rollups", params={"granularity": "daily"})
+    assert response.status_code == 200
+    rollups = response.json()
+    assert len(rollups) == 1
+    assert rollups[0]["count"] == 3
+    assert rollups[0]["min_score"] == pytest.approx(0.2)
+    assert rollups[0]["max_score"] == pytest.approx(0.8)
+    assert rollups[0]["mean_score"] == pytest.approx(0.5)
+    assert rollups[0]["last_score"] == pytest.approx(0.5)
+    assert rollups[0]["last_score_id"] == str(last.id)
+
+
+@pytest.mark.asyncio
+async def test_score_rollups_keep_the_latest_score_when_stored_out_of_order(client: AsyncClient, faker_instance):
+    from datetime import datetime, timedelta
+
+    import app.routers.score_router as score_router_module
+
+    service = score_router_module.score_service
+    entity_id = faker_instance.uuid4()
+    scored_at = datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0)
+    await service._update_rollups(entity_id, "b" * 24, 0.9, scored_at)
+    # An older score whose write lands after the newer one.
+    await service._update_rollups(entity_id, "a" * 24, 0.1, scored_at - timedelta(seconds=1))
+
+    response = await client.get(f"/scores/entity/{entity_id}/rollups", params={"granularity": "daily"})
+    (rollup,) = response.json()
+    assert rollup["count"] == 2
+    assert (rollup["min_score"], rollup["max_score"]) == (pytest.approx(0.1), pytest.approx(0.9))
+    assert (rollup["last_score"], rollup["last_score_id"]) == (pytest.approx(0.9), "b" * 24)
+
+
+@pytest.mark.asyncio
+async def test_get_score_rollups_weekly_and_empty(client: AsyncClient, create_score_result, faker_instance):
+    entity_id = faker_instance.uuid4()
+    await create_score_result(entity_id=entity_id, flags=[FlagWithValue(name="f1", value=1.0, weight=1.0)], metadata={})
+
+    response = await client.get(f"/scores/entity/{entity_id}/rollups", params={"granularity": "weekly"})
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+    assert response.json()[0]["granularity"] == "weekly"
+
+    response = await client.get(f"/scores/entity/{faker_instance.uuid4()}/rollups")
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+@pytest.mark.asyncio
+async def test_apply_flag_delta_updates_score(client: AsyncClient, create_score_result, faker_instance):
+    entity_id = faker_instance.uuid4()
+    await create_score_result(
+        entity_id=entity_id,
+        flags=[
+            FlagWithValue(name="is_kyc_verified", value=False, weight=0.5, is_active=True),
+            FlagWithValue(name="fraud_score", value=0.4, weight=0.5, is_active=True),
+        ],
+        metadata={},
+    )
+
+    response = await client.patch(f"/scores/entity/{entity_id}/flags", json={"name": "is_kyc_verified", "value": True})
+    assert response.status_code == 200
+    result = response.json()
+    assert result["probability_score"] == pytest.approx(0.7)
+    assert result["raw_score"] == pytest.approx(0.7)
+    kyc_flag = next(f for f in result["flags_used"] if f["name"] == "is_kyc_verified")
+    assert kyc_flag["value"] is True
+    assert kyc_flag["weight"] == pytest.approx(0.5)
+
+    response = await client.patch(f"/scores/entity/{entity_id}/flags", json={"name": "fraud_score", "remove": True})
+    assert response.status_code == 200
+    assert response.json()["probability_score"] == pytest.approx(1.0)
+    assert len(response.json()["flags_used"]) == 1
+
+    history = await client.get(f"/scores/entity/{entity_id}")
+    assert len(history.json()) == 3
+
+
+@pytest.mark.asyncio
+async def test_apply_flag_delta_new_flag_and_errors(client: AsyncClient, create_score_result, faker_instance):
+    entity_id = faker_instance.uuid4()
+    await create_score_result(entity_id=entity_id, flags=[FlagWithValue(name="f1", value=1.0, weight=1.0)], metadata={})
+
+    response = await client.patch(f"/scores/entity/{entity_id}/flags", json={"name": "f2", "value": 0.0, "weight": 1.0})
+    assert response.status_code == 200
+    assert response.json()["probability_score"] == pytest.approx(0.5)
+
+    response = await client.patch(f"/scores/entity/{entity_id}/flags", json={"name": "f3"})
+    assert response.status_code == 400
+
+    response = await client.patch(f"/scores/entity/{entity_id}/flags", json={"name": "f3", "remove": True})
+    assert response.status_code == 404
+
+    response = await client.patch(f"/scores/entity/{faker_instance.uuid4()}/flags", json={"name": "f1", "value": 1.0})
+    assert response.status_code == 404
+
+    duplicated = [{"name": "f1", "value": 1.0, "weight": 1.0}, {"name": "f1", "value": 0.0, "weight": 1.0}]
+    response = await client.post("/scores", json={"entity_id": entity_id, "flags": duplicated})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_calculate_score_categorical_flag(client: AsyncClient, create_score_result, faker_instance):
+    response = await client.post("/flags/definitions", json={
+        "name": "counterparty_tier",
+        "description": "Counterparty exchange tier.",
+        "type": "category",
+        "weight": 1.0,
+        "category_scores": {"tier1": 0.9, "unregulated": 0.1},
+    })
+    assert response.status_code == 201
+
+    score_result = await create_score_result(
+        flags=[
+            FlagWithValue(name="counterparty_tier", value="TIER1", weight=1.0),
+            FlagWithValue(name="unknown_category_flag", value="whatever", weight=1.0),
+        ],
+        metadata={},
+    )
+    assert score_result.probability_score == pytest.approx(0.45)
+
+
+@pytest.mark.asyncio
+async def test_category_table_change_made_by_another_process_is_picked_up(
+    client: AsyncClient, create_score_result, monkeypatch
+):
+    from app.database import get_collection
+    from app.utils.catalog_versions import CatalogVersions, catalog_versions
+
+    response = await client.post("/flags/definitions", json={
+        "name": "desk_tier",
+        "description": "Desk tier.",
+        "type": "category",
+        "weight": 1.0,
+        "category_scores": {"tier1": 0.9},
+    })
+    assert response.status_code == 201
+    flags = [FlagWithValue(name="desk_tier", value="tier1", weight=1.0)]
+    assert (await create_score_result(flags=flags, metadata={})).probability_score == pytest.approx(0.9)
+
+    # Another worker edits the definition: only the stored catalog version tells this process.
+    await get_collection("flags").update_one({"name": "desk_tier"}, {"$set": {"category_scores": {"tier1": 0.2}}})
+    await CatalogVersions().bump("flags")
+    monkeypatch.setattr(catalog_versions, "check_interval_seconds", 0.0)
+
+    assert (await create_score_result(flags=flags, metadata={})).probability_score == pytest.approx(0.2)
+
+
+@pytest.mark.asyncio
+async def test_flag_delta_after_category_table_change_subtracts_applied_contribution(
+    client: AsyncClient, create_score_result, faker_instance
+):
+    definition = {
+        "name": "venue_tier",
+        "description": "Venue tier.",
+        "type": "category",
+        "weight": 1.0,
+        "category_scores": {"tier1": 0.9, "tier2": 0.5},
+    }
+    assert (await client.post("/flags/definitions", json=definition)).status_code == 201
+    entity_id = faker_instance.uuid4()
+    await create_score_result(
+        entity_id=entity_id,
+        flags=[FlagWithValue(name="venue_tier", value="tier1", weight=1.0), FlagWithValue(name="f1", value=1.0, weight=1.0)],
+        metadata={},
+    )
+
+    definition["category_scores"] = {"tier1": 0.1, "tier2": 0.5}
+    assert (await client.put("/flags/definitions/venue_tier", json=definition)).status_code == 200
+
+    # Re-setting the tier flag removes the 0.9 that was applied and adds the new table's 0.5.
+    response = await client.patch(f"/scores/entity/{entity_id}/flags", json={"name": "venue_tier", "value": "tier2"})
+    assert response.status_code == 200
+    assert response.json()["probability_score"] == pytest.approx((0.5 + 1.0) / 2)
+
+
+@pytest.mark.asyncio
+async def test_feature_transforms_feed_score(client: AsyncClient, create_score_result, faker_instance):
+    response = await client.get("/scores/features/config")
+    assert response.status_code == 404
+
+    response = await client.post("/scores/features/config", json={"transforms": [
+        {"name": "account_age", "transform": "log", "source": "account_age_days", "scale": 999, "weight": 1.0},
+        {"name": "volume_tier", "transform": "bucket", "source": "total_volume_usd",
+         "bucket_edges": [1000, 100000], "bucket_scores": [0.0, 0.5, 1.0], "weight": 1.0},
+        {"name": "missing_source", "transform": "clip", "source": "not_there", "min_value": 0, "max_value": 10, "weight": 5.0},
+    ]})
+    assert response.status_code == 201
+    assert response.json()["version"] == 1
+
+    score_result = await create_score_result(
+        flags=[FlagWithValue(name="f1", value=0.0, weight=1.0)],
+        metadata={"account_age_days": 999, "total_volume_usd": 5000.0},
+    )
+    assert score_result.probability_score == pytest.approx(0.5)
+    assert score_result.feature_config_version == 1
+    assert [f.name for f in score_result.features_used] == ["account_age", "volume_tier"]
+
+    # Concurrent publishes get distinct versions.
+    config = {"transforms": [{"name": "age", "transform": "clip", "source": "age", "min_value": 0, "max_value": 1}]}
+    responses = await asyncio.gather(*(client.post("/scores/features/config", json=config) for _ in range(3)))
+    assert sorted(r.json()["version"] for r in responses) == [2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_feature_config_published_by_another_process_is_picked_up(
+    client: AsyncClient, create_score_result, monkeypatch
+):
+    from datetime import datetime
+
+    from app.database import get_collection
+    from app.utils.feature_transforms import feature_extractor_cache
+
+    transform = {"name": "age", "transform": "clip", "source": "age", "min_value": 0, "max_value": 100, "weight": 1.0}
+    assert (await client.post("/scores/features/config", json={"transforms": [transform]})).status_code == 201
+    score_result = await create_score_result(flags=[], metadata={"age": 50})
+    assert score_result.feature_config_version == 1
+
+    # Another worker publishes version 2 straight into Mongo; this process only sees the stored version.
+    await get_collection("feature_transform_configs").insert_one({
+        "version": 2,
+        "transforms": [{**transform, "name": "age_v2", "max_value": 200}],
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow(),
+    })
+    monkeypatch.setattr(feature_extractor_cache, "check_interval_seconds", 0.0)
+
+    score_result = await create_score_result(flags=[], metadata={"age": 50})
+    assert score_result.feature_config_version == 2
+    assert [f.name for f in score_result.features_used] == ["age_v2"]
+    assert score_result.probability_score == pytest.approx(0.25)
+
+
+@pytest.mark.asyncio
+async def test_calculate_scores_batch(client: AsyncClient, faker_instance):
+    response = await client.post("/scores/features/config", json={"transforms": [
+        {"name": "age", "transform": "clip", "source": "age", "min_value": 0, "max_value": 100, "weight": 1.0},
+    ]})
+    assert response.status_code == 201
+
+    entity_ids = [faker_instance.uuid4() for _ in range(3)]
+    response = await client.post("/scores/batch", json={"scores": [
+        {"entity_id": entity_ids[0], "flags": [{"name": "f1", "value": 1.0, "weight": 1.0}], "metadata": {"age": 50}},
+        {"entity_id": entity_ids[1], "flags": [], "metadata": {"age": 20}},
+        {"entity_id": entity_ids[2], "flags": [{"name": "f1", "value": 0.0, "weight": 1.0}], "metadata": {}},
+    ]})
+    assert response.status_code == 201
+    results = response.json()
+    assert [r["entity_id"] for r in results] == entity_ids
+    assert [r["probability_score"] for r in results] == pytest.approx([0.75, 0.2, 0.0])
+    assert [len(r["features_used"]) for r in results] == [1, 1, 0]
+
+    stored = (await client.get(f"/scores/entity/{entity_ids[1]}")).json()
+    assert [s["_id"] for s in stored] == [results[1]["_id"]]
+
+    assert (await client.post("/scores/batch", json={"scores": []})).status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_feature_transform_config_validation(client: AsyncClient):
+    response = await client.post("/scores/features/config", json={"transforms": [
+        {"name": "bad_bucket", "transform": "bucket", "source": "x", "bucket_edges": [10, 1], "bucket_scores": [0, 1, 1]},
+    ]})
+    assert response.status_code == 422
+
+    response = await client.post("/scores/features/config", json={"transforms": [
+        {"name": "bad_ratio", "transform": "ratio", "source": "x"},
+    ]})
+    assert response.status_code == 422
+
+
+def test_feature_extractor_batch_matches_single():
+    from app.models.score import FeatureTransform
+    from app.utils.feature_transforms import FeatureExtractor
+
+    extractor = FeatureExtractor([
+        FeatureTransform(name="volume_per_tx", transform="ratio", source="volume", denominator="tx_count",
+                         min_value=0, max_value=1000, weight=0.5),
+        FeatureTransform(name="age", transform="clip", source="age", min_value=0, max_value=100, default=0.0, weight=0.5),
+    ])
+    rows = [{"volume": 5000, "tx_count": 10, "age": 50}, {"volume": 1, "tx_count": 0}, {}]
+
+    batch = extractor.extract_batch(rows)
+    assert batch == [extractor.extract(row) for row in rows]
+    assert batch[0][0].value == pytest.approx(0.5)
+    assert [f.name for f in batch[1]] == ["age"]
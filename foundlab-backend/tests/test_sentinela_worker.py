@@ -0,0 +1,89 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from httpx import AsyncClient
+
+from app.models.risk import RiskLevel
+from app.models.score import FlagWithValue
+from app.services.sentinela_worker import SentinelaWorker
+
+
+@pytest.mark.asyncio
+async def test_worker_assesses_new_scores_once(client: AsyncClient, create_score_result, create_risk_trigger, faker_instance):
+    await create_risk_trigger(name="worker_low_score", score_threshold=0.5, risk_level=RiskLevel.HIGH)
+    low = await create_score_result(flags=[FlagWithValue(name="f", value=0.1, weight=1.0)])
+    high = await create_score_result(flags=[FlagWithValue(name="f", value=0.9, weight=1.0)])
+    already_assessed = await create_score_result(flags=[FlagWithValue(name="f", value=0.2, weight=1.0)])
+    await client.post("/sentinela/assess", json={"entity_id": already_assessed.entity_id, "score_id": str(already_assessed.id)})
+
+    worker = SentinelaWorker(batch_size=10, chunk_size=1, max_concurrency=2, use_change_stream=False, poll_lag_seconds=0.0)
+    assert await worker.poll_once() == 2
+    assert await worker.poll_once() == 0
+
+    from app.database import get_collection
+    assessments = await get_collection("risk_assessments").find({}).to_list(length=None)
+    levels = {a["score_id"]: a["overall_risk_level"] for a in assessments}
+    assert levels[str(low.id)] == RiskLevel.HIGH.value
+    assert levels[str(high.id)] == RiskLevel.LOW.value
+    assert len(assessments) == 3
+
+    newer = await create_score_result(flags=[FlagWithValue(name="f", value=0.3, weight=1.0)])
+    restarted = SentinelaWorker(batch_size=10, use_change_stream=False, poll_lag_seconds=0.0)
+    assert await restarted.poll_once() == 1
+    assert await get_collection("risk_assessments").count_documents({"score_id": str(newer.id)}) == 1
+
+
+@pytest.mark.asyncio
+async def test_worker_polls_with_lag_and_picks_up_late_commits(client: AsyncClient, create_score_result):
+    from app.database import get_collection
+    scores = get_collection("scores")
+    assessments = get_collection("risk_assessments")
+    early_id = ObjectId()  # allocated before the other scores, committed after them
+
+    first = await create_score_result(flags=[FlagWithValue(name="f", value=0.4, weight=1.0)])
+    worker = SentinelaWorker(batch_size=10, use_change_stream=False, poll_lag_seconds=0.3)
+    assert await worker.poll_once() == 0  # still inside the lag window
+    await asyncio.sleep(0.35)
+    assert await worker.poll_once() == 1
+
+    late = await create_score_result(flags=[FlagWithValue(name="f", value=0.6, weight=1.0)])
+    late_doc = await scores.find_one_and_delete({"_id": ObjectId(str(late.id))})
+    late_doc.update({"_id": early_id, "created_at": datetime.utcnow()})
+    await scores.insert_one(late_doc)
+    await asyncio.sleep(0.35)
+    assert await worker.poll_once() == 1
+    assert await assessments.count_documents({"score_id": str(first.id)}) == 1
+    assert await assessments.count_documents({"score_id": str(early_id)}) == 1
+
+
+@pytest.mark.asyncio
+async def test_worker_retries_after_transient_errors(client: AsyncClient, create_score_result):
+    from app.database import get_collection
+    worker = SentinelaWorker(
+        batch_size=10, use_change_stream=False, poll_lag_seconds=0.0, poll_interval_seconds=0.01, retry_base_seconds=0.01
+    )
+    worker._advance({"_id": ObjectId("0" * 24), "created_at": datetime(2000, 1, 1)})  # consume the whole collection
+    poll_once = worker.poll_once
+    failures = []
+
+    async def flaky_poll_once() -> int:
+        if len(failures) < 2:
+            failures.append(1)
+            raise ConnectionError("mongo unavailable")
+        return await poll_once()
+
+    worker.poll_once = flaky_poll_once
+    score = await create_score_result(flags=[FlagWithValue(name="f", value=0.5, weight=1.0)])
+    worker.start()
+    try:
+        for _ in range(100):
+            if await get_collection("risk_assessments").count_documents({"score_id": str(score.id)}):
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await worker.stop()
+    assert len(failures) == 2
+    assert await get_collection("risk_assessments").count_documents({"score_id": str(score.id)}) == 1
+    assert worker._failures == 0
@@ -1,7 +1,12 @@
+import asyncio
+import time
+
 import pytest
 from httpx import AsyncClient
 
-from app.models.sherlock import SanctionStatus, SherlockValidationInput
+from app.config import settings
+from app.models.sherlock import ExternalProviderResult, ProviderStatus, SanctionStatus, SherlockValidationInput
+from app.services.sherlock_service import SherlockService
 
 
 @pytest.mark.asyncio
@@ -101,12 +106,11 @@ async def test_get_validation_results_by_entity(client: AsyncClient, create_sher
     response = await client.get(f"/sherlock/{entity_id}")
     assert response.status_code == 200
     results = response.json()
-    assert len(results) == 3
+    # The three validations reached the same verdict, so they share one document.
+    assert len(results) == 1
     assert all(r["entity_id"] == entity_id for r in results)
-
-    created_at_dates = [r["created_at"] for r in results]
-    assert all(created_at_dates[i] >= created_at_dates[i + 1] for i in range(len(created_at_dates) - 1))
-    assert results[0]["_id"] == str(result3.id)
+    assert results[0]["check_count"] == 3
+    assert results[0]["_id"] == str(result3.id) == str(result1.id) == str(result2.id)
 
 
 @pytest.mark.asyncio
@@ -115,3 +119,785 @@ async def test_get_validation_results_by_entity_no_results(client: AsyncClient,
     response = await client.get(f"/sherlock/{entity_id}")
     assert response.status_code == 200
     assert len(response.json()) == 0
+
+
+@pytest.mark.asyncio
+async def test_validate_entity_providers_run_concurrently_with_timeouts(client: AsyncClient, faker_instance, monkeypatch):
+    import app.routers.sherlock_router as sherlock_router_module
+
+    def slow_provider(name: str):
+        async def slow_check(entity_id: str, entity_type: str) -> ExternalProviderResult:
+            await asyncio.sleep(0.2)
+            return ExternalProviderResult(provider_name=name, status=ProviderStatus.SUCCESS, score=0.1)
+        return slow_check
+
+    async def hanging_check(entity_id: str, entity_type: str) -> ExternalProviderResult:
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(settings, "SHERLOCK_PROVIDER_TIMEOUTS", {"Hanging": 0.3})
+    providers = sherlock_router_module.sherlock_service.providers
+    monkeypatch.setitem(providers, "Slow", slow_provider("Slow"))
+    monkeypatch.setitem(providers, "Slow 2", slow_provider("Slow 2"))
+    monkeypatch.setitem(providers, "Hanging", hanging_check)
+
+    started = time.monotonic()
+    response = await client.post(
+        "/sherlock/validate", json={"entity_id": faker_instance.uuid4(), "entity_type": "wallet_address"}
+    )
+    elapsed = time.monotonic() - started
+
+    assert response.status_code == 200
+    assert elapsed < 0.6  # the slowest provider's timeout, not 0.2 + 0.2 + 0.3
+    statuses = {p["provider_name"]: p["status"] for p in response.json()["provider_results"]}
+    assert statuses == {"Chainalysis": "success", "TRM Labs": "success", "Slow": "success", "Slow 2": "success", "Hanging": "unavailable"}
+    assert response.json()["overall_sanction_status"] == SanctionStatus.UNKNOWN.value
+    assert response.json()["suggested_action"] == "review_manual"
+
+
+@pytest.mark.asyncio
+async def test_provider_call_is_hedged_after_p95_latency(monkeypatch):
+    monkeypatch.setattr(settings, "SHERLOCK_HEDGING_ENABLED", True)
+    service = SherlockService()
+    for _ in range(settings.SHERLOCK_HEDGE_MIN_SAMPLES):
+        service.latencies.record("Flaky", 0.05)
+
+    calls = []
+
+    async def first_call_stalls(entity_id: str, entity_type: str) -> ExternalProviderResult:
+        calls.append(entity_id)
+        await asyncio.sleep(10 if len(calls) == 1 else 0.01)
+        return ExternalProviderResult(provider_name="Flaky", status=ProviderStatus.SUCCESS, score=0.2)
+
+    started = time.monotonic()
+    result = await service.call_provider("Flaky", first_call_stalls, "entity", "wallet_address")
+    assert result.status == ProviderStatus.SUCCESS
+    assert len(calls) == 2
+    assert time.monotonic() - started < 1.0
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_is_charged_to_the_provider_quota(monkeypatch):
+    from app.utils.provider_scheduler import ProviderScheduler, provider_schedulers
+
+    monkeypatch.setattr(settings, "SHERLOCK_HEDGING_ENABLED", True)
+    service = SherlockService()
+    for _ in range(settings.SHERLOCK_HEDGE_MIN_SAMPLES):
+        service.latencies.record("Metered", 0.05)
+    scheduler = provider_schedulers._schedulers["Metered"] = ProviderScheduler(
+        "Metered", rate_per_second=0.001, burst=2.0, interactive_reserve=0.0
+    )
+
+    calls = []
+
+    async def first_call_stalls(entity_id: str, entity_type: str) -> ExternalProviderResult:
+        calls.append(entity_id)
+        await asyncio.sleep(0.3 if len(calls) == 1 else 0.01)
+        return ExternalProviderResult(provider_name="Metered", status=ProviderStatus.SUCCESS, score=0.2)
+
+    # Both requests take a token.
+    result = await service.call_provider("Metered", first_call_stalls, "e1", "wallet_address")
+    assert result.status == ProviderStatus.SUCCESS
+    assert calls == ["e1", "e1"]
+    assert scheduler.bucket.tokens < 0.1
+
+    # With the bucket empty, no hedge is sent and the primary request's answer is awaited.
+    scheduler.bucket.give_back()
+    calls.clear()
+    result = await service.call_provider("Metered", first_call_stalls, "e2", "wallet_address")
+    assert result.status == ProviderStatus.SUCCESS
+    assert calls == ["e2"]
+    scheduler.close()
+
+
+@pytest.mark.asyncio
+async def test_provider_results_are_cached_with_single_flight(client: AsyncClient, monkeypatch):
+    import app.routers.sherlock_router as sherlock_router_module
+
+    calls = {"Counting": 0, "Down": 0}
+
+    async def counting_check(entity_id: str, entity_type: str) -> ExternalProviderResult:
+        calls["Counting"] += 1
+        await asyncio.sleep(0.05)
+        return ExternalProviderResult(provider_name="Counting", status=ProviderStatus.SUCCESS, score=0.1)
+
+    async def down_check(entity_id: str, entity_type: str) -> ExternalProviderResult:
+        calls["Down"] += 1
+        raise ConnectionError("provider down")
+
+    providers = sherlock_router_module.sherlock_service.providers
+    monkeypatch.setitem(providers, "Counting", counting_check)
+    monkeypatch.setitem(providers, "Down", down_check)
+
+    payloads = [{"entity_id": "Cached_Wallet", "entity_type": "wallet_address"}] * 3
+    payloads.append({"entity_id": "  cached_wallet ", "entity_type": "WALLET_ADDRESS"})
+    responses = await asyncio.gather(*(client.post("/sherlock/validate", json=payload) for payload in payloads))
+    assert all(response.status_code == 200 for response in responses)
+    assert calls == {"Counting": 1, "Down": 1}
+
+    response = await client.post("/sherlock/validate", json=payloads[0])
+    by_provider = {p["provider_name"]: p for p in response.json()["provider_results"]}
+    assert by_provider["Counting"]["cache_age_seconds"] >= 0
+    assert by_provider["Down"]["status"] == "failed"
+    assert calls == {"Counting": 1, "Down": 1}
+
+    # Failures are only cached for SHERLOCK_CACHE_NEGATIVE_TTL_SECONDS.
+    from app.utils.provider_cache import provider_result_cache
+    monkeypatch.setattr(provider_result_cache, "negative_ttl_seconds", 0.0)
+    provider_result_cache.clear()
+    await client.post("/sherlock/validate", json=payloads[0])
+    await client.post("/sherlock/validate", json=payloads[0])
+    assert calls == {"Counting": 2, "Down": 3}
+
+
+@pytest.mark.asyncio
+async def test_http_provider_adapter_against_stub_provider(client: AsyncClient, monkeypatch):
+    import httpx
+
+    import app.routers.sherlock_router as sherlock_router_module
+    from app.services.provider_stub import StubProfile, create_stub_provider_app
+    from app.services.sherlock_providers import build_provider_adapters
+
+    stub = create_stub_provider_app(StubProfile(latency_ms=5), kind="mock_trm_labs", seed=1)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=stub), base_url="http://stub") as stub_client:
+        (adapter,) = build_provider_adapters(
+            [{"name": "TRM Labs", "kind": "http", "base_url": "http://stub/", "client_factory": lambda: stub_client}]
+        )
+        monkeypatch.setitem(sherlock_router_module.sherlock_service.providers, "TRM Labs", adapter.check)
+
+        response = await client.post("/sherlock/validate", json={"entity_id": "pep_exposed_stub", "entity_type": "person"})
+        assert response.status_code == 200
+        trm = next(p for p in response.json()["provider_results"] if p["provider_name"] == "TRM Labs")
+        assert trm["status"] == "success"
+        assert trm["raw_response"]["flags"][0]["flag_name"] == "PEP_Exposure"
+        assert response.json()["overall_sanction_status"] == SanctionStatus.HIGH_RISK.value
+
+        await stub_client.put("/profile", json={"latency_ms": 0, "error_rate": 1.0})
+        response = await client.post("/sherlock/validate", json={"entity_id": "other_stub_entity", "entity_type": "person"})
+        trm = next(p for p in response.json()["provider_results"] if p["provider_name"] == "TRM Labs")
+        assert trm["status"] == "failed" and "503" in trm["message"]
+        assert (await stub_client.get("/stats")).json()["requests"] == 2
+
+
+@pytest.mark.asyncio
+async def test_failing_provider_circuit_opens_and_degrades_immediately(client: AsyncClient, monkeypatch):
+    import app.routers.sherlock_router as sherlock_router_module
+    from app.utils.circuit_breaker import Bulkhead, CircuitBreaker, CircuitState, provider_guards
+
+    breaker = CircuitBreaker(window_size=4, min_calls=4, failure_rate_threshold=0.5, open_seconds=0.2)
+    provider_guards._guards["Degraded"] = (breaker, Bulkhead())
+
+    healthy = {"value": False}
+    calls = []
+
+    async def degraded_check(entity_id: str, entity_type: str) -> ExternalProviderResult:
+        calls.append(entity_id)
+        if not healthy["value"]:
+            raise ConnectionError("upstream 502")
+        return ExternalProviderResult(provider_name="Degraded", status=ProviderStatus.SUCCESS, score=0.1)
+
+    monkeypatch.setitem(sherlock_router_module.sherlock_service.providers, "Degraded", degraded_check)
+
+    async def degraded_status(entity_id: str) -> dict:
+        response = await client.post("/sherlock/validate", json={"entity_id": entity_id, "entity_type": "wallet_address"})
+        assert response.status_code == 200
+        return next(p for p in response.json()["provider_results"] if p["provider_name"] == "Degraded")
+
+    for i in range(4):
+        assert (await degraded_status(f"entity_{i}"))["status"] == "failed"
+    assert breaker.state == CircuitState.OPEN
+
+    skipped = await degraded_status("entity_open")
+    assert skipped["status"] == "unavailable" and "circuit is open" in skipped["message"]
+    assert len(calls) == 4
+
+    # After `open_seconds` one trial call is let through; its success closes the circuit.
+    healthy["value"] = True
+    await asyncio.sleep(0.25)
+    assert (await degraded_status("entity_trial"))["status"] == "success"
+    assert breaker.state == CircuitState.CLOSED
+
+    # The rejection while the circuit was open was not cached.
+    assert (await degraded_status("entity_open"))["status"] == "success"
+    assert calls[-1] == "entity_open"
+
+    # Neither is a full bulkhead's.
+    provider_guards._guards["Degraded"] = (breaker, Bulkhead(max_concurrency=0))
+    rejected = await degraded_status("entity_bulkhead")
+    assert rejected["status"] == "unavailable" and "concurrency limit" in rejected["message"]
+    provider_guards._guards["Degraded"] = (breaker, Bulkhead())
+    assert (await degraded_status("entity_bulkhead"))["status"] == "success"
+
+
+def test_bulkhead_rejects_calls_over_the_concurrency_cap():
+    from app.utils.circuit_breaker import Bulkhead
+
+    bulkhead = Bulkhead(max_concurrency=2)
+    assert bulkhead.try_acquire() and bulkhead.try_acquire()
+    assert bulkhead.try_acquire() is False
+    bulkhead.release()
+    assert bulkhead.try_acquire()
+
+
+SDN_XML = """<?xml version="1.0" encoding="utf-8"?>
+<sdnList xmlns="http://tempuri.org/sdnList.xsd">
+  <sdnEntry>
+    <uid>1</uid><lastName>LAZARUS GROUP</lastName>
+    <programList><program>DPRK3</program></programList>
+    <idList>
+      <id><idType>Digital Currency Address - ETH</idType><idNumber>0x098B716B8Aaf21512996dC57EB0615e2383E2f96</idNumber></id>
+    </idList>
+  </sdnEntry>
+</sdnList>
+"""
+
+UN_XML = """<CONSOLIDATED_LIST><INDIVIDUALS><INDIVIDUAL>
+  <FIRST_NAME>JOHN</FIRST_NAME><SECOND_NAME>LISTED</SECOND_NAME><UN_LIST_TYPE>Al-Qaida</UN_LIST_TYPE>
+  <INDIVIDUAL_DOCUMENT><TYPE_OF_DOCUMENT>Passport</TYPE_OF_DOCUMENT><NUMBER>AB 123-456</NUMBER></INDIVIDUAL_DOCUMENT>
+</INDIVIDUAL></INDIVIDUALS></CONSOLIDATED_LIST>
+"""
+
+
+def _write_sanctions_lists(tmp_path):
+    (tmp_path / "ofac_sdn.xml").write_text(SDN_XML)
+    (tmp_path / "un_consolidated.xml").write_text(UN_XML)
+    (tmp_path / "internal.csv").write_text("address,name,program\nbc1qsanctionedwallet,Mixer Op,INTERNAL\n")
+    (tmp_path / "partner.json").write_text('{"entries": [{"identifiers": ["TXYZpartnerlisted"], "name": "Partner Hit"}]}')
+    return [str(tmp_path / name) for name in ("ofac_sdn.xml", "un_consolidated.xml", "internal.csv", "partner.json")]
+
+
+@pytest.mark.asyncio
+async def test_sanctions_index_loads_lists_and_swaps_versions(tmp_path):
+    from app.utils.sanctions_index import BloomFilter, SanctionsIndexStore
+
+    store = SanctionsIndexStore(_write_sanctions_lists(tmp_path))
+    assert await store.reload() is True
+    index = store.current
+    assert len(index) == 4
+    assert index.lookup("0x098b716b8aaf21512996dc57eb0615e2383e2f96")[0].program == "DPRK3"
+    assert index.lookup("ab123456")[0].list_name == "un_consolidated"
+    assert index.lookup(" BC1QSANCTIONEDWALLET ")[0].name == "Mixer Op"
+    assert index.lookup("txyzpartnerlisted")[0].list_name == "partner"
+    assert index.lookup("0xclean") == ()
+    assert await store.reload() is False  # unchanged files are not re-read
+
+    (tmp_path / "internal.csv").write_text("address,name,program\nbc1qnewlylisted,New Op,INTERNAL\n")
+    assert await store.reload() is True
+    assert store.current is not index
+    assert store.current.lookup("bc1qnewlylisted") and not store.current.lookup("bc1qsanctionedwallet")
+
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"listed-{i}")
+    assert all(f"listed-{i}" in bloom for i in range(1000))
+    assert sum(f"clean-{i}" in bloom for i in range(10_000)) < 300
+
+
+@pytest.mark.asyncio
+async def test_local_sanctions_hit_short_circuits_remote_providers(client: AsyncClient, tmp_path, monkeypatch):
+    import app.routers.sherlock_router as sherlock_router_module
+    from app.services.sherlock_providers import SanctionsListAdapter
+    from app.utils.sanctions_index import SanctionsIndexStore
+
+    store = SanctionsIndexStore(_write_sanctions_lists(tmp_path))
+    await store.reload()
+    service = sherlock_router_module.sherlock_service
+    monkeypatch.setitem(service.local_providers, "Local Sanctions Lists", SanctionsListAdapter("Local Sanctions Lists", store=store).check)
+
+    remote_calls = []
+
+    async def remote_check(entity_id: str, entity_type: str) -> ExternalProviderResult:
+        remote_calls.append(entity_id)
+        return ExternalProviderResult(provider_name="Remote", status=ProviderStatus.SUCCESS, score=0.1)
+
+    monkeypatch.setattr(service, "providers", {"Remote": remote_check})
+
+    response = await client.post(
+        "/sherlock/validate", json={"entity_id": "0x098B716B8AAF21512996DC57EB0615E2383E2F96", "entity_type": "wallet_address"}
+    )
+    assert response.status_code == 200
+    assert response.json()["overall_sanction_status"] == SanctionStatus.SANCTIONED.value
+    assert response.json()["suggested_action"] == "block"
+    assert [p["provider_name"] for p in response.json()["provider_results"]] == ["Local Sanctions Lists"]
+    assert remote_calls == []
+
+    response = await client.post("/sherlock/validate", json={"entity_id": "CLEAN-DOC-1", "entity_type": "document_number"})
+    assert [p["provider_name"] for p in response.json()["provider_results"]] == ["Local Sanctions Lists", "Remote"]
+
+    monkeypatch.setattr(settings, "SANCTIONS_LIST_SHORT_CIRCUIT_ENTITY_TYPES", ["document_number"])
+    response = await client.post("/sherlock/validate", json={"entity_id": "CLEAN-DOC-2", "entity_type": "document_number"})
+    assert response.json()["overall_sanction_status"] == SanctionStatus.CLEAN.value
+    assert remote_calls == ["CLEAN-DOC-1"]
+
+
+def test_name_index_matches_misspelled_transliterated_and_reordered_names():
+    from app.utils.name_index import NameIndex, jaro_winkler
+
+    assert round(jaro_winkler("martha", "marhta"), 3) == 0.961
+    watchlist = [(f"Person {i:05d} Synthetic", i) for i in range(20_000)]
+    watchlist += [("Lazarus Group", "lazarus"), ("Muhammad Al-Rashid", "rashid"), ("José Müller", "muller")]
+    index = NameIndex(watchlist)
+
+    assert [items for _, _, items in index.search("LAZARUS GRUOP")] == [["lazarus"]]
+    (similarity, listed, items), *_ = index.search("Mohammad Al Rashid")
+    assert listed == "muhammad al rashid" and items == ["rashid"] and 0.88 <= similarity < 1.0
+    assert index.search("jose muller")[0][0] == 1.0
+    assert index.search("Muller Jose")[0][2] == ["muller"]
+    assert index.search("Completely Unrelated Name") == []
+
+
+def test_name_index_pruning_keeps_the_candidates_of_a_full_scan():
+    import heapq
+    import random
+
+    from app.utils.name_index import NameIndex, _trigrams, name_similarity, normalize_name
+
+    rng = random.Random(7)
+    given = ["muhammad", "mohammed", "mohamed", "ali", "ahmad", "abdul", "abd al", "hassan", "omar", "ibrahim"]
+    family = ["al-rashid", "al-hassan", "al-masri", "khan", "rahman", "ivanov"]
+    family += ["".join(rng.choice(["ba", "ka", "ra", "sha", "di", "ov", "zu", "el"]) for _ in range(3)) for _ in range(500)]
+    watchlist = [
+        (" ".join(rng.sample(given, rng.randint(1, 2)) + [rng.choice(["bin", "al", ""]), rng.choice(family)]), i)
+        for i in range(5_000)
+    ]
+    index = NameIndex(watchlist)
+
+    listed_names = list(dict.fromkeys(normalize_name(name) for name, _ in watchlist))
+
+    def full_scan(name):
+        normalized = normalize_name(name)
+        trigrams = _trigrams(normalized)
+        scored = []
+        for name_id, listed in enumerate(listed_names):
+            listed_trigrams = _trigrams(listed)
+            shared = len(trigrams & listed_trigrams)
+            if shared:
+                scored.append((2 * shared / (len(trigrams) + len(listed_trigrams)), name_id))
+        candidates = [listed_names[name_id] for dice, name_id in heapq.nlargest(50, scored) if dice >= 0.3]
+        return {listed for listed in candidates if name_similarity(normalized, listed) >= 0.88}
+
+    queries = ["Muhammad Ali", "Mohammad Al Rashid", "Abdul Rahman Al-Hassan", "Ali Khan"]
+    queries += [rng.choice(watchlist)[0].replace("a", "e", 1) for _ in range(20)]
+    for query in queries:
+        assert {listed for _, listed, _ in index.search(query)} == full_scan(query)
+
+
+@pytest.mark.asyncio
+async def test_person_names_are_screened_fuzzily_against_local_lists(client: AsyncClient, tmp_path, monkeypatch):
+    import app.routers.sherlock_router as sherlock_router_module
+    from app.services.sherlock_providers import SanctionsListAdapter
+    from app.utils.sanctions_index import SanctionsIndexStore
+
+    store = SanctionsIndexStore(_write_sanctions_lists(tmp_path))
+    await store.reload()
+    service = sherlock_router_module.sherlock_service
+    monkeypatch.setitem(service.local_providers, "Local Sanctions Lists", SanctionsListAdapter("Local Sanctions Lists", store=store).check)
+
+    response = await client.post("/sherlock/validate", json={"entity_id": "Jon Listed", "entity_type": "person"})
+    assert response.status_code == 200
+    local = response.json()["provider_results"][0]
+    assert local["flags"][0]["flag_name"] == "Watchlist_Name_Match"
+    assert "un_consolidated: john listed" in local["flags"][0]["value"]
+    assert 0.88 <= local["flags"][0]["severity"] < 1.0
+    # A name match asks for review; remote providers are still consulted.
+    assert response.json()["overall_sanction_status"] == SanctionStatus.HIGH_RISK.value
+    assert response.json()["suggested_action"] == "review_manual"
+    assert len(response.json()["provider_results"]) == 3
+
+
+@pytest.mark.asyncio
+async def test_batch_validation_job_dedupes_batches_and_streams_progress(client: AsyncClient, monkeypatch):
+    import httpx
+
+    import app.routers.sherlock_router as sherlock_router_module
+    from app.services.provider_stub import StubProfile, create_stub_provider_app
+    from app.services.sherlock_providers import HTTPProviderAdapter
+
+    monkeypatch.setattr(settings, "SHERLOCK_BATCH_CHUNK_SIZE", 4)
+    stub = create_stub_provider_app(StubProfile(latency_ms=1), kind="mock_trm_labs")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=stub), base_url="http://stub") as stub_client:
+        adapter = HTTPProviderAdapter("TRM Labs", base_url="http://stub", client_factory=lambda: stub_client, batch_size=3)
+        service = sherlock_router_module.sherlock_batch_service.sherlock_service
+        monkeypatch.setitem(service.providers, "TRM Labs", adapter.check)
+        monkeypatch.setattr(service, "batch_providers", {"TRM Labs": adapter})
+
+        # Cached before the job: served without a provider request.
+        await client.post("/sherlock/validate", json={"entity_id": "wallet_0", "entity_type": "wallet_address"})
+        requests_before = (await stub_client.get("/stats")).json()["requests"]
+
+        entities = [{"entity_id": f"wallet_{i}", "entity_type": "wallet_address"} for i in range(7)]
+        entities += [{"entity_id": "WALLET_1", "entity_type": "wallet_address"}, {"entity_id": "pep_exposed_x", "entity_type": "person"}]
+        response = await client.post("/sherlock/validate/batch", json={"entities": entities})
+        assert response.status_code == 202
+        job_id = response.json()["_id"]
+        assert response.json()["total_entities"] == 9 and response.json()["unique_entities"] == 8
+
+        events = (await client.get(f"/sherlock/validate/batch/{job_id}/events")).text
+        assert events.rstrip().split("\n\n")[-1].startswith("event: completed")
+
+        job = (await client.get(f"/sherlock/validate/batch/{job_id}")).json()
+        assert job["status"] == "completed" and job["processed"] == 8
+        assert job["status_counts"] == {"clean": 7, "high_risk": 1}
+        # TRM Labs: chunk 1 has 3 misses (1 batch), chunk 2 has 4 misses (2 batches); Chainalysis: one call per miss.
+        assert (await stub_client.get("/stats")).json()["requests"] - requests_before == 3
+        assert job["cache_hits"] == 2
+        assert job["provider_calls"] == 3 + 7
+
+        results = (await client.get(f"/sherlock/validate/batch/{job_id}/results?limit=100")).json()
+        assert len(results) == 8 and all(r["batch_job_id"] == job_id for r in results)
+
+    assert (await client.get("/sherlock/validate/batch/missing")).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_batch_jobs_left_running_by_a_stopped_process_are_marked_failed(client: AsyncClient, monkeypatch):
+    from datetime import datetime, timedelta
+
+    import app.routers.sherlock_router as sherlock_router_module
+    from app.models.sherlock import SherlockBatchJob
+
+    service = sherlock_router_module.sherlock_batch_service
+    jobs = service._get_jobs_collection()
+    now = datetime.utcnow()
+    for job_id, status, lease_until in (
+        ("expired", "running", now - timedelta(seconds=1)),
+        ("legacy", "running", None),
+        ("queued", "pending", now - timedelta(seconds=1)),
+        ("alive", "running", now + timedelta(seconds=60)),
+        ("done", "completed", None),
+    ):
+        job = SherlockBatchJob(id=job_id, total_entities=1, unique_entities=1, status=status, lease_until=lease_until)
+        await jobs.insert_one(job.model_dump(by_alias=True))
+
+    assert await service.fail_orphaned_jobs() == 3
+    statuses = {job["_id"]: job["status"] for job in await jobs.find({}).to_list(length=None)}
+    assert statuses == {"expired": "failed", "legacy": "failed", "queued": "failed", "alive": "running", "done": "completed"}
+    assert "Interrupted" in (await client.get("/sherlock/validate/batch/expired")).json()["error"]
+
+    # A lease running out while the API keeps running is noticed when the job is read, which ends its stream.
+    await jobs.update_one({"_id": "alive"}, {"$set": {"lease_until": now - timedelta(seconds=1)}})
+    events = (await client.get("/sherlock/validate/batch/alive/events")).text
+    assert events.rstrip().split("\n\n")[-1].startswith("event: failed")
+
+    # A running job keeps renewing its lease.
+    monkeypatch.setattr(service, "lease_seconds", 0.15)
+    release = asyncio.Event()
+
+    async def slow_chunk(job_id, chunk, priority):
+        await release.wait()
+
+    monkeypatch.setattr(service, "_validate_chunk", slow_chunk)
+    response = await client.post("/sherlock/validate/batch", json={"entities": [{"entity_id": "w", "entity_type": "wallet_address"}]})
+    job_id = response.json()["_id"]
+    await asyncio.sleep(0.4)
+    assert (await client.get(f"/sherlock/validate/batch/{job_id}")).json()["status"] == "running"
+    release.set()
+    await asyncio.sleep(0.05)
+    assert (await client.get(f"/sherlock/validate/batch/{job_id}")).json()["status"] == "completed"
+
+
+@pytest.mark.asyncio
+async def test_raw_provider_responses_are_stored_compressed_and_deduplicated(client: AsyncClient, monkeypatch):
+    import app.routers.sherlock_router as sherlock_router_module
+    from app.database import get_collection
+
+    payload = {"report": [{"hop": i, "cluster": "exchange", "exposure": 0.0} for i in range(200)]}
+
+    async def verbose_check(entity_id: str, entity_type: str) -> ExternalProviderResult:
+        return ExternalProviderResult(provider_name="Verbose", status=ProviderStatus.SUCCESS, score=0.1, raw_response=payload)
+
+    monkeypatch.setitem(sherlock_router_module.sherlock_service.providers, "Verbose", verbose_check)
+    for entity_id in ("raw_entity_1", "raw_entity_2", "raw_entity_1"):
+        response = await client.post("/sherlock/validate", json={"entity_id": entity_id, "entity_type": "wallet_address"})
+        assert response.status_code == 200
+        verbose = next(p for p in response.json()["provider_results"] if p["provider_name"] == "Verbose")
+        assert verbose["raw_response"] == payload
+
+    raw_documents = await get_collection("sherlock_raw_responses").find({}).to_list(length=None)
+    assert [doc["_id"] for doc in raw_documents].count(verbose["raw_response_ref"]) == 1
+    stored = next(doc for doc in raw_documents if doc["_id"] == verbose["raw_response_ref"])
+    assert stored["encoding"] == "gzip" and stored["compressed_size"] < stored["size"]
+    result_doc = await get_collection("sherlock_results").find_one({"entity_id": "raw_entity_2"})
+    assert all("raw_response" not in p for p in result_doc["provider_results"])
+
+    history = (await client.get("/sherlock/raw_entity_1")).json()
+    assert len(history) == 1 and history[0]["check_count"] == 2  # same verdict twice: one document
+    assert all(p["raw_response"] is None for r in history for p in r["provider_results"])
+    history = (await client.get("/sherlock/raw_entity_1?include_raw=true")).json()
+    assert all(
+        p["raw_response"] == payload for r in history for p in r["provider_results"] if p["provider_name"] == "Verbose"
+    )
+
+
+@pytest.mark.asyncio
+async def test_provider_scheduler_serves_interactive_before_batch_and_backfill():
+    from app.models.sherlock import RequestPriority
+    from app.utils.provider_scheduler import ProviderScheduler
+
+    scheduler = ProviderScheduler("Quota", rate_per_second=20.0, burst=2.0, interactive_reserve=0.5)
+    assert await scheduler.acquire(RequestPriority.INTERACTIVE) and await scheduler.acquire(RequestPriority.INTERACTIVE)
+
+    granted = []
+
+    async def call(priority: RequestPriority, label: str):
+        if await scheduler.acquire(priority, max_wait=2.0):
+            granted.append(label)
+
+    tasks = [asyncio.create_task(call(RequestPriority.BACKFILL, "backfill"))]
+    tasks.append(asyncio.create_task(call(RequestPriority.BATCH, "batch")))
+    await asyncio.sleep(0.01)
+    tasks.append(asyncio.create_task(call(RequestPriority.INTERACTIVE, "interactive")))
+    await asyncio.sleep(0.01)
+    metrics = scheduler.metrics()
+    assert {q.priority: q.queue_depth for q in metrics.queues} == {
+        RequestPriority.INTERACTIVE: 1, RequestPriority.BATCH: 1, RequestPriority.BACKFILL: 1
+    }
+    await asyncio.gather(*tasks)
+    assert granted == ["interactive", "batch", "backfill"]
+
+    assert not await scheduler.acquire(RequestPriority.BACKFILL, max_wait=0.0)
+    metrics = scheduler.metrics()
+    backfill = next(q for q in metrics.queues if q.priority == RequestPriority.BACKFILL)
+    assert backfill.granted == 1 and backfill.rejected == 1 and backfill.max_wait_seconds > 0
+    assert metrics.requests_last_minute == 5 and metrics.rate_limit_per_second == 20.0
+    scheduler.close()
+
+
+@pytest.mark.asyncio
+async def test_provider_quota_is_waited_for_outside_the_shared_call(client: AsyncClient, monkeypatch):
+    import app.routers.sherlock_router as sherlock_router_module
+    from app.models.sherlock import RequestPriority
+    from app.utils.circuit_breaker import provider_guards
+    from app.utils.provider_cache import provider_cache_key, provider_result_cache
+    from app.utils.provider_scheduler import ProviderScheduler, provider_schedulers
+
+    calls = []
+
+    async def quota_check(entity_id: str, entity_type: str) -> ExternalProviderResult:
+        calls.append(entity_id)
+        return ExternalProviderResult(provider_name="Quota", status=ProviderStatus.SUCCESS, score=0.1)
+
+    service = sherlock_router_module.sherlock_service
+    scheduler = provider_schedulers._schedulers["Quota"] = ProviderScheduler(
+        "Quota", rate_per_second=2.0, burst=1.0, interactive_reserve=0.0
+    )
+    assert await scheduler.acquire(RequestPriority.INTERACTIVE)  # drain the bucket
+
+    # A backfill call waiting for quota does not make an interactive call for the same entity wait behind it.
+    monkeypatch.setitem(settings.SHERLOCK_SCHEDULER_MAX_WAIT_SECONDS, "backfill", 5.0)
+    backfill = asyncio.create_task(service.call_provider("Quota", quota_check, "e1", "wallet_address", RequestPriority.BACKFILL))
+    await asyncio.sleep(0.01)
+    # It holds no bulkhead slot while it waits.
+    assert provider_guards.get("Quota")[1].in_flight == 0
+    interactive = await service.call_provider("Quota", quota_check, "e1", "wallet_address", RequestPriority.INTERACTIVE)
+    assert interactive.status == ProviderStatus.SUCCESS
+    assert not backfill.done()
+    # Once granted, the backfill call finds the entity cached and gives its token back.
+    assert (await backfill).cache_age_seconds is not None
+    assert calls == ["e1"]
+    assert scheduler.bucket.tokens >= 0.9
+
+    # A quota rejection is returned to its caller only, never cached.
+    assert await scheduler.acquire(RequestPriority.INTERACTIVE)
+    monkeypatch.setitem(settings.SHERLOCK_SCHEDULER_MAX_WAIT_SECONDS, "backfill", 0.0)
+    rejected = await service.call_provider("Quota", quota_check, "e2", "wallet_address", RequestPriority.BACKFILL)
+    assert rejected.status == ProviderStatus.UNAVAILABLE and "quota exhausted" in rejected.message
+    assert provider_result_cache.get(provider_cache_key("Quota", "e2", "wallet_address")) is None
+    assert (await service.call_provider("Quota", quota_check, "e2", "wallet_address")).status == ProviderStatus.SUCCESS
+    assert calls == ["e1", "e2"]
+
+
+@pytest.mark.asyncio
+async def test_scheduler_metrics_endpoint_reports_provider_quota(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(settings, "SHERLOCK_PROVIDER_RATE_LIMITS", {"Chainalysis": 100.0})
+    response = await client.post("/sherlock/validate", json={"entity_id": "quota_entity", "entity_type": "wallet_address"})
+    assert response.status_code == 200
+
+    metrics = {m["provider_name"]: m for m in (await client.get("/sherlock/scheduler/metrics")).json()}
+    assert metrics["Chainalysis"]["rate_limit_per_second"] == 100.0
+    assert metrics["Chainalysis"]["requests_last_minute"] == 1
+    assert metrics["TRM Labs"]["rate_limit_per_second"] is None
+    interactive = next(q for q in metrics["Chainalysis"]["queues"] if q["priority"] == "interactive")
+    assert interactive["granted"] == 1 and interactive["queue_depth"] == 0
+
+
+@pytest.mark.asyncio
+async def test_sanctions_list_change_rescreens_only_affected_entities(client: AsyncClient, tmp_path, monkeypatch):
+    import app.routers.sherlock_router as sherlock_router_module
+    from app.services.sherlock_providers import SanctionsListAdapter
+    from app.services.sherlock_rescreen_service import SherlockRescreenService
+    from app.utils.sanctions_index import SanctionsIndexStore
+
+    rescreen_service = sherlock_router_module.sherlock_rescreen_service
+    store = SanctionsIndexStore(_write_sanctions_lists(tmp_path))
+    store.add_listener(rescreen_service.on_sanctions_reload)
+    await store.reload()
+    assert rescreen_service.last_job_id is None  # the first version is only recorded
+    remote_calls = []
+
+    async def remote_check(entity_id: str, entity_type: str) -> ExternalProviderResult:
+        remote_calls.append(entity_id)
+        return ExternalProviderResult(provider_name="Remote", status=ProviderStatus.SUCCESS, score=0.1)
+
+    for service in (sherlock_router_module.sherlock_service, rescreen_service.sherlock_service):
+        monkeypatch.setattr(service, "local_providers", {"Local Sanctions Lists": SanctionsListAdapter("Local Sanctions Lists", store=store).check})
+        monkeypatch.setattr(service, "providers", {"Remote": remote_check})
+
+    entities = [
+        ("BC1QNEWLYLISTED", "wallet_address"),
+        ("bc1q-NewlyListed", "wallet_address"),
+        ("bc1qsanctionedwallet", "wallet_address"),
+        ("txyzpartnerlisted", "wallet_address"),
+        ("0xuntouched", "wallet_address"),
+        ("Jon Listed", "person"),
+    ]
+    for entity_id, entity_type in entities:
+        response = await client.post("/sherlock/validate", json={"entity_id": entity_id, "entity_type": entity_type})
+        assert response.status_code == 200
+    results = sherlock_router_module.sherlock_service._get_collection()
+    assert (await results.find_one({"entity_id": "bc1q-NewlyListed"}))["entity_key"] == "bc1qnewlylisted"
+    # Stored before results had an `entity_key`: set by the job before it looks entities up.
+    await results.update_one({"entity_id": "bc1qsanctionedwallet"}, {"$unset": {"entity_key": ""}})
+    name_match = await results.find_one({"entity_id": "Jon Listed"})
+    assert [flag["listed_name"] for flag in name_match["sherlock_flags"]] == ["john listed"]
+    # Name-match flags stored before they had `listed_name` get it from their value.
+    for flag in name_match["sherlock_flags"]:
+        del flag["listed_name"]
+    await results.update_one({"_id": name_match["_id"]}, {"$set": {"sherlock_flags": name_match["sherlock_flags"]}})
+
+    # New version: one address listed, one delisted, one re-listed under another program, one name removed.
+    (tmp_path / "internal.csv").write_text("address,name,program\nbc1qnewlylisted,New Op,INTERNAL\n")
+    (tmp_path / "partner.json").write_text('{"entries": [{"identifiers": ["TXYZpartnerlisted"], "name": "Partner Hit", "program": "P2"}]}')
+    (tmp_path / "un_consolidated.xml").write_text("<CONSOLIDATED_LIST><INDIVIDUALS></INDIVIDUALS></CONSOLIDATED_LIST>")
+    remote_calls.clear()
+    assert await store.reload() is True
+
+    job_id = rescreen_service.last_job_id
+    await asyncio.gather(*rescreen_service._tasks.values())
+    job = (await client.get(f"/sherlock/rescreen/{job_id}")).json()
+    assert job["status"] == "completed"
+    assert (job["changed_identifiers"], job["removed_names"]) == (4, 2)  # incl. the UN passport and "Mixer Op"
+    assert (job["candidates"], job["processed"], job["changed"], job["failed"]) == (5, 5, 4, 0)
+    assert "0xuntouched" not in remote_calls
+
+    newly_listed = (await client.get("/sherlock/BC1QNEWLYLISTED")).json()
+    assert [r["overall_sanction_status"] for r in newly_listed] == ["sanctioned", "clean"]
+    assert newly_listed[0]["rescreen_job_id"] == job_id
+    assert (await client.get("/sherlock/bc1q-NewlyListed")).json()[0]["overall_sanction_status"] == "sanctioned"
+    assert (await client.get("/sherlock/bc1qsanctionedwallet")).json()[0]["overall_sanction_status"] == "clean"
+    assert (await client.get("/sherlock/Jon Listed")).json()[0]["overall_sanction_status"] == "clean"
+    assert len((await client.get("/sherlock/txyzpartnerlisted")).json()) == 1  # still sanctioned: nothing written
+    assert len((await client.get("/sherlock/0xuntouched")).json()) == 1
+    assert (await client.get("/sherlock/rescreen/missing")).status_code == 404
+
+    # Restart: a change made while the API was down is diffed against the recorded version.
+    (tmp_path / "internal.csv").write_text(
+        "address,name,program\nbc1qnewlylisted,New Op,INTERNAL\n0xuntouched,Late Op,INTERNAL\n"
+    )
+    restarted_service = SherlockRescreenService(rescreen_service.sherlock_service)
+    restarted_store = SanctionsIndexStore(store.paths)
+    adapter = SanctionsListAdapter("Local Sanctions Lists", store=restarted_store)
+    monkeypatch.setattr(restarted_service.sherlock_service, "local_providers", {"Local Sanctions Lists": adapter.check})
+    restarted_store.add_listener(restarted_service.on_sanctions_reload)
+    assert await restarted_store.reload() is True
+    await asyncio.gather(*restarted_service._tasks.values())
+    job = (await client.get(f"/sherlock/rescreen/{restarted_service.last_job_id}")).json()
+    assert (job["previous_version"], job["list_version"]) == (store.current.version, restarted_store.current.version)
+    assert (job["changed_identifiers"], job["candidates"], job["changed"]) == (1, 1, 1)
+    assert (await client.get("/sherlock/0xuntouched")).json()[0]["overall_sanction_status"] == "sanctioned"
+
+    # Another process loading the same version does not start a second job.
+    other_service = SherlockRescreenService(rescreen_service.sherlock_service)
+    assert await other_service.on_sanctions_reload(None, restarted_store.current) is None
+    assert other_service.last_job_id is None
+
+
+@pytest.mark.asyncio
+async def test_failed_or_interrupted_rescreen_is_retried_from_the_recorded_version(
+    client: AsyncClient, tmp_path, monkeypatch
+):
+    from datetime import datetime
+
+    from app.database import get_collection
+    from app.services.sherlock_rescreen_service import SherlockRescreenService
+    from app.utils.sanctions_index import SanctionsIndexStore
+
+    monkeypatch.setattr(settings, "SANCTIONS_RESCREEN_SNAPSHOT_CHUNK", 2)
+    states = get_collection("sherlock_rescreen_state")
+    snapshots = get_collection("sherlock_rescreen_snapshots")
+    store = SanctionsIndexStore(_write_sanctions_lists(tmp_path))
+    await store.reload()
+    first_version = store.current.version
+    service = SherlockRescreenService()
+    assert await service.on_sanctions_reload(None, store.current) is None
+    assert await snapshots.count_documents({"version": first_version}) > 1  # stored in chunks
+
+    (tmp_path / "internal.csv").write_text("address,name,program\nbc1qnewlylisted,New Op,INTERNAL\n")
+    await store.reload()
+
+    # A failed job leaves the recorded version in place and releases its claim.
+    async def broken_backfill() -> int:
+        raise RuntimeError("results unavailable")
+
+    monkeypatch.setattr(service.sherlock_service, "backfill_entity_keys", broken_backfill)
+    failed = await service.on_sanctions_reload(None, store.current)
+    await asyncio.gather(*service._tasks.values())
+    assert (await service.get_job(failed.id)).status.value == "failed"
+    state = await states.find_one({"_id": "sanctions_lists"})
+    assert state["version"] == first_version and state.get("pending_job_id") is None
+
+    # A process that dies mid-job keeps its claim, so nobody else re-screens the change until it expires.
+    dead = SherlockRescreenService()
+
+    async def dies(*args) -> None:
+        return None
+
+    monkeypatch.setattr(dead, "_run", dies)
+    orphan = await dead.on_sanctions_reload(None, store.current)
+    assert await SherlockRescreenService().on_sanctions_reload(None, store.current) is None
+    await states.update_one({"_id": "sanctions_lists"}, {"$set": {"pending_until": datetime(2000, 1, 1)}})
+
+    # The next load (e.g. on startup) takes the expired claim over and diffs against the recorded version.
+    restarted = SherlockRescreenService()
+    job = await restarted.on_sanctions_reload(None, store.current)
+    await asyncio.gather(*restarted._tasks.values())
+    assert (await restarted.get_job(orphan.id)).error.startswith("Interrupted")
+    assert (await restarted.get_job(job.id)).status.value == "completed"
+    assert (job.previous_version, job.changed_identifiers) == (first_version, 2)
+    state = await states.find_one({"_id": "sanctions_lists"})
+    assert state["version"] == store.current.version and state.get("pending_job_id") is None
+    assert await snapshots.count_documents({"version": first_version}) == 0
+    assert await SherlockRescreenService().on_sanctions_reload(None, store.current) is None
+
+
+@pytest.mark.asyncio
+async def test_unchanged_verdict_only_touches_latest_result(client: AsyncClient, monkeypatch):
+    import app.routers.sherlock_router as sherlock_router_module
+    from app.utils.provider_cache import provider_result_cache
+
+    score = {"value": 0.1}
+
+    async def scoring_check(entity_id: str, entity_type: str) -> ExternalProviderResult:
+        return ExternalProviderResult(
+            provider_name="Scoring", status=ProviderStatus.SUCCESS, score=score["value"], message=f"checked {time.monotonic()}"
+        )
+
+    monkeypatch.setattr(sherlock_router_module.sherlock_service, "providers", {"Scoring": scoring_check})
+    payload = {"entity_id": "repeat_wallet", "entity_type": "wallet_address"}
+
+    first = (await client.post("/sherlock/validate", json=payload)).json()
+    second = (await client.post("/sherlock/validate", json=payload)).json()
+    assert second["_id"] == first["_id"] and second["verdict_hash"] == first["verdict_hash"]
+    assert second["check_count"] == 2 and second["last_checked_at"] >= first["last_checked_at"]
+    history = (await client.get("/sherlock/repeat_wallet")).json()
+    assert len(history) == 1 and history[0]["check_count"] == 2
+
+    score["value"] = 0.9  # the verdict changes: a new document
+    provider_result_cache.clear()
+    third = (await client.post("/sherlock/validate", json=payload)).json()
+    assert third["_id"] != first["_id"] and third["overall_sanction_status"] == SanctionStatus.HIGH_RISK.value
+    score["value"] = 0.1  # compared with the latest verdict only
+    provider_result_cache.clear()
+    fourth = (await client.post("/sherlock/validate", json=payload)).json()
+    assert fourth["_id"] not in (first["_id"], third["_id"]) and fourth["check_count"] == 1
+    history = (await client.get("/sherlock/repeat_wallet")).json()
+    assert [r["check_count"] for r in history] == [1, 1, 2]